@@ -1,9 +1,35 @@
 ﻿import pandas as pd
 import numpy as np
 from risk.guardrails import RiskGuardrails
+from risk.covariance import EWMACovariance
+from analysis.profiler import profiler
+
+def equity_floor(level):
+    """
+    Stop condition: end the run once portfolio value falls below `level`.
+    """
+    def condition(engine, row, portfolio_value):
+        return portfolio_value < level
+    return condition
+
+def max_trades(n):
+    """
+    Stop condition: end the run once `n` trades have been closed.
+    """
+    def condition(engine, row, portfolio_value):
+        return len(engine.positions) >= n
+    return condition
 
 class BacktestEngine:
-    def __init__(self, initial_capital=10000.0, fee=0.001, max_drawdown=0.20):
+    def __init__(self, initial_capital=10000.0, fee=0.001, max_drawdown=0.20, stop_on_halt=True, stop_conditions=None):
+        """
+        Args:
+            stop_on_halt (bool): Stop the bar loop as soon as the circuit breaker halts trading.
+                The halt is permanent, so the rest of the equity curve is flat at the
+                remaining capital and is filled in one step instead of bar by bar.
+            stop_conditions (list): Callables condition(engine, row, portfolio_value) -> bool.
+                When one returns True, open positions are closed and the run stops the same way.
+        """
         self.initial_capital = initial_capital
         self.capital = initial_capital
         self.fee = fee
@@ -12,62 +38,138 @@ class BacktestEngine:
         self.equity_curve = []
         self.peak_equity = initial_capital
         self.guardrails = RiskGuardrails(max_drawdown)
+        self.stop_on_halt = stop_on_halt
+        self.stop_conditions = stop_conditions or []
+        self.stop_reason = None
+        self.stopped_at = None
+        self._equity_tail = None
+        self._bar_time = None
+        # Set per bar by portfolio-level guardrails (MultiStrategyEngine, PortfolioBacktest)
+        self.halted = False
+        self.entries_blocked = False
 
-    def run(self, data, strategy_logic):
+    @profiler.timed('backtest_loop')
+    def run(self, data, strategy_logic, on_checkpoint=None, checkpoint_every=1000):
         """
         Event-driven backtest loop with Position Management and Circuit Breaker.
+
+        Args:
+            on_checkpoint (callable): Called as on_checkpoint(engine, bars_done, total_bars)
+                every `checkpoint_every` bars, e.g. to report intermediate values to an
+                optimizer. It may raise to abort the run (such as optuna.TrialPruned).
         """
+        _reset_strategy(strategy_logic)
+        total_bars = len(data)
+        bars_done = 0
         for index, row in data.iterrows():
-            current_price = row['close']
-            
-            # 1. Mark to Market Equity
-            unrealized_pnl = self.current_position['quantity'] * (current_price - self.current_position['entry_price'])
-            portfolio_value = self.capital + unrealized_pnl
-            
-            # Update Peak Equity
-            if portfolio_value > self.peak_equity:
-                self.peak_equity = portfolio_value
-            
-            self.equity_curve.append({'timestamp': row['timestamp'], 'equity': portfolio_value})
-            
-            # 2. Check Circuit Breaker
-            if self.guardrails.check_circuit_breaker(portfolio_value, self.peak_equity):
-                # Close all positions if not already closed
-                if self.current_position['quantity'] != 0:
-                    self._close_position(current_price)
-                continue # Skip strategy logic (Halt Trading)
-
-            # 3. Get Strategy Signal
-            signal, size = strategy_logic(row, portfolio_value, self.current_position)
-            
-            # 4. Execute Signal
-            if signal == 0:
-                continue
-
-            # Buy / Open Long
-            if signal == 1:
-                if self.current_position['quantity'] < 0:
-                    self._close_position(current_price)
-                qty = size / current_price
-                self._open_position(qty, current_price)
-
-            # Sell / Open Short
-            elif signal == -1:
-                if self.current_position['quantity'] > 0:
-                    self._close_position(current_price)
-                qty = size / current_price
-                self._open_position(-qty, current_price)
-
-            # Close Positions
-            elif signal == 2: # Close Long
-                if self.current_position['quantity'] > 0:
-                    self._close_position(current_price)
-            
-            elif signal == -2: # Close Short
-                if self.current_position['quantity'] < 0:
-                    self._close_position(current_price)
-
-        return pd.DataFrame(self.equity_curve)
+            if on_checkpoint is not None and bars_done and bars_done % checkpoint_every == 0:
+                on_checkpoint(self, bars_done, total_bars)
+            bars_done += 1
+            reason = self.step(row, strategy_logic)
+            if reason is not None:
+                self._stop(data, bars_done - 1, reason)
+                break
+
+        return self.equity_frame()
+
+    def step(self, row, strategy_logic):
+        """
+        Process one bar.
+
+        Returns:
+            str: 'circuit_breaker' or 'stop_condition' if the run must stop at this bar, else None.
+        """
+        current_price = row['close']
+        self._bar_time = row['timestamp']
+        
+        # 1. Mark to Market Equity
+        unrealized_pnl = self.current_position['quantity'] * (current_price - self.current_position['entry_price'])
+        portfolio_value = self.capital + unrealized_pnl
+        
+        # Update Peak Equity
+        if portfolio_value > self.peak_equity:
+            self.peak_equity = portfolio_value
+        
+        self.equity_curve.append({'timestamp': row['timestamp'], 'equity': portfolio_value})
+        
+        # 2. Check Circuit Breaker
+        if self.guardrails.check_circuit_breaker(portfolio_value, self.peak_equity) or not self.guardrails.can_trade():
+            # Close all positions if not already closed
+            if self.current_position['quantity'] != 0:
+                self._close_position(current_price)
+            if self.stop_on_halt:
+                return 'circuit_breaker'
+            return None # Skip strategy logic (Halt Trading)
+
+        # Custom stop conditions (equity floor, max trades, ...)
+        if self.stop_conditions and any(cond(self, row, portfolio_value) for cond in self.stop_conditions):
+            if self.current_position['quantity'] != 0:
+                self._close_position(current_price)
+            return 'stop_condition'
+
+        # Portfolio guardrails: flatten and skip signals while halted
+        if self.halted:
+            if self.current_position['quantity'] != 0:
+                self._close_position(current_price)
+            return None
+
+        # 3. Get Strategy Signal
+        signal, size = strategy_logic(row, portfolio_value, self.current_position)
+        
+        # 4. Execute Signal
+        if signal == 0:
+            return None
+
+        # Buy / Open Long
+        if signal == 1:
+            if self.current_position['quantity'] < 0:
+                self._close_position(current_price)
+            if self.entries_blocked:
+                return None
+            qty = size / current_price
+            self._open_position(qty, current_price)
+
+        # Sell / Open Short
+        elif signal == -1:
+            if self.current_position['quantity'] > 0:
+                self._close_position(current_price)
+            if self.entries_blocked:
+                return None
+            qty = size / current_price
+            self._open_position(-qty, current_price)
+
+        # Close Positions
+        elif signal == 2: # Close Long
+            if self.current_position['quantity'] > 0:
+                self._close_position(current_price)
+        
+        elif signal == -2: # Close Short
+            if self.current_position['quantity'] < 0:
+                self._close_position(current_price)
+        return None
+
+    def _stop(self, data, position, reason):
+        """
+        End the run at bar `position`: positions are flat from here on, so the
+        remaining equity curve is the current capital for every later timestamp.
+        """
+        self.stop_reason = reason
+        self.stopped_at = data['timestamp'].iloc[position]
+        remaining = data['timestamp'].iloc[position + 1:]
+        if len(remaining):
+            self._equity_tail = pd.DataFrame({
+                'timestamp': remaining.to_numpy(),
+                'equity': np.full(len(remaining), self.capital)
+            })
+
+    def equity_frame(self):
+        """
+        Equity curve as a DataFrame, including any flat tail filled after an early stop.
+        """
+        df = pd.DataFrame(self.equity_curve)
+        if self._equity_tail is not None:
+            df = pd.concat([df, self._equity_tail], ignore_index=True)
+        return df
 
     def _open_position(self, quantity, price):
         cost = abs(quantity * price)
@@ -77,6 +179,7 @@ class BacktestEngine:
         self.current_position['quantity'] += quantity
         if self.current_position['entry_price'] == 0:
              self.current_position['entry_price'] = price
+             self.current_position['entry_time'] = self._bar_time
         else:
             total_val = (self.current_position['quantity'] - quantity) * self.current_position['entry_price'] + quantity * price
             self.current_position['entry_price'] = total_val / self.current_position['quantity']
@@ -90,6 +193,8 @@ class BacktestEngine:
         
         self.capital += (pnl - fee_amt)
         self.positions.append({
+            'entry_time': self.current_position.get('entry_time'),
+            'exit_time': self._bar_time,
             'entry_price': entry,
             'exit_price': price,
             'quantity': qty,
@@ -98,6 +203,7 @@ class BacktestEngine:
         })
         self.current_position = {'quantity': 0.0, 'entry_price': 0.0}
 
+    @profiler.timed('metrics')
     def calculate_metrics(self):
         """
         Calculate trading metrics: Profit Factor, Win Rate, Max Drawdown.
@@ -120,7 +226,7 @@ class BacktestEngine:
         win_rate = (wins / total_trades) * 100 if total_trades > 0 else 0.0
 
         # Max Drawdown from equity curve
-        df = pd.DataFrame(self.equity_curve)
+        df = self.equity_frame()
         if not df.empty:
             running_max = df['equity'].cummax()
             drawdown = (df['equity'] - running_max) / running_max
@@ -134,3 +240,251 @@ class BacktestEngine:
             'total_trades': total_trades,
             'max_drawdown': max_drawdown
         }
+
+class MultiStrategyEngine:
+    """
+    Runs several strategies over the same bars in a single traversal.
+
+    Each registered strategy gets its own BacktestEngine (capital, position,
+    guardrails, stop conditions); every bar is read once and fed to all
+    strategies that are still running. Results are identical to separate
+    BacktestEngine.run calls unless portfolio guardrails are set.
+    """
+    def __init__(self, initial_capital=10000.0, fee=0.001, max_drawdown=0.20, stop_on_halt=True, portfolio_guardrails=None):
+        """
+        Args:
+            portfolio_guardrails (PortfolioGuardrails): Limits on the combined
+                equity/exposure of all strategies, checked once per bar before
+                the strategies step. Halted strategies are flattened, and new
+                entries are skipped while an exposure cap is reached.
+        """
+        self.portfolio_guardrails = portfolio_guardrails
+        self.defaults = {
+            'initial_capital': initial_capital,
+            'fee': fee,
+            'max_drawdown': max_drawdown,
+            'stop_on_halt': stop_on_halt
+        }
+        self.engines = {}
+        self.strategies = {}
+
+    def add(self, name, strategy, **engine_kwargs):
+        """
+        Register a strategy.
+
+        Args:
+            strategy: A StrategyLogic (its get_signal is used) or a callable
+                strategy(row, capital, current_position) -> (signal, size).
+            engine_kwargs: Per-strategy overrides of the BacktestEngine arguments
+                (initial_capital, fee, max_drawdown, stop_conditions, ...).
+        """
+        if name in self.engines:
+            raise ValueError(f"Strategy already registered: {name}")
+        self.engines[name] = BacktestEngine(**dict(self.defaults, **engine_kwargs))
+        self.strategies[name] = _strategy_for_run(strategy)
+        return self.engines[name]
+
+    @profiler.timed('backtest_loop')
+    def run(self, data):
+        """
+        Returns:
+            dict: {name: equity DataFrame}
+        """
+        active = dict(self.engines)
+        engines = list(self.engines.values())
+        for strategy in self.strategies.values():
+            _reset_strategy(strategy)
+        if self.portfolio_guardrails is not None:
+            self.portfolio_guardrails.reset()
+        position = 0
+        for index, row in data.iterrows():
+            if self.portfolio_guardrails is not None:
+                self._apply_guardrails(engines, row)
+            for name, engine in list(active.items()):
+                reason = engine.step(row, self.strategies[name])
+                if reason is not None:
+                    engine._stop(data, position, reason)
+                    del active[name]
+            position += 1
+            # Every strategy has stopped; their remaining equity is already filled in
+            if not active:
+                break
+        return self.results()
+
+    def _apply_guardrails(self, engines, row):
+        """
+        Mark every strategy to this bar's close and evaluate the portfolio limits in one call.
+        """
+        apply_portfolio_guardrails(self.portfolio_guardrails, engines, row['close'], row['timestamp'])
+
+    def results(self):
+        return {name: engine.equity_frame() for name, engine in self.engines.items()}
+
+    def calculate_metrics(self):
+        """
+        Returns:
+            dict: {name: metrics dict}
+        """
+        return {name: engine.calculate_metrics() for name, engine in self.engines.items()}
+
+def _covariance_sized(strategy, weights, index):
+    """
+    Wrap a strategy callable so entries are sized to weights[index] of the equity it is given.
+    """
+    def sized(row, capital, current_position):
+        signal, size = strategy(row, capital, current_position)
+        if signal in (1, -1) and weights[index] > 0:
+            size = weights[index] * capital
+        return signal, size
+    return sized
+
+def _strategy_for_run(strategy):
+    """
+    The per-bar callable of `strategy`. Objects with per-run state (for_run(),
+    e.g. StrategyLogic) are copied, so one instance registered with several
+    engines never shares that state between them.
+    """
+    if hasattr(strategy, 'for_run'):
+        strategy = strategy.for_run()
+    return getattr(strategy, 'get_signal', strategy)
+
+def _reset_strategy(strategy_logic):
+    """
+    Clear the per-run state of the object behind a strategy callable, if it keeps any.
+    """
+    owner = getattr(strategy_logic, '__self__', strategy_logic)
+    if hasattr(owner, 'reset'):
+        owner.reset()
+
+def apply_portfolio_guardrails(guardrails, engines, prices, timestamp):
+    """
+    Mark every engine to its price (one per engine, or one for all) and set
+    its halted / entries_blocked flags from one PortfolioGuardrails update.
+    """
+    quantity = np.array([engine.current_position['quantity'] for engine in engines])
+    entry = np.array([engine.current_position['entry_price'] for engine in engines])
+    capital = np.array([engine.capital for engine in engines])
+    prices = np.broadcast_to(prices, quantity.shape)
+    halt, block = guardrails.update(capital + quantity * (prices - entry), quantity * prices, timestamp)
+    for engine, halted in zip(engines, halt):
+        engine.halted = bool(halted)
+        engine.entries_blocked = block
+
+class PortfolioBacktest:
+    """
+    Runs one strategy per symbol on a shared timeline, so portfolio guardrails
+    see the combined equity and exposure of all symbols at every bar.
+
+    Each symbol keeps its own BacktestEngine and bars. At every timestamp the
+    symbols with a bar are marked to its close (the others keep their last
+    mark), the guardrails are evaluated once for all symbols, and then those
+    engines step. Without guardrails the results equal separate runs.
+
+    With covariance_sizing, an EWMACovariance across all symbols is updated on
+    the same timeline, and new entries are sized to its target weights
+    (EWMACovariance.weights) instead of the strategy's own size.
+    """
+    def __init__(self, initial_capital=10000.0, fee=0.001, max_drawdown=0.20, stop_on_halt=True, portfolio_guardrails=None,
+                 covariance_sizing=None, target_volatility=0.20, leverage_cap=2.0, ewma_lambda=0.94, periods_per_year=8760):
+        """
+        Args:
+            initial_capital (float): Capital of each symbol's engine.
+            portfolio_guardrails (PortfolioGuardrails): Limits on the combined
+                equity/exposure of all symbols. Halted symbols are flattened, and
+                new entries are skipped while an exposure cap is reached.
+            covariance_sizing (str): None (strategy sizes), or an EWMACovariance.weights()
+                method: 'volatility_target', 'portfolio_volatility' or 'risk_parity'.
+                An entry's size is weight * the symbol engine's equity; until the
+                estimate is ready (or for a zero weight) the strategy's size is kept.
+        """
+        if covariance_sizing not in (None, 'volatility_target', 'portfolio_volatility', 'risk_parity'):
+            raise ValueError(f"Unknown sizing method: {covariance_sizing}")
+        self.portfolio_guardrails = portfolio_guardrails
+        self.covariance_sizing = covariance_sizing
+        self.sizing_params = {'target_volatility': target_volatility, 'leverage_cap': leverage_cap}
+        self.ewma_lambda = ewma_lambda
+        self.periods_per_year = periods_per_year
+        self.covariance = None
+        self.defaults = {
+            'initial_capital': initial_capital,
+            'fee': fee,
+            'max_drawdown': max_drawdown,
+            'stop_on_halt': stop_on_halt
+        }
+        self.engines = {}
+        self.strategies = {}
+        self.data = {}
+
+    def add(self, symbol, data, strategy, **engine_kwargs):
+        """
+        Register a symbol with its bars (sorted by timestamp, with features) and strategy.
+        """
+        if symbol in self.engines:
+            raise ValueError(f"Symbol already registered: {symbol}")
+        self.engines[symbol] = BacktestEngine(**dict(self.defaults, **engine_kwargs))
+        self.strategies[symbol] = _strategy_for_run(strategy)
+        self.data[symbol] = data.reset_index(drop=True)
+        return self.engines[symbol]
+
+    @profiler.timed('backtest_loop')
+    def run(self):
+        """
+        Returns:
+            dict: {symbol: equity DataFrame}
+        """
+        symbols = list(self.engines)
+        engines = [self.engines[symbol] for symbol in symbols]
+        frames = [self.data[symbol] for symbol in symbols]
+        timeline = np.unique(np.concatenate([frame['timestamp'].to_numpy() for frame in frames]))
+
+        # Row of each symbol at every timeline step (-1 where the symbol has no bar)
+        rows = []
+        for frame in frames:
+            times = frame['timestamp'].to_numpy()
+            position = np.minimum(np.searchsorted(times, timeline), len(times) - 1)
+            rows.append(np.where(times[position] == timeline, position, -1))
+
+        for strategy in self.strategies.values():
+            _reset_strategy(strategy)
+        if self.portfolio_guardrails is not None:
+            self.portfolio_guardrails.reset()
+        strategies = [self.strategies[symbol] for symbol in symbols]
+        weights = np.zeros(len(symbols))
+        if self.covariance_sizing is not None:
+            self.covariance = EWMACovariance(symbols, lam=self.ewma_lambda, periods_per_year=self.periods_per_year)
+            strategies = [_covariance_sized(strategy, weights, i) for i, strategy in enumerate(strategies)]
+
+        prices = np.zeros(len(symbols)) # Flat symbols contribute nothing before their first bar
+        active = list(range(len(symbols)))
+        for step, timestamp in enumerate(timeline):
+            bars = [(i, frames[i].iloc[rows[i][step]]) for i in active if rows[i][step] >= 0]
+            for i, row in bars:
+                prices[i] = row['close']
+            if self.covariance is not None:
+                # Symbols without a bar at this time have no return (NaN), not a zero return
+                closes = np.full(len(symbols), np.nan)
+                for i, row in bars:
+                    closes[i] = row['close']
+                self.covariance.update_prices(closes)
+                if self.covariance.ready:
+                    weights[:] = list(self.covariance.weights(method=self.covariance_sizing, **self.sizing_params).values())
+            if self.portfolio_guardrails is not None:
+                apply_portfolio_guardrails(self.portfolio_guardrails, engines, prices, timestamp)
+            for i, row in bars:
+                reason = engines[i].step(row, strategies[i])
+                if reason is not None:
+                    engines[i]._stop(frames[i], rows[i][step], reason)
+                    active.remove(i)
+            if not active:
+                break
+        return self.results()
+
+    def results(self):
+        return {symbol: engine.equity_frame() for symbol, engine in self.engines.items()}
+
+    def calculate_metrics(self):
+        """
+        Returns:
+            dict: {symbol: metrics dict}
+        """
+        return {symbol: engine.calculate_metrics() for symbol, engine in self.engines.items()}
@@ -0,0 +1,198 @@
+﻿import os
+import numpy as np
+import pandas as pd
+from analysis.profiler import profiler
+from utils.rng import rng_service
+
+def resample_indices(n, count, block_length, rng, method='stationary'):
+    """
+    Block-bootstrap index matrix of shape (count, n), built without Python loops.
+
+    'stationary' (Politis-Romano): blocks of geometric length with mean
+    `block_length`, wrapping around the end. 'circular': fixed-length blocks.
+    Only one random start and length is drawn per block, and the indices are
+    expanded with np.repeat.
+    """
+    # 1. Block lengths per resample, enough blocks to cover n
+    if method == 'stationary':
+        p = 1.0 / block_length
+        n_blocks = int(n * p + 6 * np.sqrt(n * p) + 10)
+        lengths = rng.geometric(p, size=(count, n_blocks))
+        while (lengths.sum(axis=1) < n).any(): # Very unlikely; add more blocks
+            lengths = np.concatenate([lengths, rng.geometric(p, size=(count, n_blocks))], axis=1)
+    elif method == 'circular':
+        length = max(1, int(round(block_length)))
+        lengths = np.full((count, -(-n // length)), length)
+    else:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+
+    # 2. Truncate every resample to exactly n elements
+    ends = np.minimum(np.cumsum(lengths, axis=1), n)
+    begins = np.concatenate([np.zeros((count, 1), dtype=ends.dtype), ends[:, :-1]], axis=1)
+    lengths = (ends - begins).ravel()
+
+    # 3. Element t of a block starting at `start` (placed at `begin`) is start + t - begin, wrapped
+    starts = rng.integers(0, n, size=lengths.shape)
+    idx = np.repeat(starts - begins.ravel(), lengths).reshape(count, n)
+    idx += np.arange(n)
+    idx[idx >= n] -= n
+    return idx
+
+def bar_metrics(returns, periods_per_year=8760, log_returns=None):
+    """
+    Metrics of bar-return paths, shape (paths, bars): annualized Sharpe,
+    max drawdown (%) and total return (%).
+
+    Args:
+        log_returns (array): log1p(returns), if already computed (same shape).
+    """
+    n = returns.shape[1]
+    mean = returns.sum(axis=1) / n
+    std = np.sqrt(np.maximum(np.einsum('ij,ij->i', returns, returns) / n - mean ** 2, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods_per_year), 0.0)
+
+    log_growth = np.cumsum(np.log1p(returns) if log_returns is None else log_returns, axis=1)
+    drawdown = np.maximum.accumulate(log_growth, axis=1)
+    np.maximum(drawdown, 0.0, out=drawdown)
+    np.subtract(log_growth, drawdown, out=drawdown)
+    return {
+        'sharpe': sharpe,
+        'max_drawdown': (1.0 - np.exp(drawdown.min(axis=1))) * 100,
+        'total_return': np.expm1(log_growth[:, -1]) * 100
+    }
+
+def trade_metrics(pnl):
+    """
+    Metrics of trade-PnL samples, shape (paths, trades): profit factor and
+    win rate (%), defined as in BacktestEngine.calculate_metrics.
+    """
+    gross_profit = np.where(pnl > 0, pnl, 0.0).sum(axis=1)
+    gross_loss = np.where(pnl <= 0, pnl, 0.0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_factor = np.where(gross_loss != 0, gross_profit / np.abs(gross_loss), np.inf)
+    return {
+        'profit_factor': profit_factor,
+        'win_rate': (pnl > 0).mean(axis=1) * 100
+    }
+
+class BlockBootstrap:
+    """
+    Confidence intervals for backtest metrics from block-bootstrap resamples
+    of the bar returns (Sharpe, max drawdown, total return) and of the trade
+    PnLs (profit factor, win rate).
+
+    Blocks keep the short-range dependence (volatility clustering, trade
+    streaks) that an i.i.d. bootstrap would destroy. Resamples are built and
+    evaluated as (chunk, bars) matrices; chunks run on a thread pool (NumPy
+    releases the GIL) and each chunk has its own child seed, so the result
+    depends only on `seed`, not on the number of workers.
+    """
+    def __init__(self, num_resamples=10000, block_length=None, trade_block_length=None, method='stationary',
+                 confidence=0.95, chunk_size=250, max_workers=None, seed=None):
+        """
+        Args:
+            block_length (float): Mean block length in bars (default n ** (1/3)).
+            trade_block_length (float): Mean block length in trades (default m ** (1/3)).
+            method (str): 'stationary' or 'circular'.
+            confidence (float): Two-sided interval level.
+            chunk_size (int): Resamples per chunk (bounds memory: chunk_size x bars).
+        """
+        self.num_resamples = num_resamples
+        self.block_length = block_length
+        self.trade_block_length = trade_block_length
+        self.method = method
+        self.confidence = confidence
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.seed = seed
+        self.seed_sequence = np.random.SeedSequence(seed) if seed is not None else rng_service.spawn('bootstrap')
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build from config['bootstrap'], or return None when it is missing or disabled.
+        """
+        settings = dict(config.get('bootstrap') or {})
+        if not settings.pop('enabled', False):
+            return None
+        return cls(**settings)
+
+    def _chunks(self, stream):
+        """
+        (size, Generator) per chunk; child seeds are spawned per stream and chunk.
+        """
+        sizes = [min(self.chunk_size, self.num_resamples - start) for start in range(0, self.num_resamples, self.chunk_size)]
+        stream_seed = np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=self.seed_sequence.spawn_key + (stream,))
+        children = rng_service.chunk_seeds(stream_seed, len(sizes))
+        return [(size, np.random.default_rng(child)) for size, child in zip(sizes, children)]
+
+    def _evaluate(self, values, block_length, metric_fn, stream, **kwargs):
+        """
+        Metric samples over all resamples of `values`, chunked across threads.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        n = len(values)
+        log_values = np.log1p(values) if metric_fn is bar_metrics else None
+        if block_length is None:
+            block_length = max(1.0, n ** (1 / 3))
+
+        def run_chunk(chunk):
+            size, rng = chunk
+            idx = resample_indices(n, size, block_length, rng, self.method)
+            if metric_fn is bar_metrics:
+                return bar_metrics(values[idx], log_returns=log_values[idx], **kwargs)
+            return metric_fn(values[idx], **kwargs)
+
+        chunks = self._chunks(stream)
+        workers = min(self.max_workers or os.cpu_count() or 1, len(chunks))
+        if workers <= 1:
+            parts = [run_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(run_chunk, chunks))
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def _interval(self, estimate, samples):
+        finite = samples[np.isfinite(samples)]
+        alpha = (1 - self.confidence) / 2
+        if len(finite) == 0:
+            return {'estimate': estimate, 'lower': np.nan, 'upper': np.nan, 'std': np.nan}
+        lower, upper = np.percentile(finite, [alpha * 100, (1 - alpha) * 100])
+        return {'estimate': estimate, 'lower': lower, 'upper': upper, 'std': finite.std()}
+
+    @profiler.timed('bootstrap')
+    def run(self, equity=None, trades=None, periods_per_year=8760):
+        """
+        Args:
+            equity (DataFrame or array): Equity curve (an 'equity' column or values).
+            trades (list or DataFrame): Closed trades with 'pnl' (engine.positions).
+            periods_per_year (float): Bars per year for the Sharpe ratio.
+
+        Returns:
+            DataFrame: One row per metric with 'estimate' (on the original data),
+                'lower', 'upper' and 'std'. Infinite profit factors (no losing
+                trade in a resample) are left out of the interval.
+        """
+        rows = {}
+        if equity is not None:
+            values = equity['equity'] if isinstance(equity, pd.DataFrame) else equity
+            returns = pd.Series(np.asarray(values, dtype=float)).pct_change().dropna().to_numpy()
+            if len(returns) > 1:
+                point = bar_metrics(returns[None, :], periods_per_year)
+                samples = self._evaluate(returns, self.block_length, bar_metrics, 0, periods_per_year=periods_per_year)
+                for name in samples:
+                    rows[name] = self._interval(point[name][0], samples[name])
+
+        if trades is not None:
+            trades = pd.DataFrame(trades)
+            if len(trades) > 1:
+                pnl = trades['pnl'].to_numpy(dtype=float)
+                point = trade_metrics(pnl[None, :])
+                samples = self._evaluate(pnl, self.trade_block_length, trade_metrics, 1)
+                for name in samples:
+                    rows[name] = self._interval(point[name][0], samples[name])
+                # Share of resamples in which the strategy does not make money
+                rows['profit_factor']['p_below_1'] = (samples['profit_factor'] <= 1).mean()
+
+        return pd.DataFrame(rows).T
@@ -1,6 +1,5 @@
 ﻿import numpy as np
 import pandas as pd
-import scipy.stats as stats
 
 class TradeDependence:
     def __init__(self):
@@ -25,11 +24,8 @@ class TradeDependence:
         if n1 == 0 or n0 == 0:
             return {'z_score': 0, 'p_value': 1.0}
 
-        # Calculate number of runs
-        runs = 1 # Start with 1 run
-        for i in range(1, n):
-            if outcomes[i] != outcomes[i-1]:
-                runs += 1
+        # Calculate number of runs (one more than the number of changes)
+        runs = 1 + int(np.count_nonzero(np.diff(outcomes)))
                 
         # Expected runs and variance
         expected_runs = ((2 * n1 * n0) / n) + 1
@@ -40,7 +36,8 @@ class TradeDependence:
         else:
             z_score = (runs - expected_runs) / np.sqrt(variance)
             
-        p_value = 2 * (1 - stats.norm.cdf(abs(z_score))) # Two-tailed
+        from scipy.stats import norm
+        p_value = 2 * (1 - norm.cdf(abs(z_score))) # Two-tailed
         
         return {
             'runs': runs,
@@ -49,3 +46,88 @@ class TradeDependence:
             'p_value': p_value,
             'is_random': p_value > 0.05
         }
+
+    def batch(self, sequences, max_lag=10):
+        """
+        Runs test, autocorrelation and Ljung-Box for many trade sequences at once
+        (e.g. every symbol x optimizer trial).
+
+        The sequences are packed into one NaN-padded (sequences, trades) matrix,
+        so every statistic is a handful of array operations regardless of the
+        number of sequences.
+
+        Args:
+            sequences (dict or list): Trade returns (or PnL) per sequence; lengths may differ.
+                A win is a value > 0.
+            max_lag (int): Autocorrelation lags 1..max_lag (also the Ljung-Box lags).
+
+        Returns:
+            DataFrame: One row per sequence with 'trades', 'wins', 'runs',
+                'expected_runs', 'runs_z', 'runs_p', 'acf_1'..'acf_<max_lag>',
+                'ljung_box_q', 'ljung_box_p' and 'is_random' (both tests at 5%).
+        """
+        from scipy.stats import norm, chi2
+        if isinstance(sequences, dict):
+            names, sequences = list(sequences.keys()), list(sequences.values())
+        else:
+            names = list(range(len(sequences)))
+        sequences = [np.asarray(seq, dtype=float).ravel() for seq in sequences]
+        lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+        width = max(int(lengths.max()) if len(lengths) else 0, 1)
+
+        # 1. Pack into a padded matrix
+        valid = np.arange(width)[None, :] < lengths[:, None]
+        values = np.full((len(sequences), width), np.nan)
+        if len(sequences):
+            values[valid] = np.concatenate(sequences)
+        n = lengths.astype(float)
+
+        # 2. Runs test (changes between consecutive valid outcomes)
+        wins = np.where(valid, values > 0, False)
+        n1 = wins.sum(axis=1).astype(float)
+        n0 = n - n1
+        changes = ((wins[:, 1:] != wins[:, :-1]) & valid[:, 1:]).sum(axis=1)
+        runs = np.where(n > 0, 1 + changes, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected_runs = 2 * n1 * n0 / n + 1
+            variance = 2 * n1 * n0 * (2 * n1 * n0 - n) / (n ** 2 * (n - 1))
+            runs_z = np.where(variance > 0, (runs - expected_runs) / np.sqrt(variance), 0.0)
+        runs_p = 2 * norm.sf(np.abs(runs_z))
+        degenerate = (n1 == 0) | (n0 == 0)
+        runs_z[degenerate], runs_p[degenerate] = 0.0, 1.0
+
+        # 3. Autocorrelation of the demeaned sequences (padding contributes zero)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(valid, values, 0.0).sum(axis=1, keepdims=True) / n[:, None]
+        centered = np.where(valid, values - means, 0.0)
+        denominator = (centered ** 2).sum(axis=1)
+        acf = np.full((len(sequences), max_lag), np.nan)
+        q = np.zeros(len(sequences))
+        for lag in range(1, max_lag + 1):
+            if lag >= width:
+                break
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rho = (centered[:, :-lag] * centered[:, lag:]).sum(axis=1) / denominator
+            usable = (n > lag) & (denominator > 0)
+            acf[usable, lag - 1] = rho[usable]
+            q[usable] += rho[usable] ** 2 / (n[usable] - lag)
+
+        # 4. Ljung-Box over the lags each sequence is long enough for
+        q = n * (n + 2) * q
+        lags_used = np.clip(np.minimum(n - 1, max_lag), 0, None)
+        ljung_box_p = np.where(lags_used > 0, chi2.sf(q, np.maximum(lags_used, 1)), 1.0)
+
+        result = pd.DataFrame({
+            'trades': lengths,
+            'wins': n1.astype(np.int64),
+            'runs': runs.astype(np.int64),
+            'expected_runs': expected_runs,
+            'runs_z': runs_z,
+            'runs_p': runs_p
+        }, index=names)
+        for lag in range(1, max_lag + 1):
+            result[f"acf_{lag}"] = acf[:, lag - 1]
+        result['ljung_box_q'] = q
+        result['ljung_box_p'] = ljung_box_p
+        result['is_random'] = (runs_p > 0.05) & (ljung_box_p > 0.05)
+        return result
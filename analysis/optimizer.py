@@ -1,4 +1,6 @@
-﻿import optuna
+﻿import argparse
+import copy
+import optuna
 import pandas as pd
 import numpy as np
 import yaml
@@ -6,80 +8,306 @@ from data.fetcher import DataFetcher
 from strategy.indicators import Indicators
 from strategy.regime import RegimeDetection
 from strategy.logic import StrategyLogic
+from strategy.mtf import MultiTimeframeFeatures
 from analysis.backtest import BacktestEngine
+from analysis.profiler import profiler
+from analysis import result_cache as result_cache_module
+from analysis.result_cache import result_cache, dataset_hash
+
+STUDY_STORAGE = 'sqlite:///optuna_studies.db'
+MAX_REPORTED_PF = 10.0
 
 def load_config(path='config.yaml'):
     with open(path, 'r', encoding='utf-8-sig') as file:
         return yaml.safe_load(file)
 
+def create_study(study_name, storage=STUDY_STORAGE, direction='maximize'):
+    """
+    Create a persistent study, or resume the stored one with the same name.
+    Trials are saved as they finish, so a crash or Ctrl-C loses at most the running trial.
+    """
+    pruner = optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=3000)
+    return optuna.create_study(study_name=study_name, storage=storage, direction=direction,
+                               load_if_exists=True, pruner=pruner)
+
+def study_name(prefix, df):
+    """
+    Default study name: `prefix` plus the dataset hash, so a rerun on the same
+    bars resumes the study and a rerun on changed data starts a new one.
+    """
+    return f"{prefix}_{dataset_hash(df)}"
+
+def best_trial(study):
+    """
+    Best completed full-fidelity trial, or None when there is none (all pruned or failed).
+
+    Multi-fidelity trials carry a 'fidelity' attribute (share of the bars they
+    were last scored on); only those scored on the full history are eligible.
+    """
+    trials = [t for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+              if t.user_attrs.get('fidelity', 1.0) >= 1.0]
+    if not trials:
+        return None
+    pick = max if study.direction == optuna.study.StudyDirection.MAXIMIZE else min
+    return pick(trials, key=lambda t: t.value)
+
+def run_study(study, objective, n_trials, **kwargs):
+    """
+    Run the trials still missing to reach `n_trials` finished trials.
+    """
+    finished_states = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+    done = len(study.get_trials(deepcopy=False, states=finished_states))
+    remaining = max(n_trials - done, 0)
+    if done:
+        print(f"Resuming study '{study.study_name}': {done} trials done, {remaining} to go.")
+    try:
+        study.optimize(objective, n_trials=remaining, **kwargs)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Finished trials are stored; rerun to resume '{study.study_name}'.")
+    return study
+
+def make_pruning_callback(trial, min_trades):
+    """
+    BacktestEngine checkpoint callback that reports the running profit factor
+    and prunes trials that can no longer produce a useful result:
+    - the circuit breaker halted trading for good before `min_trades` trades,
+    - past half the data, the trade rate projects to under half of `min_trades`,
+    - the pruner ranks the intermediate profit factor below the median.
+    """
+    def on_checkpoint(engine, bars_done, total_bars):
+        metrics = engine.calculate_metrics()
+        trades = metrics['total_trades']
+        if engine.guardrails.circuit_breaker_triggered and trades < min_trades:
+            raise optuna.TrialPruned(f"Circuit breaker halted trading after {trades} trades")
+
+        progress = bars_done / total_bars
+        if progress >= 0.5 and trades / progress < min_trades * 0.5:
+            raise optuna.TrialPruned(f"Projected {trades / progress:.0f} trades < {min_trades}")
+
+        trial.report(min(metrics['profit_factor'], MAX_REPORTED_PF), step=bars_done)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+    return on_checkpoint
+
 def objective(trial):
-    # 1. Load Base Config
-    config = load_config()
-    
-    # 2. Suggest Parameters
+    with profiler.context(trial=trial.number):
+        return _objective(trial)
+
+def suggest_params(trial, config):
+    """
+    Apply the search space to `config` in place.
+    """
     config['strategy']['indicators']['ma_short'] = trial.suggest_int('ma_short', 10, 100)
     config['strategy']['indicators']['ma_long'] = trial.suggest_int('ma_long', 100, 300)
     config['strategy']['indicators']['rsi_period'] = trial.suggest_int('rsi_period', 10, 30)
     config['strategy']['indicators']['adx_threshold'] = trial.suggest_int('adx_threshold', 10, 30)
     config['strategy']['risk']['stop_loss_atr'] = trial.suggest_float('stop_loss_atr', 1.0, 5.0)
     config['strategy']['risk']['take_profit_atr'] = trial.suggest_float('take_profit_atr', 2.0, 10.0)
+    return config
+
+def score_metrics(metrics, min_trades=100, min_win_rate=50.0):
+    """
+    Objective value: profit factor, or 0.0 when the trade-count / win-rate constraints fail.
+    """
+    if metrics['total_trades'] < min_trades:
+        return 0.0
+    if metrics['win_rate'] < min_win_rate:
+        return 0.0
+    return metrics['profit_factor']
+
+def _objective(trial):
+    # 1. Load Base Config
+    config = load_config()
+    
+    # 2. Suggest Parameters
+    suggest_params(trial, config)
     
     # 3. Prepare Data
     global cached_df
     if cached_df is None or cached_df.empty:
         return 0.0
         
-    df = cached_df.copy()
-
-    # 4. Recalculate Indicators (Dynamic based on params)
-    inds = config['strategy']['indicators']
-    df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
-    df = Indicators.rsi(df, window=inds['rsi_period'])
-    df = Indicators.bollinger_bands(df, window=inds['bb_window'], num_std=inds['bb_std'])
-    df = Indicators.atr(df, window=inds['atr_window'])
-    df = Indicators.adx(df, window=14)
-    try:
-        df = Indicators.garch_volatility(df)
-    except:
-        df['garch_vol'] = 2.0
-        
-    regime = RegimeDetection(df)
-    df = regime.detect_regime()
+    engine_params = {
+        'initial_capital': config['backtest']['initial_capital'],
+        'fee': config['backtest'].get('fee', 0.001),
+        'max_drawdown': 0.15
+    }
 
-    # 5. Run Backtest (Enable CB)
-    engine = BacktestEngine(
-        initial_capital=config['backtest']['initial_capital'], 
-        fee=config['backtest'].get('fee', 0.001),
-        max_drawdown=0.15 
-    )
-    logic = StrategyLogic(config)
-    
-    def strategy_wrapper(row, capital, current_position):
-        return logic.get_signal(row, capital, current_position)
+    def run_backtest():
+        df = cached_df.copy()
 
-    results = engine.run(df, strategy_wrapper)
-    
-    # 6. Calculate Metric
-    metrics = engine.calculate_metrics()
+        # 4. Recalculate Indicators (Dynamic based on params)
+        inds = config['strategy']['indicators']
+        df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
+        df = Indicators.rsi(df, window=inds['rsi_period'])
+        df = Indicators.bollinger_bands(df, window=inds['bb_window'], num_std=inds['bb_std'])
+        df = Indicators.atr(df, window=inds['atr_window'])
+        df = Indicators.adx(df, window=14)
+        try:
+            df = Indicators.garch_volatility(df)
+        except:
+            df['garch_vol'] = 2.0
+
+        regime = RegimeDetection(df)
+        df = regime.detect_regime()
+        mtf = MultiTimeframeFeatures.from_config(config)
+        if mtf is not None:
+            df = mtf.compute(df)
+
+        # 5. Run Backtest (Enable CB)
+        engine = BacktestEngine(**engine_params)
+        logic = StrategyLogic(config)
+
+        def strategy_wrapper(row, capital, current_position):
+            return logic.get_signal(row, capital, current_position)
+
+        results = engine.run(df, strategy_wrapper, on_checkpoint=make_pruning_callback(trial, min_trades=100))
+        return engine.calculate_metrics(), results
+
+    # 6. Calculate Metric (identical parameter sets are served from the result cache)
+    metrics, _, _ = result_cache.get_or_run(
+        cached_df, {'strategy': config['strategy'], 'engine': engine_params}, run_backtest, pipeline='optimizer'
+    )
     profit_factor = metrics['profit_factor']
     win_rate = metrics['win_rate']
     
     # Constraints
-    if metrics['total_trades'] < 100: 
-        return 0.0
-    if win_rate < 50.0: 
+    score = score_metrics(metrics)
+    if score == 0.0:
         return 0.0
         
     print(f"Trial {trial.number}: PF={profit_factor:.2f}, WR={win_rate:.2f}%, Trades={metrics['total_trades']}")
-    return profit_factor
+    return score
+
+class IndicatorCache:
+    """
+    Full-length indicator columns computed once per parameter value and reused
+    across candidates. Parameter-independent features (Bollinger, ATR, ADX,
+    GARCH, regime) are computed a single time.
+    """
+    def __init__(self, df, config):
+        inds = config['strategy']['indicators']
+        base = df.copy()
+        base = Indicators.bollinger_bands(base, window=inds['bb_window'], num_std=inds['bb_std'])
+        base = Indicators.atr(base, window=inds['atr_window'])
+        base = Indicators.adx(base, window=14)
+        try:
+            base = Indicators.garch_volatility(base)
+        except:
+            base['garch_vol'] = 2.0
+        base = RegimeDetection(base).detect_regime()
+        mtf = MultiTimeframeFeatures.from_config(config)
+        self.base = mtf.compute(base) if mtf is not None else base
+        self._columns = {}
+
+    def _get(self, key, compute):
+        if key not in self._columns:
+            self._columns[key] = compute()
+        return self._columns[key]
+
+    def features(self, config):
+        inds = config['strategy']['indicators']
+        close = self.base[['close']]
+        df = self.base.copy()
+        df['ma_short'] = self._get(('ma', inds['ma_short']), lambda: Indicators.ma_crossover(close.copy(), inds['ma_short'], inds['ma_short'])['ma_short'])
+        df['ma_long'] = self._get(('ma', inds['ma_long']), lambda: Indicators.ma_crossover(close.copy(), inds['ma_long'], inds['ma_long'])['ma_long'])
+        df['rsi'] = self._get(('rsi', inds['rsi_period']), lambda: Indicators.rsi(close.copy(), window=inds['rsi_period'])['rsi'])
+        return df
+
+def _evaluate_slice(features, config, n_bars, min_trades):
+    engine = BacktestEngine(
+        initial_capital=config['backtest']['initial_capital'],
+        fee=config['backtest'].get('fee', 0.001),
+        max_drawdown=0.15
+    )
+    logic = StrategyLogic(config)
+    engine.run(features.iloc[-n_bars:], logic.get_signal)
+    metrics = engine.calculate_metrics()
+    return score_metrics(metrics, min_trades=min_trades), metrics
+
+def successive_halving(df, base_config, n_candidates=27, fractions=(1/9, 1/3, 1.0), keep=1/3,
+                       min_trades=100, study=None, seed=None):
+    """
+    Multi-fidelity search over data length (a successive-halving bracket, as in Hyperband).
+
+    Every candidate is scored on the most recent `fractions[0]` of the bars; the
+    best `keep` share is promoted to the next, longer slice, and so on up to the
+    full history. The trade-count constraint is scaled with the slice length.
+    Indicators come from one full-length computation sliced per rung.
+
+    Args:
+        study (optuna.Study): Study used to sample candidates (ask/tell). Candidates
+            dropped at a lower rung are recorded as pruned, and every trial is tagged
+            with the 'fidelity' it was last scored at. Defaults to an in-memory study
+            with a seeded random sampler.
+
+    Returns:
+        dict: Best parameters and score, per-rung results and the number of bar evaluations.
+    """
+    if study is None:
+        study = optuna.create_study(direction='maximize', sampler=optuna.samplers.RandomSampler(seed=seed))
+
+    cache = IndicatorCache(df, base_config)
+    candidates = []
+    for _ in range(n_candidates):
+        trial = study.ask()
+        config = suggest_params(trial, copy.deepcopy(base_config))
+        candidates.append({'trial': trial, 'config': config, 'features': None, 'score': 0.0})
+
+    rungs = []
+    bar_evaluations = 0
+    survivors = candidates
+    for rung, fraction in enumerate(fractions):
+        n_bars = max(int(len(df) * fraction), 1)
+        rung_min_trades = max(int(min_trades * fraction), 1)
+        for cand in survivors:
+            if cand['features'] is None:
+                cand['features'] = cache.features(cand['config'])
+            cand['score'], cand['metrics'] = _evaluate_slice(cand['features'], cand['config'], n_bars, rung_min_trades)
+            cand['trial'].report(min(cand['score'], MAX_REPORTED_PF), step=n_bars)
+            cand['trial'].set_user_attr('fidelity', fraction)
+            bar_evaluations += n_bars
+
+        # Ties at 0.0 (failed constraints) are broken by the raw profit factor
+        survivors = sorted(survivors, key=lambda c: (c['score'], min(c['metrics']['profit_factor'], MAX_REPORTED_PF)), reverse=True)
+        rungs.append({'bars': n_bars, 'evaluated': len(survivors), 'best_score': survivors[0]['score']})
+        print(f"Rung {rung + 1}: {len(survivors)} candidates on last {n_bars} bars, best score {survivors[0]['score']:.2f}")
+
+        if rung < len(fractions) - 1:
+            n_keep = max(int(round(len(survivors) * keep)), 1)
+            for cand in survivors[n_keep:]:
+                study.tell(cand['trial'], state=optuna.trial.TrialState.PRUNED)
+                cand['features'] = None
+            survivors = survivors[:n_keep]
+
+    for cand in survivors:
+        study.tell(cand['trial'], cand['score'])
+
+    best = survivors[0]
+    return {
+        'best_params': best['trial'].params,
+        'best_score': best['score'],
+        'best_metrics': best['metrics'],
+        'rungs': rungs,
+        'bar_evaluations': bar_evaluations,
+        'full_fidelity_bar_evaluations': n_candidates * len(df)
+    }
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize strategy parameters")
+    parser.add_argument('--study', help="Study name to create or resume")
+    parser.add_argument('--trials', type=int, default=50, help="Total finished trials wanted")
+    parser.add_argument('--storage', default=STUDY_STORAGE)
+    parser.add_argument('--multi-fidelity', action='store_true', help="Successive halving over data length")
+    parser.add_argument('--candidates', type=int, default=27, help="Candidates in the multi-fidelity bracket")
+    args = parser.parse_args()
+
     print("--- Starting Optimization with Real Data ---")
     
     # Load Config to get source
     config = load_config()
     source = config['backtest'].get('source', 'yahoo')
-    symbol = config['backtest']['symbol']
+    symbol = config['backtest'].get('symbol') or config['backtest']['symbols'][0]
     timeframe = config['backtest']['timeframe']
     limit = 18000 # Force 2 years
     
@@ -95,14 +323,32 @@ if __name__ == "__main__":
     
     print(f"Loaded {len(cached_df)} rows.")
 
-    study = optuna.create_study(direction='maximize')
-    study.optimize(objective, n_trials=50) 
+    profiling = config.get('profiling', {})
+    if profiling.get('enabled'):
+        profiler.enable(track_memory=profiling.get('track_memory', True))
+    result_cache_module.configure(config)
+
+    # Multi-fidelity brackets get their own study, apart from full-length trials
+    prefix = f"optimizer_{symbol}_{timeframe}" + ('_mf' if args.multi_fidelity else '')
+    study = create_study(args.study or study_name(prefix, cached_df), storage=args.storage)
+    if args.multi_fidelity:
+        result = successive_halving(cached_df, config, n_candidates=args.candidates, study=study)
+        saved = 1 - result['bar_evaluations'] / result['full_fidelity_bar_evaluations']
+        print(f"Bar evaluations: {result['bar_evaluations']} ({saved*100:.0f}% fewer than full fidelity)")
+    else:
+        run_study(study, objective, args.trials)
 
     print("Number of finished trials: ", len(study.trials))
-    print("Best trial:")
-    trial = study.best_trial
+    trial = best_trial(study)
+    if trial is None:
+        print("No trial completed (all pruned or failed).")
+    else:
+        print("Best trial:")
+        print("  Value: ", trial.value)
+        print("  Params: ")
+        for key, value in trial.params.items():
+            print(f"    {key}: {value}")
 
-    print("  Value: ", trial.value)
-    print("  Params: ")
-    for key, value in trial.params.items():
-        print(f"    {key}: {value}")
+    if profiler.enabled:
+        profiler.print_summary()
+        profiler.save(profiling.get('output', 'profile_report.json'))
@@ -1,36 +1,62 @@
-﻿import numpy as np
+﻿import os
+import numpy as np
 import pandas as pd
+from utils.rng import rng_service
 
 class PermutationTest:
-    def __init__(self, num_permutations=1000):
+    def __init__(self, num_permutations=1000, seed=None, chunk_size=1000, max_workers=None):
+        """
+        Args:
+            seed (int): Seed for reproducible runs. By default each instance gets
+                its own stream from the shared RNG service (utils.rng).
+            chunk_size (int): Permutations per chunk, each with its own child
+                seed, so results do not depend on max_workers.
+        """
         self.num_permutations = num_permutations
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.seed_sequence = np.random.SeedSequence(seed) if seed is not None else rng_service.spawn('permutation')
+
+    def _permuted_means(self, returns, size, seed_sequence):
+        """
+        Means of `size` sign-randomized copies of the returns, as one matrix.
+        """
+        rng = np.random.default_rng(seed_sequence)
+        signs = rng.integers(0, 2, size=(size, len(returns)), dtype=np.int8) * 2 - 1
+        return (signs @ returns) / len(returns)
 
     def run_test(self, returns):
         """
         Run permutation test on strategy returns.
         Null Hypothesis: The strategy returns are random (mean = 0).
-        
+
+        Under the null each return is equally likely to have either sign, so
+        the signs are randomized (a plain shuffle would leave the mean unchanged).
+
         Args:
             returns (pd.Series or np.array): Strategy returns.
-            
+
         Returns:
             dict: p-value and statistics.
         """
-        returns = np.array(returns)
+        from concurrent.futures import ThreadPoolExecutor
+        returns = np.array(returns, dtype=float)
         observed_mean = np.mean(returns)
-        
-        permuted_means = []
-        for _ in range(self.num_permutations):
-            # Shuffle returns to break time dependence
-            permuted = np.random.permutation(returns)
-            permuted_means.append(np.mean(permuted))
-            
-        permuted_means = np.array(permuted_means)
-        
+
+        sizes = [min(self.chunk_size, self.num_permutations - start) for start in range(0, self.num_permutations, self.chunk_size)]
+        seeds = rng_service.chunk_seeds(self.seed_sequence, len(sizes))
+        workers = min(self.max_workers or os.cpu_count() or 1, len(sizes))
+        if workers <= 1:
+            parts = [self._permuted_means(returns, size, seed) for size, seed in zip(sizes, seeds)]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(lambda job: self._permuted_means(returns, *job), zip(sizes, seeds)))
+        permuted_means = np.concatenate(parts)
+
         # Calculate p-value (two-tailed)
         # Proportion of permuted means more extreme than observed mean
         p_value = np.mean(np.abs(permuted_means) >= np.abs(observed_mean))
-        
+
         return {
             'observed_mean': observed_mean,
             'p_value': p_value,
@@ -0,0 +1,236 @@
+﻿import csv
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+class _NullStage:
+    """
+    Shared no-op context returned while profiling is disabled.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, profiler, name, tags):
+        self.profiler = profiler
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        profiler = self.profiler
+        self.parent = profiler._stack[-1] if profiler._stack else None
+        if profiler.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # Fold the peak seen so far into the parent before resetting it for this stage
+            if self.parent is not None:
+                self.parent.peak_seen = max(self.parent.peak_seen, peak)
+            tracemalloc.reset_peak()
+            self.start_mem = current
+            self.peak_seen = current
+        profiler._stack.append(self)
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        profiler = self.profiler
+        profiler._stack.pop()
+
+        peak_mb = None
+        if profiler.track_memory:
+            self.peak_seen = max(self.peak_seen, tracemalloc.get_traced_memory()[1])
+            peak_mb = (self.peak_seen - self.start_mem) / 1e6
+            if self.parent is not None:
+                self.parent.peak_seen = max(self.parent.peak_seen, self.peak_seen)
+
+        record = {'stage': self.name, 'parent': self.parent.name if self.parent else None}
+        record.update(profiler._context)
+        record.update(self.tags)
+        record.update({'wall_s': wall, 'cpu_s': cpu, 'peak_mem_mb': peak_mb, 'error': exc_type is not None})
+        profiler.records.append(record)
+        return False
+
+class _Context:
+    def __init__(self, profiler, tags):
+        self.profiler = profiler
+        self.tags = tags
+
+    def __enter__(self):
+        self.saved = self.profiler._context
+        self.profiler._context = {**self.saved, **self.tags}
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._context = self.saved
+        return False
+
+class Profiler:
+    """
+    Per-stage wall time, CPU time and peak memory instrumentation.
+
+    Stages are recorded with the active context tags (e.g. symbol, trial).
+    While disabled, stage() returns a shared no-op context and timed()
+    wrappers cost a single attribute check per call.
+    """
+    def __init__(self, enabled=False, track_memory=True):
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self.records = []
+        self._context = {}
+        self._stack = []
+
+    def enable(self, track_memory=True):
+        self.enabled = True
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def reset(self):
+        self.records = []
+        self._context = {}
+        self._stack = []
+
+    def stage(self, name, **tags):
+        """
+        Context manager timing one pipeline stage.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, tags)
+
+    def timed(self, name):
+        """
+        Decorator timing every call of a function as stage `name`.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def context(self, **tags):
+        """
+        Context manager attaching tags (symbol=..., trial=...) to every stage inside it.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Context(self, tags)
+
+    def summary(self):
+        """
+        Aggregate records per stage.
+
+        Returns:
+            list: One dict per stage with call count, total/mean wall and CPU time and max peak memory.
+        """
+        stages = {}
+        for record in self.records:
+            agg = stages.setdefault(record['stage'], {'stage': record['stage'], 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_mem_mb': None})
+            agg['calls'] += 1
+            agg['wall_s'] += record['wall_s']
+            agg['cpu_s'] += record['cpu_s']
+            if record['peak_mem_mb'] is not None:
+                agg['peak_mem_mb'] = max(agg['peak_mem_mb'] or 0.0, record['peak_mem_mb'])
+        for agg in stages.values():
+            agg['mean_wall_s'] = agg['wall_s'] / agg['calls']
+        return sorted(stages.values(), key=lambda agg: agg['wall_s'], reverse=True)
+
+    def to_json(self, path):
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'summary': self.summary(),
+            'records': self.records
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, default=str)
+        print(f"Profile report saved to {path}")
+
+    def to_csv(self, path):
+        fields = []
+        for record in self.records:
+            for key in record:
+                if key not in fields:
+                    fields.append(key)
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.records)
+        print(f"Profile records saved to {path}")
+
+    def save(self, path):
+        """
+        Write the report as JSON, or CSV when the path ends with .csv.
+        """
+        if os.path.splitext(path)[1].lower() == '.csv':
+            self.to_csv(path)
+        else:
+            self.to_json(path)
+
+    def print_summary(self, top=15):
+        print(f"{'STAGE':<28} | {'CALLS':>6} | {'WALL s':>9} | {'CPU s':>9} | {'PEAK MB':>8}")
+        for agg in self.summary()[:top]:
+            peak = f"{agg['peak_mem_mb']:.1f}" if agg['peak_mem_mb'] is not None else '-'
+            print(f"{agg['stage']:<28} | {agg['calls']:>6} | {agg['wall_s']:>9.3f} | {agg['cpu_s']:>9.3f} | {peak:>8}")
+
+def compare_reports(baseline_path, current_path, threshold=0.20):
+    """
+    Compare mean wall time per stage between two JSON profile reports.
+
+    Returns:
+        list: Rows with baseline/current mean wall time, ratio and a regression flag.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {agg['stage']: agg for agg in json.load(file)['summary']}
+    with open(current_path, 'r', encoding='utf-8') as file:
+        current = {agg['stage']: agg for agg in json.load(file)['summary']}
+
+    rows = []
+    for stage in sorted(set(baseline) | set(current)):
+        base = baseline.get(stage, {}).get('mean_wall_s')
+        cur = current.get(stage, {}).get('mean_wall_s')
+        ratio = cur / base if base and cur is not None else None
+        rows.append({
+            'stage': stage,
+            'baseline_s': base,
+            'current_s': cur,
+            'ratio': ratio,
+            'regression': ratio is not None and ratio > 1 + threshold
+        })
+    return rows
+
+profiler = Profiler()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != 'compare':
+        print("Usage: python -m analysis.profiler compare <baseline.json> <current.json>")
+        sys.exit(1)
+
+    rows = compare_reports(sys.argv[2], sys.argv[3])
+    print(f"{'STAGE':<28} | {'BASE ms':>9} | {'CUR ms':>9} | {'RATIO':>6}")
+    for row in rows:
+        base = f"{row['baseline_s']*1000:.2f}" if row['baseline_s'] is not None else '-'
+        cur = f"{row['current_s']*1000:.2f}" if row['current_s'] is not None else '-'
+        ratio = f"{row['ratio']:.2f}" if row['ratio'] is not None else '-'
+        flag = '  <-- REGRESSION' if row['regression'] else ''
+        print(f"{row['stage']:<28} | {base:>9} | {cur:>9} | {ratio:>6}{flag}")
+    sys.exit(1 if any(row['regression'] for row in rows) else 0)
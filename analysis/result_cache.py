@@ -0,0 +1,227 @@
+﻿import glob
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Source files whose behaviour determines a backtest result (including the data/
+# modules that strategy and risk code imports: MTF resampling, bar durations)
+CODE_FILES = [
+    'main.py', 'per_coin_optimizer.py',
+    'analysis/backtest.py', 'analysis/optimizer.py', 'analysis/walk_forward.py',
+    'strategy/*.py', 'risk/*.py',
+    'data/resample.py', 'data/synthetic.py'
+]
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+_code_version = None
+
+def code_version(root=None):
+    """
+    Hash of the strategy/backtest source code. Any edit invalidates cached results.
+    """
+    global _code_version
+    if _code_version is None or root is not None:
+        root = root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        digest = hashlib.sha256()
+        for pattern in CODE_FILES:
+            for path in sorted(glob.glob(os.path.join(root, pattern))):
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, 'rb') as file:
+                    digest.update(file.read())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+def dataset_hash(df):
+    """
+    Content hash of the OHLCV columns (row order matters, the index does not).
+    """
+    columns = [c for c in OHLCV_COLUMNS if c in df.columns]
+    hashed = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update(','.join(columns).encode())
+    return digest.hexdigest()[:16]
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        # Integral floats (e.g. 20.0 from YAML) hash the same as ints; others to 12 significant digits
+        return int(value) if value.is_integer() else float(f"{value:.12g}")
+    return value
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def normalize_params(params):
+    """
+    Canonical JSON for a parameter set: sorted keys, ints and floats unified.
+    """
+    return json.dumps(_normalize(params), sort_keys=True, separators=(',', ':'))
+
+class ResultCache:
+    """
+    Content-addressed, size-bounded on-disk cache of backtest results.
+
+    Keys combine the dataset hash, the normalized parameter set, the pipeline
+    name and the code version, so a hit is guaranteed to be the same run.
+    Each entry stores the metrics (JSON), the equity curve (parquet) and any
+    named artifacts the caller asks for, such as the trade log or the feature
+    frame (one parquet file each). Least-recently-used entries are evicted
+    once the cache exceeds max_mb.
+    """
+    def __init__(self, cache_dir='data_storage/results', max_mb=512, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None
+
+    def key(self, df, params, pipeline=''):
+        digest = hashlib.sha256()
+        digest.update(dataset_hash(df).encode())
+        digest.update(normalize_params(params).encode())
+        digest.update(pipeline.encode())
+        digest.update(code_version().encode())
+        return digest.hexdigest()[:32]
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + '.json', base + '.parquet'
+
+    def _artifact_path(self, key, name):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{name}.parquet")
+
+    def get(self, key, artifacts=()):
+        """
+        Args:
+            artifacts (tuple): Names of artifacts the caller needs; an entry
+                stored without one of them is a miss.
+
+        Returns:
+            dict: {'metrics': dict, 'equity': DataFrame, 'artifacts': {name: DataFrame}}
+                or None on a miss.
+        """
+        meta_path, equity_path = self._paths(key)
+        paths = [meta_path, equity_path] + [self._artifact_path(key, name) for name in artifacts]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                metrics = json.load(file)['metrics']
+            equity = pd.read_parquet(equity_path)
+            loaded = {name: pd.read_parquet(self._artifact_path(key, name)) for name in artifacts}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable cache entry {key}: {e}")
+            return None
+        # Touch for LRU eviction
+        for path in paths:
+            os.utime(path)
+        return {'metrics': metrics, 'equity': equity, 'artifacts': loaded}
+
+    def put(self, key, metrics, equity, params=None, artifacts=None):
+        """
+        Args:
+            artifacts (dict): {name: DataFrame} stored next to the entry (e.g. 'trades', 'features').
+        """
+        meta_path, equity_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        paths = [meta_path, equity_path]
+        # Artifacts and the equity curve first: the JSON file marks a complete entry
+        for name, frame in (artifacts or {}).items():
+            path = self._artifact_path(key, name)
+            pd.DataFrame(frame).to_parquet(path, index=False)
+            paths.append(path)
+        equity.to_parquet(equity_path, index=False)
+        with open(meta_path, 'w', encoding='utf-8') as file:
+            # Metrics are stored exactly (no rounding) so a hit is bit-for-bit the original result
+            json.dump({'metrics': metrics, 'params': params, 'code_version': code_version()}, file, default=_json_default)
+
+        # Track the cache size incrementally; rescan the directory only when over budget
+        if self._total_bytes is not None:
+            self._total_bytes += sum(os.path.getsize(path) for path in paths)
+        if self._total_bytes is None or self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def get_or_run(self, df, params, run_fn, pipeline='', artifacts=()):
+        """
+        Return the cached result for (df, params, pipeline), or call run_fn() and store it.
+
+        Args:
+            run_fn (callable): Returns (metrics dict, equity DataFrame), or with
+                `artifacts` (metrics, equity, {name: DataFrame or list of dicts}).
+            artifacts (tuple): Names of extra outputs kept with the entry and
+                returned on a hit, e.g. ('trades', 'features'), so consumers of
+                the trade log or the feature frame see the same data either way.
+
+        Returns:
+            tuple: (metrics, equity, hit), plus the {name: DataFrame} artifacts
+                as a fourth element when `artifacts` is given.
+        """
+        if self.enabled:
+            key = self.key(df, params, pipeline)
+            cached = self.get(key, artifacts)
+            if cached is not None:
+                self.hits += 1
+                result = (cached['metrics'], cached['equity'], True)
+                return result + (cached['artifacts'],) if artifacts else result
+            self.misses += 1
+
+        output = run_fn()
+        metrics, equity = output[:2]
+        extra = {name: pd.DataFrame(output[2][name]) for name in artifacts}
+        if self.enabled:
+            self.put(key, metrics, equity, params=_normalize(params), artifacts=extra)
+        result = (metrics, equity, False)
+        return result + (extra,) if artifacts else result
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for meta_path in glob.glob(os.path.join(self.cache_dir, '*', '*.json')):
+            # The entry's equity curve and artifacts share its key prefix
+            files = [meta_path] + glob.glob(meta_path[:-len('.json')] + '*.parquet')
+            try:
+                size = sum(os.path.getsize(path) for path in files)
+                entries.append((os.path.getmtime(meta_path), size, files))
+            except OSError:
+                continue
+            total += size
+
+        for _, size, files in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            for path in files:
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+        self._total_bytes = total
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.cache_dir, '*', '*')):
+            os.remove(path)
+        self._total_bytes = 0
+
+result_cache = ResultCache()
+
+def configure(config):
+    """
+    Apply the 'result_cache' section of config.yaml to the shared cache.
+    """
+    settings = config.get('result_cache', {})
+    result_cache.enabled = settings.get('enabled', True)
+    result_cache.cache_dir = settings.get('dir', result_cache.cache_dir)
+    result_cache.max_bytes = settings.get('max_mb', 512) * 1024 * 1024
+    result_cache._total_bytes = None
+    return result_cache
@@ -0,0 +1,281 @@
+﻿import json
+import os
+import sys
+import uuid
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from analysis.result_cache import code_version, dataset_hash
+
+INDEX_DIR = 'index'
+# save_run() compacts the index once it has this many files
+COMPACT_AFTER = 200
+
+def _partition_value(symbol):
+    # Hive partition directories cannot contain '/', e.g. BTC/USDT -> BTC-USDT
+    return str(symbol).replace('/', '-')
+
+class RunStore:
+    """
+    Columnar store of backtest runs.
+
+    Layout under `root`:
+        index/<run_id>.parquet                     one index row per run (metadata + metrics)
+        equity/symbol=<SYMBOL>/<run_id>.parquet    equity curve
+        trades/symbol=<SYMBOL>/<run_id>.parquet    closed trades
+
+    Each run writes its own index fragment (atomically, via rename), so a save
+    is O(1) and concurrent processes never overwrite each other's rows; the
+    fragments are read together as one table. compact() merges them into one
+    file, and delete() leaves a tombstone (index/<run_id>.deleted) instead of
+    rewriting the index. Equity curves and trade logs are hive-partitioned by
+    symbol so loads only touch the requested runs.
+    """
+    def __init__(self, root='data_storage/runs', enabled=True):
+        self.root = root
+        self.enabled = enabled
+
+    @property
+    def index_dir(self):
+        return os.path.join(self.root, INDEX_DIR)
+
+    def _index_path(self, run_id):
+        return os.path.join(self.index_dir, f"{run_id}.parquet")
+
+    def _table_path(self, table, symbol, run_id):
+        return os.path.join(self.root, table, f"symbol={_partition_value(symbol)}", f"{run_id}.parquet")
+
+    def save_run(self, symbol, config, metrics, equity, trades=None, df=None, timeframe=None, name='main'):
+        """
+        Persist one run.
+
+        Args:
+            config (dict): Full config used for the run (stored as JSON).
+            metrics (dict): Output of BacktestEngine.calculate_metrics().
+            equity (DataFrame): Equity curve with 'timestamp' and 'equity'.
+            trades (list or DataFrame): Closed trades (engine.positions). Optional.
+            df (DataFrame): Input OHLCV data, used for the data range and hash.
+
+        Returns:
+            str: The run id, or None when the store is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        run_id = datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+
+        # 1. Equity curve
+        equity_path = self._table_path('equity', symbol, run_id)
+        os.makedirs(os.path.dirname(equity_path), exist_ok=True)
+        curve = equity[['timestamp', 'equity']].copy()
+        curve.insert(0, 'run_id', run_id)
+        curve.to_parquet(equity_path, index=False)
+
+        # 2. Trade log
+        trades = pd.DataFrame(trades) if trades is not None else pd.DataFrame()
+        if not trades.empty:
+            trades_path = self._table_path('trades', symbol, run_id)
+            os.makedirs(os.path.dirname(trades_path), exist_ok=True)
+            trades.insert(0, 'run_id', run_id)
+            trades.insert(1, 'trade', range(len(trades)))
+            trades.to_parquet(trades_path, index=False)
+
+        # 3. Index row
+        source = df if df is not None else equity
+        row = {
+            'run_id': run_id,
+            'created': pd.Timestamp.now(),
+            'name': name,
+            'symbol': symbol,
+            'timeframe': timeframe or config.get('backtest', {}).get('timeframe'),
+            'data_start': pd.Timestamp(source['timestamp'].iloc[0]),
+            'data_end': pd.Timestamp(source['timestamp'].iloc[-1]),
+            'n_bars': len(source),
+            'data_hash': dataset_hash(df) if df is not None else None,
+            'code_version': code_version(),
+            'final_equity': float(equity['equity'].iloc[-1]),
+            'config': json.dumps(config, sort_keys=True, default=str)
+        }
+        for key, value in metrics.items():
+            row[key] = value.item() if isinstance(value, np.generic) else value
+        # Written last: a run is listed only once all its files exist
+        self._write_index(run_id, pd.DataFrame([row]))
+        if len(os.listdir(self.index_dir)) > COMPACT_AFTER:
+            self.compact()
+        return run_id
+
+    def _write_index(self, name, rows):
+        # Renamed into place: readers never see a partial fragment
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = self._index_path(name)
+        rows.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+    def runs(self, symbol=None, name=None):
+        """
+        Returns:
+            DataFrame: The run index (one row per run), optionally filtered.
+        """
+        index = self._read_index(*self._index_files())
+        if index.empty:
+            return index
+        if symbol is not None:
+            index = index[index['symbol'] == symbol]
+        if name is not None:
+            index = index[index['name'] == name]
+        return index.reset_index(drop=True)
+
+    def _index_files(self):
+        """
+        Returns:
+            tuple: (index fragment paths, tombstone paths).
+        """
+        if not os.path.exists(self.index_dir):
+            return [], []
+        names = sorted(os.listdir(self.index_dir))
+        return ([os.path.join(self.index_dir, n) for n in names if n.endswith('.parquet')],
+                [os.path.join(self.index_dir, n) for n in names if n.endswith('.deleted')])
+
+    @staticmethod
+    def _read_index(paths, tombstones):
+        if not paths:
+            return pd.DataFrame()
+        # Concatenated in pandas: metric columns may differ between runs (e.g. exit kernel runs)
+        index = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+        deleted = {os.path.basename(path)[:-len('.deleted')] for path in tombstones}
+        # A run can appear twice while a compaction is replacing its fragment
+        index = index[~index['run_id'].isin(deleted)].drop_duplicates(subset='run_id')
+        return index.sort_values('created', kind='stable').reset_index(drop=True)
+
+    def compact(self):
+        """
+        Merge all index fragments (and tombstones) into a single fragment, so
+        runs() opens one file. Saves may continue meanwhile; another compaction
+        is excluded by a lock file.
+
+        Returns:
+            bool: False if another process holds the lock.
+        """
+        lock_path = os.path.join(self.index_dir, 'compact.lock')
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileNotFoundError:
+            return True # Nothing saved yet
+        except FileExistsError:
+            return False
+        try:
+            paths, tombstones = self._index_files()
+            if len(paths) > 1 or tombstones:
+                index = self._read_index(paths, tombstones)
+                # Written before its inputs are removed: every row stays readable throughout
+                self._write_index(f"batch-{uuid.uuid4().hex[:12]}", index)
+                for path in paths + tombstones:
+                    os.remove(path)
+        finally:
+            os.remove(lock_path)
+        return True
+
+    def config(self, run_id):
+        index = self.runs()
+        return json.loads(index.loc[index['run_id'] == run_id, 'config'].iloc[0])
+
+    def _load(self, table, run_ids=None, symbol=None):
+        import pyarrow.dataset as ds
+        base = os.path.join(self.root, table)
+        if not os.path.exists(base):
+            return pd.DataFrame()
+
+        paths = None
+        if run_ids is not None:
+            # Resolve run ids to files through the index instead of scanning every partition
+            index = self.runs()
+            index = index[index['run_id'].isin(list(run_ids))]
+            paths = [self._table_path(table, s, r) for s, r in zip(index['symbol'], index['run_id'])]
+            paths = [p for p in paths if os.path.exists(p)]
+            if not paths:
+                return pd.DataFrame()
+        elif symbol is not None:
+            base = os.path.join(base, f"symbol={_partition_value(symbol)}")
+            if not os.path.exists(base):
+                return pd.DataFrame()
+
+        dataset = ds.dataset(paths or base, format='parquet')
+        return dataset.to_table().to_pandas()
+
+    def load_equity(self, run_ids=None, symbol=None):
+        """
+        Equity curves in long format (run_id, timestamp, equity).
+        """
+        return self._load('equity', run_ids, symbol)
+
+    def load_trades(self, run_ids=None, symbol=None):
+        """
+        Trade logs in long format (run_id, trade, entry_price, exit_price, quantity, pnl, fee).
+        """
+        return self._load('trades', run_ids, symbol)
+
+    def equity_matrix(self, run_ids):
+        """
+        Equity curves side by side: one column per run, indexed by timestamp.
+        """
+        curves = self.load_equity(run_ids)
+        if curves.empty:
+            return curves
+        return curves.pivot(index='timestamp', columns='run_id', values='equity')
+
+    def compare(self, run_ids, columns=None):
+        """
+        Metrics of the given runs side by side.
+        """
+        columns = columns or ['run_id', 'symbol', 'timeframe', 'data_start', 'data_end', 'profit_factor',
+                              'win_rate', 'total_trades', 'max_drawdown', 'final_equity', 'code_version']
+        index = self.runs()
+        index = index[index['run_id'].isin(list(run_ids))]
+        return index[[c for c in columns if c in index.columns]].reset_index(drop=True)
+
+    def delete(self, run_id):
+        index = self.runs()
+        match = index[index['run_id'] == run_id]
+        if match.empty:
+            return False
+        symbol = match['symbol'].iloc[0]
+        # The tombstone goes first, so the run is never listed without its files
+        os.makedirs(self.index_dir, exist_ok=True)
+        open(os.path.join(self.index_dir, f"{run_id}.deleted"), 'w').close()
+        for table in ('equity', 'trades'):
+            path = self._table_path(table, symbol, run_id)
+            if os.path.exists(path):
+                os.remove(path)
+        return True
+
+run_store = RunStore()
+
+def configure(config):
+    """
+    Apply the 'run_store' section of config.yaml to the shared store.
+    """
+    settings = config.get('run_store', {})
+    run_store.enabled = settings.get('enabled', True)
+    run_store.root = settings.get('dir', run_store.root)
+    return run_store
+
+if __name__ == "__main__":
+    usage = "Usage: python -m analysis.run_store list [symbol] | compare <run_id> <run_id> ... | compact"
+    if len(sys.argv) < 2 or sys.argv[1] not in ('list', 'compare', 'compact'):
+        print(usage)
+        sys.exit(1)
+
+    pd.set_option('display.width', 200)
+    if sys.argv[1] == 'compact':
+        print("Index compacted." if run_store.compact() else "Another process is compacting the index.")
+    elif sys.argv[1] == 'list':
+        index = run_store.runs(symbol=sys.argv[2] if len(sys.argv) > 2 else None)
+        if index.empty:
+            print("No runs stored.")
+        else:
+            print(index.drop(columns=['config']).to_string(index=False))
+    else:
+        if len(sys.argv) < 4:
+            print(usage)
+            sys.exit(1)
+        print(run_store.compare(sys.argv[2:]).to_string(index=False))
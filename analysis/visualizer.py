@@ -1,75 +1,234 @@
-﻿import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+﻿import os
+import numpy as np
+import pandas as pd
+from analysis.profiler import profiler
+
+def _pyplot():
+    """
+    pyplot on the current backend (the caller's choice in-process, Agg in report workers).
+    """
+    import matplotlib.pyplot as plt
+    return plt
+
+def _init_worker():
+    """
+    Report worker initializer: headless Agg backend, set before pyplot is imported.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last point and, from each of n_out - 2 buckets, the
+    point forming the largest triangle with the previously kept point and the
+    mean of the next bucket. Peaks and troughs (e.g. drawdown extremes) survive.
+
+    Returns:
+        ndarray: Sorted indices of the kept points.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        with np.errstate(invalid='ignore'):
+            avg_x = x[next_start:next_end].mean()
+            avg_y = np.nanmean(y[next_start:next_end]) if not np.isnan(y[next_start:next_end]).all() else y[a]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        kept[i + 1] = a
+    return kept
+
+def run_length_spans(codes):
+    """
+    Run-length encode a 1-D array.
+
+    Returns:
+        tuple: (starts, ends, values); run k covers positions starts[k]..ends[k]-1.
+    """
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, codes[:0]
+    change = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(codes)]))
+    return starts, ends, codes[starts]
 
 class Visualizer:
-    def __init__(self, results_df, data_df):
+    def __init__(self, results_df, data_df, max_points=2000):
         """
         Args:
             results_df (pd.DataFrame): Backtest results (timestamp, equity).
             data_df (pd.DataFrame): Original OHLCV data with indicators and regimes.
+            max_points (int): Points per plotted series after LTTB downsampling.
         """
         self.results = results_df
         self.data = data_df
+        self.max_points = max_points
         # Merge to align timestamps
         self.merged = pd.merge(self.results, self.data, on='timestamp', how='inner')
 
+    def _downsample(self, series):
+        """
+        (timestamps, values) of `series` reduced to max_points with LTTB.
+        """
+        timestamps = self.merged['timestamp']
+        x = timestamps.to_numpy().astype('datetime64[ns]').astype(np.int64)
+        kept = lttb(x, series.to_numpy(dtype=float), self.max_points)
+        return timestamps.iloc[kept], series.iloc[kept]
+
+    def _regime_codes(self):
+        if 'regime_code' in self.merged.columns:
+            return self.merged['regime_code'].to_numpy()
+        return (self.merged['regime'] == 'TREND').to_numpy().astype(np.int8)
+
+    def _shade_regimes(self, ax):
+        """
+        One shaded span per TREND run (run-length encoded, drawn as a single artist).
+        """
+        import matplotlib.dates as mdates
+        starts, ends, values = run_length_spans(self._regime_codes())
+        trend = values == 1
+        if not trend.any():
+            return
+        x = mdates.date2num(self.merged['timestamp'].to_numpy())
+        x = np.append(x, x[-1])
+        left = x[starts[trend]]
+        right = x[ends[trend]]
+        ax.broken_barh(list(zip(left, right - left)), (0, 1), transform=ax.get_xaxis_transform(),
+                       color='green', alpha=0.08, label='Trend regime')
+
+    @profiler.timed('plotting')
     def plot_performance(self, filename='strategy_performance.png'):
         """
         Plot Equity Curve, Drawdown, and Regime overlay.
         """
+        plt = _pyplot()
         fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 12), sharex=True, gridspec_kw={'height_ratios': [3, 1, 1]})
-        
+
         # 1. Equity Curve
-        ax1.plot(self.merged['timestamp'], self.merged['equity'], label='Equity', color='blue')
+        ax1.plot(*self._downsample(self.merged['equity']), label='Equity', color='blue')
         ax1.set_title('Strategy Equity Curve')
         ax1.set_ylabel('Equity ($)')
-        ax1.legend(loc='upper left')
         ax1.grid(True)
 
         # Overlay Regimes on Equity
-        # We can shade the background based on regime
-        if 'regime' in self.merged.columns:
-            # Create spans for regimes
-            # This is a bit complex to vectorize, simplified loop for demo
-            # Or just plot regime as a separate line/scatter on ax1 twinx
-            pass
+        if 'regime' in self.merged.columns or 'regime_code' in self.merged.columns:
+            self._shade_regimes(ax1)
+        ax1.legend(loc='upper left')
 
         # 2. Drawdown
         equity_series = self.merged['equity']
         running_max = equity_series.cummax()
         drawdown = (equity_series - running_max) / running_max
-        
-        ax2.fill_between(self.merged['timestamp'], drawdown, 0, color='red', alpha=0.3, label='Drawdown')
+
+        ax2.fill_between(*self._downsample(drawdown), 0, color='red', alpha=0.3, label='Drawdown')
         ax2.set_title('Drawdown')
         ax2.set_ylabel('Drawdown (%)')
         ax2.grid(True)
 
         # 3. Regime / Volatility
-        if 'regime' in self.merged.columns:
-            # Map regime to numeric for plotting
-            regime_map = {'TREND': 1, 'MEAN_REVERSION': 0}
-            numeric_regime = self.merged['regime'].map(regime_map)
-            ax3.step(self.merged['timestamp'], numeric_regime, where='post', label='Regime (1=Trend, 0=Range)', color='purple')
+        if 'regime' in self.merged.columns or 'regime_code' in self.merged.columns:
+            # Step plot from the run-length spans: one vertex pair per regime change
+            starts, ends, values = run_length_spans(self._regime_codes())
+            timestamps = self.merged['timestamp']
+            x = np.append(timestamps.to_numpy()[starts], timestamps.iloc[-1])
+            ax3.step(x, np.append(values, values[-1]), where='post', label='Regime (1=Trend, 0=Range)', color='purple')
             ax3.set_yticks([0, 1])
             ax3.set_yticklabels(['Range', 'Trend'])
-        
+
         if 'atr' in self.merged.columns:
             ax3_twin = ax3.twinx()
-            ax3_twin.plot(self.merged['timestamp'], self.merged['atr'], color='orange', alpha=0.5, label='ATR', linestyle='--')
+            ax3_twin.plot(*self._downsample(self.merged['atr']), color='orange', alpha=0.5, label='ATR', linestyle='--')
             ax3_twin.set_ylabel('ATR')
-            # ax3_twin.legend(loc='upper right')
 
         ax3.set_title('Market Regime & Volatility')
         ax3.grid(True)
-        
-        plt.tight_layout()
-        plt.savefig(filename)
+
+        fig.tight_layout()
+        fig.savefig(filename)
+        plt.close(fig)
         print(f"Performance plot saved to {filename}")
 
+    @profiler.timed('plotting')
     def plot_trades(self, trades_list, filename='trades_analysis.png'):
         """
         Plot entry/exit points on price chart.
+
+        Args:
+            trades_list (list or DataFrame): Trades with entry_time, exit_time,
+                entry_price, exit_price and quantity (engine.positions or the
+                exit kernel's trade frame).
         """
-        # Placeholder for trade visualization
-        pass
+        plt = _pyplot()
+        trades = pd.DataFrame(trades_list)
+        fig, ax = plt.subplots(figsize=(12, 6))
+        ax.plot(*self._downsample(self.merged['close']), color='gray', linewidth=0.8, label='Close')
+
+        if not trades.empty and 'entry_time' in trades.columns:
+            longs = trades['quantity'].to_numpy() > 0
+            ax.scatter(trades['entry_time'][longs], trades['entry_price'][longs], marker='^', color='green', s=30, label='Long entry')
+            ax.scatter(trades['entry_time'][~longs], trades['entry_price'][~longs], marker='v', color='red', s=30, label='Short entry')
+            won = trades['pnl'].to_numpy() > 0
+            ax.scatter(trades['exit_time'][won], trades['exit_price'][won], marker='x', color='blue', s=25, label='Exit (win)')
+            ax.scatter(trades['exit_time'][~won], trades['exit_price'][~won], marker='x', color='black', s=25, label='Exit (loss)')
+
+        ax.set_title(f"Trades ({len(trades)})")
+        ax.set_ylabel('Price')
+        ax.grid(True)
+        ax.legend(loc='upper left')
+        fig.tight_layout()
+        fig.savefig(filename)
+        plt.close(fig)
+        print(f"Trade plot saved to {filename}")
+
+def _render_report(job):
+    """
+    Worker: render the performance and trade charts of one symbol.
+    """
+    name = job['symbol'].replace('/', '-')
+    visualizer = Visualizer(job['results'], job['data'], max_points=job.get('max_points', 2000))
+    paths = [os.path.join(job['output_dir'], f"{name}_performance.png")]
+    visualizer.plot_performance(paths[0])
+    if job.get('trades') is not None and len(job['trades']):
+        paths.append(os.path.join(job['output_dir'], f"{name}_trades.png"))
+        visualizer.plot_trades(job['trades'], paths[1])
+    return paths
+
+def render_reports(jobs, output_dir='reports', max_workers=None, max_points=2000):
+    """
+    Render per-symbol reports in parallel worker processes (Agg backend).
+    With a single worker the reports are rendered in-process on the current
+    backend, which is left unchanged.
+
+    Args:
+        jobs (list): Dicts with 'symbol', 'results' (equity frame), 'data'
+            (OHLCV + indicators) and optionally 'trades'.
+
+    Returns:
+        list: Paths of the written images.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    if not jobs:
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [dict(job, output_dir=output_dir, max_points=max_points) for job in jobs]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+
+    if max_workers == 1:
+        rendered = [_render_report(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            rendered = list(executor.map(_render_report, jobs))
+    return [path for paths in rendered for path in paths]
@@ -3,10 +3,15 @@ import numpy as np
 import optuna
 import yaml
 from data.fetcher import DataFetcher
+from data.synthetic import SyntheticOHLCV
 from strategy.indicators import Indicators
 from strategy.regime import RegimeDetection
 from strategy.logic import StrategyLogic
+from strategy.mtf import MultiTimeframeFeatures
 from analysis.backtest import BacktestEngine
+from analysis.profiler import profiler
+from analysis import result_cache as result_cache_module
+from analysis.result_cache import result_cache
 
 def load_config(path='config.yaml'):
     with open(path, 'r', encoding='utf-8-sig') as file:
@@ -14,6 +19,10 @@ def load_config(path='config.yaml'):
 
 def optimize_on_data(df_train, base_config):
     def objective(trial):
+        with profiler.context(phase='train', trial=trial.number):
+            return _objective(trial)
+
+    def _objective(trial):
         config = base_config.copy()
         config['strategy']['indicators']['ma_short'] = trial.suggest_int('ma_short', 10, 100)
         config['strategy']['indicators']['ma_long'] = trial.suggest_int('ma_long', 100, 300)
@@ -23,8 +32,28 @@ def optimize_on_data(df_train, base_config):
         # In reality, we need to re-run indicators.
         # For speed, we just re-run indicators on df_train inside objective
         
+        _, results = backtest_cached(df_train, config, pipeline='walk_forward_train')
+        
+        final_equity = results['equity'].iloc[-1]
+        ret = (final_equity - config['backtest']['initial_capital'])
+        return ret
+
+    study = optuna.create_study(direction='maximize')
+    study.optimize(objective, n_trials=10) # Fast optimization
+    return study.best_params
+
+def backtest_cached(df, config, pipeline):
+    """
+    Indicators + backtest on `df` with `config`, served from the result cache when possible.
+
+    Returns:
+        tuple: (metrics, equity DataFrame)
+    """
+    engine_params = {'initial_capital': config['backtest']['initial_capital'], 'fee': 0.001}
+
+    def run_backtest():
         inds = config['strategy']['indicators']
-        temp_df = df_train.copy()
+        temp_df = df.copy()
         temp_df = Indicators.ma_crossover(temp_df, short_window=inds['ma_short'], long_window=inds['ma_long'])
         temp_df = Indicators.rsi(temp_df, window=inds['rsi_period'])
         temp_df = Indicators.bollinger_bands(temp_df, window=inds['bb_window'], num_std=inds['bb_std'])
@@ -33,29 +62,31 @@ def optimize_on_data(df_train, base_config):
             temp_df = Indicators.garch_volatility(temp_df)
         except:
             temp_df['garch_vol'] = 2.0
-            
+
         regime = RegimeDetection(temp_df)
         temp_df = regime.detect_regime()
-        
-        engine = BacktestEngine(initial_capital=config['backtest']['initial_capital'], fee=0.001)
+        mtf = MultiTimeframeFeatures.from_config(config)
+        if mtf is not None:
+            temp_df = mtf.compute(temp_df)
+
+        engine = BacktestEngine(**engine_params)
         logic = StrategyLogic(config)
-        
+
         def strategy_wrapper(row, capital, current_position):
             return logic.get_signal(row, capital, current_position)
 
         results = engine.run(temp_df, strategy_wrapper)
-        
-        final_equity = results['equity'].iloc[-1]
-        ret = (final_equity - config['backtest']['initial_capital'])
-        return ret
+        return engine.calculate_metrics(), results
 
-    study = optuna.create_study(direction='maximize')
-    study.optimize(objective, n_trials=10) # Fast optimization
-    return study.best_params
+    metrics, results, _ = result_cache.get_or_run(
+        df, {'strategy': config['strategy'], 'engine': engine_params}, run_backtest, pipeline=pipeline
+    )
+    return metrics, results
 
 def run_walk_forward():
     print("--- Starting Walk-Forward Analysis ---")
     config = load_config()
+    result_cache_module.configure(config)
     
     # 1. Fetch Data
     fetcher = DataFetcher()
@@ -63,18 +94,7 @@ def run_walk_forward():
     
     if df is None or df.empty:
         print("Using mock data.")
-        dates = pd.date_range(start='2023-01-01', periods=2000, freq='1h')
-        df = pd.DataFrame({
-            'timestamp': dates,
-            'open': 100, 'high': 105, 'low': 95, 'close': 100, 'volume': 1000
-        })
-        import numpy as np
-        returns = np.random.normal(0, 0.01, 2000)
-        price_path = 100 * np.cumprod(1 + returns)
-        df['close'] = price_path
-        df['open'] = price_path
-        df['high'] = price_path * 1.01
-        df['low'] = price_path * 0.99
+        df = SyntheticOHLCV(seed=42, timeframe='1h').generate(2000)
 
     # 2. Split Data (50% Train, 50% Test)
     split_idx = int(len(df) * 0.5)
@@ -97,27 +117,8 @@ def run_walk_forward():
     config['strategy']['indicators']['ma_long'] = best_params['ma_long']
     config['strategy']['risk']['stop_loss_atr'] = best_params['stop_loss_atr']
     
-    # Prepare Test Data
-    inds = config['strategy']['indicators']
-    df_test = Indicators.ma_crossover(df_test, short_window=inds['ma_short'], long_window=inds['ma_long'])
-    df_test = Indicators.rsi(df_test, window=inds['rsi_period'])
-    df_test = Indicators.bollinger_bands(df_test, window=inds['bb_window'], num_std=inds['bb_std'])
-    df_test = Indicators.atr(df_test, window=inds['atr_window'])
-    try:
-        df_test = Indicators.garch_volatility(df_test)
-    except:
-        df_test['garch_vol'] = 2.0
-        
-    regime = RegimeDetection(df_test)
-    df_test = regime.detect_regime()
-    
-    engine = BacktestEngine(initial_capital=config['backtest']['initial_capital'], fee=0.001)
-    logic = StrategyLogic(config)
-    
-    def strategy_wrapper(row, capital, current_position):
-        return logic.get_signal(row, capital, current_position)
-
-    results = engine.run(df_test, strategy_wrapper)
+    # Prepare Test Data + Backtest
+    _, results = backtest_cached(df_test, config, pipeline='walk_forward_test')
     
     final_equity = results['equity'].iloc[-1]
     initial_cap = config['backtest']['initial_capital']
@@ -0,0 +1,300 @@
+﻿import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from data.synthetic import SyntheticOHLCV
+
+BASELINE_FILE = 'benchmark_baseline.json'
+RESULTS_FILE = 'benchmark_results.json'
+
+def _best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def _quiet(func):
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return wrapper
+
+def bench_indicators(n_bars, repeat):
+    from strategy.indicators import Indicators
+    from strategy.regime import RegimeDetection
+    base = SyntheticOHLCV(seed=1).generate(n_bars)
+
+    def run():
+        df = base.copy()
+        df = Indicators.ma_crossover(df, short_window=20, long_window=139)
+        df = Indicators.rsi(df, window=28)
+        df = Indicators.bollinger_bands(df, window=20, num_std=2)
+        df = Indicators.atr(df, window=14)
+        df = Indicators.adx(df, window=14)
+        RegimeDetection(df).detect_regime()
+
+    return {'name': 'indicators', 'value': n_bars / _best_time(run, repeat), 'unit': 'bars/s', 'higher_is_better': True}
+
+def bench_backtest(n_bars, repeat, config):
+    from strategy.indicators import Indicators
+    from strategy.regime import RegimeDetection
+    from strategy.logic import StrategyLogic
+    from analysis.backtest import BacktestEngine
+
+    inds = config['strategy']['indicators']
+    df = SyntheticOHLCV(seed=2).generate(n_bars)
+    df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
+    df = Indicators.rsi(df, window=inds['rsi_period'])
+    df = Indicators.atr(df, window=inds['atr_window'])
+    df = Indicators.adx(df, window=14)
+    df = RegimeDetection(df).detect_regime()
+
+    def run():
+        engine = BacktestEngine(initial_capital=config['backtest']['initial_capital'], fee=config['backtest'].get('fee', 0.001))
+        logic = StrategyLogic(config)
+        engine.run(df, logic.get_signal)
+
+    return {'name': 'backtest_engine', 'value': n_bars / _best_time(run, repeat), 'unit': 'bars/s', 'higher_is_better': True}
+
+def bench_multi_strategy(n_bars, repeat, config, n_strategies=4):
+    from strategy.indicators import Indicators
+    from strategy.regime import RegimeDetection
+    from strategy.logic import StrategyLogic
+    from analysis.backtest import MultiStrategyEngine
+
+    inds = config['strategy']['indicators']
+    df = SyntheticOHLCV(seed=2).generate(n_bars)
+    df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
+    df = Indicators.rsi(df, window=inds['rsi_period'])
+    df = Indicators.atr(df, window=inds['atr_window'])
+    df = Indicators.adx(df, window=14)
+    df = RegimeDetection(df).detect_regime()
+
+    def run():
+        engine = MultiStrategyEngine(initial_capital=config['backtest']['initial_capital'], fee=config['backtest'].get('fee', 0.001))
+        for i in range(n_strategies):
+            engine.add(f"variant_{i}", StrategyLogic(config))
+        engine.run(df)
+
+    return {'name': 'multi_strategy', 'value': n_bars * n_strategies / _best_time(run, repeat), 'unit': 'strategy-bars/s', 'higher_is_better': True}
+
+def bench_exit_kernel(n_bars, repeat, config):
+    from strategy.indicators import Indicators
+    from strategy.regime import RegimeDetection
+    from strategy.exit_kernel import run_kernel_backtest, resolve_exits
+
+    inds = config['strategy']['indicators']
+    df = SyntheticOHLCV(seed=2).generate(n_bars)
+    df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
+    df = Indicators.rsi(df, window=inds['rsi_period'])
+    df = Indicators.atr(df, window=inds['atr_window'])
+    df = Indicators.adx(df, window=14)
+    df = RegimeDetection(df).detect_regime()
+    resolve_exits(df, config) # Compile once (numba) outside the timing
+
+    elapsed = _best_time(lambda: run_kernel_backtest(df, config), repeat)
+    return {'name': 'exit_kernel', 'value': n_bars / elapsed, 'unit': 'bars/s', 'higher_is_better': True}
+
+def bench_portfolio_guardrails(n_bars, repeat, n_streams=100):
+    import numpy as np
+    import pandas as pd
+    from risk.portfolio_guardrails import PortfolioGuardrails
+    rng = np.random.default_rng(6)
+    equity = 1000 * np.exp(np.cumsum(rng.normal(0, 0.01, size=(n_bars, n_streams)), axis=0))
+    exposure = rng.normal(0, 500, size=(n_bars, n_streams))
+    timestamps = pd.date_range('2023-01-01', periods=n_bars, freq='h')
+    guard = PortfolioGuardrails(symbol_max_drawdown=0.15, max_gross_exposure=3.0, max_net_exposure=2.0, daily_loss_limit=0.05)
+
+    elapsed = _best_time(lambda: guard.evaluate(equity, exposure, timestamps), repeat)
+    return {'name': 'portfolio_guardrails', 'value': n_bars * n_streams / elapsed, 'unit': 'stream-bars/s', 'higher_is_better': True}
+
+def bench_bootstrap(n_bars, repeat, n_resamples=2000):
+    import numpy as np
+    from analysis.bootstrap import BlockBootstrap
+    rng = np.random.default_rng(7)
+    equity = 10000 * np.cumprod(1 + rng.normal(1e-4, 0.003, n_bars))
+    trades = [{'pnl': pnl} for pnl in rng.normal(5, 50, 300)]
+    bootstrap = BlockBootstrap(num_resamples=n_resamples, seed=0)
+
+    elapsed = _best_time(lambda: bootstrap.run(equity, trades), repeat)
+    return {'name': 'bootstrap', 'value': n_resamples / elapsed, 'unit': 'resamples/s', 'higher_is_better': True}
+
+def bench_optimizer(n_bars, n_trials):
+    import optuna
+    import analysis.optimizer as optimizer
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    optimizer.cached_df = SyntheticOHLCV(seed=3).generate(n_bars)
+    # Measure the backtests themselves, not result-cache hits from earlier runs
+    optimizer.result_cache.enabled = False
+
+    def run():
+        study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=0))
+        study.optimize(optimizer.objective, n_trials=n_trials)
+
+    elapsed = _best_time(_quiet(run), 1)
+    return {'name': 'optimizer', 'value': n_trials / elapsed, 'unit': 'trials/s', 'higher_is_better': True}
+
+def bench_multi_fidelity(n_bars, n_candidates):
+    import optuna
+    from analysis.optimizer import successive_halving
+    from main import load_config
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    df = SyntheticOHLCV(seed=3).generate(n_bars)
+    config = load_config()
+
+    elapsed = _best_time(_quiet(lambda: successive_halving(df, config, n_candidates=n_candidates, seed=0)), 1)
+    return {'name': 'multi_fidelity', 'value': n_candidates / elapsed, 'unit': 'candidates/s', 'higher_is_better': True}
+
+def bench_monte_carlo(n_sims, repeat):
+    from risk.monte_carlo import MonteCarloSimulation
+    mc = MonteCarloSimulation(num_simulations=n_sims, num_trades=100)
+
+    def run():
+        mc.simulate(win_rate=0.55, avg_win=0.02, avg_loss=0.015)
+
+    return {'name': 'monte_carlo', 'value': n_sims / _best_time(run, repeat), 'unit': 'sims/s', 'higher_is_better': True}
+
+def bench_fetch_cache(n_bars, repeat):
+    from data.storage import DataStorage
+    storage = DataStorage(data_dir=tempfile.mkdtemp())
+    _quiet(lambda: storage.save_to_parquet(SyntheticOHLCV(seed=4).generate(n_bars), 'bench.parquet'))()
+
+    elapsed = _best_time(lambda: storage.load_from_parquet('bench.parquet'), repeat)
+    return {'name': 'fetch_cache_hit', 'value': elapsed * 1000.0, 'unit': 'ms', 'higher_is_better': False}
+
+def bench_store_range_read(n_bars, repeat):
+    from data.storage import OHLCVStore
+    store = OHLCVStore(data_dir=tempfile.mkdtemp())
+    store.write(SyntheticOHLCV(seed=5, timeframe='1m').generate(n_bars * 10), 'BENCH/USDT', '1m')
+    store.build_mmap('BENCH/USDT', '1m')
+    # One day out of the stored range, through the memory-mapped path
+    start, end = '2023-02-10', '2023-02-10 23:59'
+
+    elapsed = _best_time(lambda: store.read_mmap('BENCH/USDT', '1m', start=start, end=end), repeat)
+    return {'name': 'store_range_read', 'value': elapsed * 1000.0, 'unit': 'ms', 'higher_is_better': False}
+
+def bench_router(repeat):
+    from execution.router import SmartOrderRouter
+    from execution.sim_exchange import SimulatedExchange
+    venues = {name: SimulatedExchange(name, latency_ms=10.0) for name in ['binance', 'coinbase', 'kraken']}
+    router = SmartOrderRouter(venues=venues, cache_ttl=0.0, verbose=False)
+
+    elapsed = _best_time(lambda: router.get_best_price('BTC/USDT', 'buy', 5.0), repeat)
+    return {'name': 'router_decision', 'value': elapsed * 1000.0, 'unit': 'ms', 'higher_is_better': False}
+
+def run_suite(quick=False):
+    from main import load_config
+    config = load_config()
+    scale = 0.25 if quick else 1.0
+    repeat = 2 if quick else 3
+    n_bars = int(18000 * scale)
+
+    benchmarks = [
+        lambda: bench_indicators(n_bars, repeat),
+        lambda: bench_backtest(n_bars, repeat, config),
+        lambda: bench_multi_strategy(n_bars, repeat, config),
+        lambda: bench_exit_kernel(n_bars, repeat, config),
+        lambda: bench_portfolio_guardrails(n_bars, repeat),
+        lambda: bench_bootstrap(n_bars, repeat),
+        lambda: bench_optimizer(int(4000 * scale), 3 if quick else 5),
+        lambda: bench_multi_fidelity(int(4000 * scale), 9 if quick else 27),
+        lambda: bench_monte_carlo(int(1000 * scale), repeat),
+        lambda: bench_fetch_cache(n_bars, repeat * 3),
+        lambda: bench_store_range_read(n_bars, repeat * 3),
+        lambda: bench_router(repeat * 3),
+    ]
+    results = []
+    for bench in benchmarks:
+        result = bench()
+        print(f"  {result['name']:<18} {result['value']:>14,.2f} {result['unit']}")
+        results.append(result)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'machine': platform.platform(),
+        'quick': quick,
+        'results': results
+    }
+
+def compare(baseline, current, threshold=0.15):
+    """
+    Compare two benchmark runs.
+
+    Returns:
+        list: Rows with the relative change per benchmark and a regression flag.
+    """
+    base_results = {r['name']: r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        base = base_results.get(result['name'])
+        if base is None or not base['value']:
+            rows.append({'name': result['name'], 'baseline': None, 'current': result['value'], 'change': None, 'regression': False})
+            continue
+        change = (result['value'] - base['value']) / base['value']
+        worse = -change if result['higher_is_better'] else change
+        rows.append({
+            'name': result['name'],
+            'baseline': base['value'],
+            'current': result['value'],
+            'change': change,
+            'regression': worse > threshold
+        })
+    return rows
+
+def _load(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def _save(report, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Benchmark results saved to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmark suite")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="Run the suite")
+    run_parser.add_argument('--quick', action='store_true', help="Smaller sizes for a fast check")
+    run_parser.add_argument('--output', default=RESULTS_FILE)
+    run_parser.add_argument('--save-baseline', action='store_true', help=f"Also write {BASELINE_FILE}")
+
+    cmp_parser = sub.add_parser('compare', help="Compare results against the baseline")
+    cmp_parser.add_argument('current', nargs='?', default=RESULTS_FILE)
+    cmp_parser.add_argument('--baseline', default=BASELINE_FILE)
+    cmp_parser.add_argument('--threshold', type=float, default=0.15, help="Allowed slowdown before flagging (0.15 = 15%%)")
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        print("--- Running Benchmark Suite ---")
+        report = run_suite(quick=args.quick)
+        _save(report, args.output)
+        if args.save_baseline:
+            _save(report, BASELINE_FILE)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Baseline not found: {args.baseline}. Run 'python benchmark.py run --save-baseline' first.")
+        return 1
+
+    rows = compare(_load(args.baseline), _load(args.current), args.threshold)
+    print(f"{'BENCHMARK':<18} | {'BASELINE':>14} | {'CURRENT':>14} | {'CHANGE':>8}")
+    for row in rows:
+        base = f"{row['baseline']:,.2f}" if row['baseline'] is not None else '-'
+        change = f"{row['change']*100:+.1f}%" if row['change'] is not None else '-'
+        flag = '  <-- REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:<18} | {base:>14} | {row['current']:>14,.2f} | {change:>8}{flag}")
+    return 1 if any(row['regression'] for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
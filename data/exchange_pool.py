@@ -0,0 +1,117 @@
+﻿import hashlib
+import json
+import os
+import threading
+import time
+
+class MarketCache:
+    """
+    On-disk cache of exchange market metadata (the load_markets() payload).
+    """
+    def __init__(self, cache_dir='data_storage/markets', ttl=86400):
+        """
+        Args:
+            cache_dir (str): Directory holding one JSON file per exchange.
+            ttl (float): Seconds before cached metadata is considered stale.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _path(self, exchange_id, sandbox=False):
+        suffix = '_sandbox' if sandbox else ''
+        return os.path.join(self.cache_dir, f"{exchange_id}{suffix}.json")
+
+    def load(self, exchange_id, sandbox=False):
+        path = self._path(exchange_id, sandbox)
+        if not os.path.exists(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.ttl:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable market cache {path}: {e}")
+            return None
+
+    def save(self, exchange_id, markets, currencies=None, sandbox=False):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = self._path(exchange_id, sandbox)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'markets': markets, 'currencies': currencies or {}}, file, default=str)
+        os.replace(tmp_path, path)
+
+class ExchangePool:
+    """
+    Shared registry of exchange clients, one per exchange id and credentials.
+    Every DataFetcher / RealExecution in the process reuses the same client,
+    and market metadata is served from the disk cache when fresh.
+    """
+    def __init__(self, market_cache=None):
+        self.market_cache = market_cache or MarketCache()
+        self._clients = {}
+        self._factories = {}
+        self._market_locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, exchange_id, factory):
+        """
+        Register a client factory (e.g. a local stand-in exchange) under an id.
+        The factory receives the ccxt-style config dict.
+        """
+        self._factories[exchange_id] = factory
+
+    def get(self, exchange_id='binance', api_key=None, secret=None, sandbox=False, load_markets=True):
+        # The secret is part of the credentials, but only its hash is kept in the key
+        secret_hash = hashlib.sha256(secret.encode()).hexdigest() if secret else None
+        key = (exchange_id, api_key, secret_hash, sandbox)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create(exchange_id, api_key, secret, sandbox)
+                self._clients[key] = client
+        if load_markets:
+            self.ensure_markets(client, exchange_id, sandbox)
+        return client
+
+    def _create(self, exchange_id, api_key, secret, sandbox):
+        config = {'enableRateLimit': True}
+        if api_key and secret:
+            config['apiKey'] = api_key
+            config['secret'] = secret
+
+        factory = self._factories.get(exchange_id)
+        if factory is None:
+            import ccxt
+            factory = getattr(ccxt, exchange_id)
+        client = factory(config)
+        if sandbox:
+            client.set_sandbox_mode(True)
+        return client
+
+    def ensure_markets(self, client, exchange_id, sandbox=False):
+        """
+        Populate client markets from the disk cache, downloading them only when stale.
+        """
+        with self._lock:
+            market_lock = self._market_locks.setdefault(id(client), threading.Lock())
+        with market_lock:
+            if client.markets:
+                return client.markets
+            cached = self.market_cache.load(exchange_id, sandbox)
+            if cached:
+                client.set_markets(cached['markets'], cached.get('currencies') or None)
+            else:
+                client.load_markets()
+                self.market_cache.save(exchange_id, client.markets, client.currencies, sandbox)
+            return client.markets
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._market_locks.clear()
+
+exchange_pool = ExchangePool()
@@ -1,31 +1,80 @@
-﻿import ccxt
-import pandas as pd
+﻿import pandas as pd
 import os
 import time
-import yfinance as yf
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from data.exchange_pool import exchange_pool
+from data.resample import can_resample, bucket_starts, IncrementalResampler
+from data.synthetic import TIMEFRAME_SECONDS
+from analysis.profiler import profiler
 
 load_dotenv()
 
+# Longest Yahoo history per interval (intraday intervals are capped by Yahoo); others get '2y'
+YAHOO_MAX_PERIOD = {'1m': '7d', '15m': '60d', '1d': '5y'}
+YAHOO_PERIOD_DAYS = {'1d': 1, '5d': 5, '7d': 7, '1mo': 30, '60d': 60, '3mo': 90, '6mo': 180, '1y': 365, '2y': 730, '5y': 1825}
+
+def yahoo_period(timeframe, limit=None):
+    """
+    Shortest Yahoo period that covers `limit` bars (with margin for closed
+    sessions), capped at the longest one available for the interval.
+    """
+    max_period = YAHOO_MAX_PERIOD.get(timeframe, '2y')
+    if limit is None:
+        return max_period
+    needed_days = 1.5 * limit * TIMEFRAME_SECONDS.get(timeframe, 3600) / 86400
+    for period, days in sorted(YAHOO_PERIOD_DAYS.items(), key=lambda item: item[1]):
+        if days >= YAHOO_PERIOD_DAYS[max_period]:
+            break
+        if days >= needed_days:
+            return period
+    return max_period
+
 class DataFetcher:
-    def __init__(self, exchange_id='binance', source='binance'):
+    def __init__(self, exchange_id='binance', source='binance', base_timeframe=None, store=None):
+        """
+        Args:
+            base_timeframe (str): If set, only this resolution is downloaded; higher
+                timeframes that are whole multiples of it are resampled locally.
+            store (OHLCVStore): Optional on-disk cache for base and derived bars.
+                Only bars newer than the stored ones are downloaded.
+        """
         self.source = source
+        self.base_timeframe = base_timeframe
+        self.store = store
+        self._base_cache = {}
+        self._resamplers = {}
         if self.source == 'binance':
             # Initialize without keys for public data if needed, or with keys if available
             # For fetching historical OHLCV, keys are not strictly required on Binance
-            config = {'enableRateLimit': True}
+            # Clients are shared through the pool, with market metadata cached on disk
             api_key = os.getenv('BINANCE_API_KEY')
             secret = os.getenv('BINANCE_SECRET')
-            if api_key and secret:
-                config['apiKey'] = api_key
-                config['secret'] = secret
-            
-            self.exchange = getattr(ccxt, exchange_id)(config)
+            self.exchange_id = exchange_id
+            self.exchange = exchange_pool.get(exchange_id, api_key=api_key, secret=secret, load_markets=False)
         else:
             self.exchange = None
 
+    @profiler.timed('fetch')
     def fetch_ohlcv(self, symbol, timeframe='1h', limit=100):
+        if self.base_timeframe:
+            if timeframe == self.base_timeframe:
+                df = self._fetch_base(symbol, limit)
+                return df.tail(limit).reset_index(drop=True) if df is not None else None
+            if can_resample(self.base_timeframe, timeframe):
+                return self._fetch_resampled(symbol, timeframe, limit)
+        return self._fetch_network(symbol, timeframe, limit)
+
+    def history_start(self, timeframe):
+        """
+        Oldest bar time the source can serve for `timeframe`, or None when unbounded.
+        """
+        if self.source != 'yahoo':
+            return None
+        now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+        return now - pd.Timedelta(days=YAHOO_PERIOD_DAYS[yahoo_period(timeframe)])
+
+    def _fetch_network(self, symbol, timeframe, limit):
         if self.source == 'yahoo':
             return self._fetch_yahoo(symbol, timeframe, limit)
         else:
@@ -34,8 +83,81 @@ class DataFetcher:
                 return self._fetch_ccxt_history(symbol, timeframe, limit)
             return self._fetch_ccxt(symbol, timeframe, limit)
 
+    def _fetch_base(self, symbol, limit):
+        """
+        Base-resolution bars, at least `limit` of them if available.
+        Cached bars are reused; only the missing tail is downloaded.
+        """
+        timeframe = self.base_timeframe
+        cached = self._base_cache.get(symbol)
+        if cached is None and self.store is not None:
+            cached = self.store.read(symbol, timeframe, source=self.source)
+
+        # The cache is complete with `limit` bars, or once it reaches back as far as the
+        # source allows (e.g. 2 years of 1h bars on Yahoo is fewer than 18000)
+        earliest = self.history_start(timeframe)
+        complete = cached is not None and (
+            len(cached) >= limit or
+            (earliest is not None and cached['timestamp'].iloc[0] <= earliest + pd.Timedelta(days=1))
+        )
+        if not complete:
+            # 1. Not enough history cached: one full download
+            fresh = self._fetch_network(symbol, timeframe, limit)
+        else:
+            # 2. Only the bars since the last cached one (plus it, to refresh a forming bar)
+            bar = pd.Timedelta(seconds=TIMEFRAME_SECONDS[timeframe])
+            now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+            missing = int((now - cached['timestamp'].iloc[-1]) / bar)
+            fresh = self._fetch_network(symbol, timeframe, missing + 1) if missing > 0 else None
+
+        if fresh is not None and not fresh.empty:
+            if self.store is not None:
+                self.store.write(fresh, symbol, timeframe, source=self.source)
+            if cached is None:
+                cached = fresh
+            else:
+                cached = (pd.concat([cached, fresh], ignore_index=True)
+                          .drop_duplicates(subset='timestamp', keep='last')
+                          .sort_values('timestamp')
+                          .reset_index(drop=True))
+        if cached is not None:
+            self._base_cache[symbol] = cached
+        return cached
+
+    def _fetch_resampled(self, symbol, timeframe, limit):
+        """
+        Higher-timeframe bars derived from base bars. The resampler per
+        (symbol, timeframe) is fed only base bars it has not seen yet; a new
+        one resumes from the derived bars in the store, if any.
+        """
+        ratio = TIMEFRAME_SECONDS[timeframe] // TIMEFRAME_SECONDS[self.base_timeframe]
+        base = self._fetch_base(symbol, (limit + 1) * ratio)
+        if base is None or base.empty:
+            return None
+
+        resampler = self._resamplers.get((symbol, timeframe))
+        if resampler is None:
+            resampler = IncrementalResampler(timeframe, self.base_timeframe)
+            self._resamplers[(symbol, timeframe)] = resampler
+            stored = self.store.read(symbol, timeframe, source=self.source) if self.store is not None else None
+            # Stored bars are reused if they reach back as far as needed (or as the base data does)
+            if stored is not None and (len(stored) >= limit or
+                                       stored['timestamp'].iloc[0] <= bucket_starts(base['timestamp'].iloc[:1], timeframe)[0]):
+                resampler.seed(stored)
+        # The newest base bar may still be forming; it must not complete a bucket early
+        bar = pd.Timedelta(seconds=TIMEFRAME_SECONDS[self.base_timeframe])
+        now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+        completed = resampler.update(base[base['timestamp'] + bar <= now])
+        if self.store is not None and not completed.empty:
+            self.store.write(completed, symbol, timeframe, source=self.source)
+
+        if resampler.bars.empty:
+            return None
+        return resampler.bars.tail(limit).reset_index(drop=True)
+
     def _fetch_ccxt(self, symbol, timeframe, limit):
         try:
+            exchange_pool.ensure_markets(self.exchange, self.exchange_id)
             ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
             df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
@@ -63,6 +185,12 @@ class DataFetcher:
         start_time = datetime.now() - timedelta(seconds=total_seconds)
         since = int(start_time.timestamp() * 1000)
         
+        try:
+            exchange_pool.ensure_markets(self.exchange, self.exchange_id)
+        except Exception as e:
+            print(f"Error loading markets: {e}")
+            return None
+
         fetched_count = 0
         while fetched_count < limit:
             try:
@@ -106,16 +234,14 @@ class DataFetcher:
 
     def _fetch_yahoo(self, symbol, timeframe, limit):
         try:
+            import yfinance as yf
             # Map timeframe: 1h -> 1h, 1d -> 1d
             # Yahoo symbols: BTC/USDT -> BTC-USD
             yf_symbol = symbol.replace('/', '-') if '/' in symbol else symbol
             if yf_symbol == 'BTC-USDT': yf_symbol = 'BTC-USD' # Common mapping
             
-            # Calculate period based on limit and timeframe (Approx)
-            period = '2y' 
-            if timeframe == '1d': period = '5y'
-            if timeframe == '1m': period = '7d'
-            if timeframe == '15m': period = '60d' # Yahoo limit
+            # Shortest period that covers the limit (an incremental update downloads days, not years)
+            period = yahoo_period(timeframe, limit)
             
             ticker = yf.Ticker(yf_symbol)
             print(f"Fetching {yf_symbol} from Yahoo (Period: {period}, Interval: {timeframe})...")
@@ -152,6 +278,7 @@ class DataFetcher:
             print("Order book not supported for Yahoo Finance.")
             return None
         try:
+            exchange_pool.ensure_markets(self.exchange, self.exchange_id)
             return self.exchange.fetch_order_book(symbol, limit)
         except Exception as e:
             print(f"Error fetching order book: {e}")
@@ -1,10 +1,18 @@
 ﻿import pandas as pd
 import numpy as np
 import time
+import asyncio
+from utils.rng import rng_service
 
 class OrderBookReplay:
-    def __init__(self, fetcher=None):
+    def __init__(self, fetcher=None, rng=None, seed=None):
+        """
+        Args:
+            rng (np.random.Generator): Stream for the book quantities. Defaults to
+                `seed`, or to a new stream from the shared RNG service (utils.rng).
+        """
         self.fetcher = fetcher
+        self.rng = rng_service.resolve('order_book_replay', seed=seed, rng=rng)
 
     def generate_dummy_book(self, mid_price, depth=10, spread_bps=5):
         """
@@ -14,20 +22,11 @@ class OrderBookReplay:
         best_bid = mid_price - (spread / 2)
         best_ask = mid_price + (spread / 2)
 
-        bids = []
-        asks = []
-
-        for i in range(depth):
-            # Price steps
-            bid_price = best_bid - (i * mid_price * 0.0001)
-            ask_price = best_ask + (i * mid_price * 0.0001)
-            
-            # Random quantity
-            bid_qty = np.random.uniform(0.1, 2.0)
-            ask_qty = np.random.uniform(0.1, 2.0)
-            
-            bids.append([bid_price, bid_qty])
-            asks.append([ask_price, ask_qty])
+        # Price steps and random quantities for all levels at once
+        steps = np.arange(depth) * mid_price * 0.0001
+        bid_qty, ask_qty = self.rng.uniform(0.1, 2.0, size=(2, depth))
+        bids = np.column_stack([best_bid - steps, bid_qty]).tolist()
+        asks = np.column_stack([best_ask + steps, ask_qty]).tolist()
 
         return {'bids': bids, 'asks': asks, 'timestamp': int(time.time()*1000)}
 
@@ -37,3 +36,47 @@ class OrderBookReplay:
         """
         for price in price_series:
             yield self.generate_dummy_book(price)
+
+
+class ReplayVolumeFeed:
+    """
+    Replays historical per-interval traded volume (e.g. the `volume` column of
+    OHLCV bars) for POV execution in simulation.
+    """
+    def __init__(self, volumes):
+        """
+        Args:
+            volumes (dict or sequence): {symbol: volume sequence}, or a single
+                sequence shared by every symbol.
+        """
+        self.volumes = volumes
+        self._positions = {}
+
+    async def next_volume(self, symbol):
+        """
+        Volume traded in the next interval, or None once the replay is exhausted.
+        """
+        series = self.volumes.get(symbol) if isinstance(self.volumes, dict) else self.volumes
+        if series is None:
+            return None
+        pos = self._positions.get(symbol, 0)
+        if pos >= len(series):
+            return None
+        self._positions[symbol] = pos + 1
+        return float(series[pos])
+
+
+class ExchangeVolumeFeed:
+    """
+    Live volume feed: volume of the last completed candle from a DataFetcher.
+    """
+    def __init__(self, fetcher, timeframe='1m'):
+        self.fetcher = fetcher
+        self.timeframe = timeframe
+
+    async def next_volume(self, symbol):
+        df = await asyncio.to_thread(self.fetcher.fetch_ohlcv, symbol, self.timeframe, 2)
+        if df is None or len(df) < 2:
+            return None
+        # The last row is the candle still forming; use the one before it
+        return float(df['volume'].iloc[-2])
@@ -0,0 +1,121 @@
+﻿import numpy as np
+import pandas as pd
+from data.synthetic import TIMEFRAME_SECONDS
+
+OHLCV_AGG = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+def can_resample(base_timeframe, timeframe):
+    """
+    True if `timeframe` is a whole multiple of `base_timeframe`.
+    """
+    if base_timeframe not in TIMEFRAME_SECONDS or timeframe not in TIMEFRAME_SECONDS:
+        return False
+    base, target = TIMEFRAME_SECONDS[base_timeframe], TIMEFRAME_SECONDS[timeframe]
+    return target >= base and target % base == 0
+
+def bucket_starts(timestamps, timeframe):
+    """
+    Start of the `timeframe` bucket containing each timestamp (aligned to the epoch, UTC).
+    """
+    step = np.int64(TIMEFRAME_SECONDS[timeframe]) * 1_000_000_000
+    values = pd.to_datetime(timestamps).to_numpy().astype('datetime64[ns]').astype(np.int64)
+    return ((values // step) * step).astype('datetime64[ns]')
+
+def resample_ohlcv(df, timeframe, base_timeframe=None, drop_incomplete=True):
+    """
+    Aggregate OHLCV bars into a higher timeframe.
+
+    open = first, high = max, low = min, close = last, volume = sum. Each
+    output bar is labelled with its bucket start (the same convention as the
+    exchanges). Buckets with gaps in the base data are still emitted.
+
+    Args:
+        base_timeframe (str): Resolution of `df`. Needed to decide whether the
+            last bucket is complete; without it the last bucket is kept.
+        drop_incomplete (bool): Drop the trailing bucket if it is still forming.
+
+    Returns:
+        DataFrame: timestamp, open, high, low, close, volume.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+    buckets = bucket_starts(df['timestamp'], timeframe)
+    bars = df.groupby(buckets, sort=True).agg(OHLCV_AGG)
+    bars.index.name = 'timestamp'
+    bars = bars.reset_index()
+
+    if drop_incomplete and base_timeframe is not None:
+        last_base_end = pd.Timestamp(df['timestamp'].iloc[-1]) + pd.Timedelta(seconds=TIMEFRAME_SECONDS[base_timeframe])
+        last_bucket_end = bars['timestamp'].iloc[-1] + pd.Timedelta(seconds=TIMEFRAME_SECONDS[timeframe])
+        if last_base_end < last_bucket_end:
+            bars = bars.iloc[:-1]
+    return bars.reset_index(drop=True)
+
+class IncrementalResampler:
+    """
+    Keeps the completed higher-timeframe bars for one series and extends them
+    as new base bars arrive. Only the base bars of the still-forming bucket
+    are kept between updates, so each update costs O(new bars).
+    """
+    def __init__(self, timeframe, base_timeframe):
+        if not can_resample(base_timeframe, timeframe):
+            raise ValueError(f"Cannot derive {timeframe} bars from {base_timeframe}")
+        self.timeframe = timeframe
+        self.base_timeframe = base_timeframe
+        self.bars = pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        self.last_base_timestamp = None
+        self._pending = None
+
+    def seed(self, bars):
+        """
+        Resume from previously completed bars (e.g. read back from an OHLCVStore).
+        Later updates only use base bars after the last seeded bucket.
+        """
+        self.bars = bars[['timestamp', 'open', 'high', 'low', 'close', 'volume']].reset_index(drop=True)
+        bucket_end = self.bars['timestamp'].iloc[-1] + pd.Timedelta(seconds=TIMEFRAME_SECONDS[self.timeframe])
+        self.last_base_timestamp = bucket_end - pd.Timedelta(seconds=TIMEFRAME_SECONDS[self.base_timeframe])
+        self._pending = None
+        return self
+
+    def update(self, base_bars):
+        """
+        Feed base bars (older bars than the last one seen are ignored).
+
+        Returns:
+            DataFrame: Higher-timeframe bars completed by this update.
+        """
+        if base_bars is None or base_bars.empty:
+            return self.bars.iloc[0:0]
+        if self._pending is not None and not self._pending.empty:
+            # A re-sent last bar replaces the pending one (e.g. a revised forming candle)
+            base_bars = base_bars[base_bars['timestamp'] >= self.last_base_timestamp]
+            base = (pd.concat([self._pending, base_bars], ignore_index=True)
+                    .drop_duplicates(subset='timestamp', keep='last')
+                    .reset_index(drop=True))
+        elif self.last_base_timestamp is not None:
+            base = base_bars[base_bars['timestamp'] > self.last_base_timestamp].reset_index(drop=True)
+        else:
+            base = base_bars.reset_index(drop=True)
+        if base.empty:
+            return self.bars.iloc[0:0]
+        self.last_base_timestamp = base['timestamp'].iloc[-1]
+
+        completed = resample_ohlcv(base, self.timeframe, self.base_timeframe, drop_incomplete=True)
+
+        # Base bars after the last completed bucket stay pending
+        if completed.empty:
+            self._pending = base
+        else:
+            next_start = completed['timestamp'].iloc[-1] + pd.Timedelta(seconds=TIMEFRAME_SECONDS[self.timeframe])
+            self._pending = base[base['timestamp'] >= next_start].reset_index(drop=True)
+            self.bars = completed if self.bars.empty else pd.concat([self.bars, completed], ignore_index=True)
+        return completed
+
+    def partial_bar(self):
+        """
+        The still-forming bar (None if no base bars are pending).
+        """
+        if self._pending is None or self._pending.empty:
+            return None
+        return resample_ohlcv(self._pending, self.timeframe, drop_incomplete=False).iloc[-1]
@@ -1,4 +1,5 @@
 ﻿import pandas as pd
+import numpy as np
 import os
 
 class DataStorage:
@@ -19,3 +20,162 @@ class DataStorage:
         else:
             print(f"File not found: {path}")
             return None
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def _partition_value(value):
+    # Hive partition directories cannot contain '/', e.g. BTC/USDT -> BTC-USDT
+    return str(value).replace('/', '-')
+
+class OHLCVStore:
+    """
+    OHLCV store partitioned by source/symbol/timeframe/month.
+
+    Layout under `data_dir`:
+        source=<SRC>/symbol=<SYM>/timeframe=<TF>/month=<YYYY-MM>.parquet
+        source=<SRC>/symbol=<SYM>/timeframe=<TF>/all.arrow   (optional memory-map snapshot)
+
+    Writes only touch the months present in the new data; rows are merged
+    with what is stored and deduplicated on timestamp (newest wins). Reads
+    open only the months overlapping [start, end] and push the timestamp
+    filter and column projection down to the parquet reader.
+    """
+    def __init__(self, data_dir='data_storage/ohlcv', source='binance'):
+        self.data_dir = data_dir
+        self.source = source
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+
+    def _series_dir(self, symbol, timeframe, source=None):
+        return os.path.join(
+            self.data_dir,
+            f"source={_partition_value(source or self.source)}",
+            f"symbol={_partition_value(symbol)}",
+            f"timeframe={timeframe}"
+        )
+
+    def _month_path(self, series_dir, month):
+        return os.path.join(series_dir, f"month={month}.parquet")
+
+    def _mmap_path(self, series_dir):
+        return os.path.join(series_dir, 'all.arrow')
+
+    def months(self, symbol, timeframe, source=None):
+        series_dir = self._series_dir(symbol, timeframe, source)
+        if not os.path.exists(series_dir):
+            return []
+        return sorted(name[len('month='):-len('.parquet')] for name in os.listdir(series_dir)
+                      if name.startswith('month=') and name.endswith('.parquet'))
+
+    def write(self, df, symbol, timeframe, source=None):
+        """
+        Append bars. Existing rows with the same timestamp are replaced.
+
+        Returns:
+            int: Number of rows written across the touched partitions.
+        """
+        if df is None or df.empty:
+            return 0
+        series_dir = self._series_dir(symbol, timeframe, source)
+        os.makedirs(series_dir, exist_ok=True)
+
+        df = df[OHLCV_COLUMNS].copy()
+        df['timestamp'] = pd.to_datetime(df['timestamp']).astype('datetime64[ns]')
+        months = df['timestamp'].dt.strftime('%Y-%m')
+
+        written = 0
+        for month, new_rows in df.groupby(months.to_numpy(), sort=True):
+            path = self._month_path(series_dir, month)
+            if os.path.exists(path):
+                new_rows = pd.concat([pd.read_parquet(path), new_rows], ignore_index=True)
+            new_rows = (new_rows.drop_duplicates(subset='timestamp', keep='last')
+                        .sort_values('timestamp')
+                        .reset_index(drop=True))
+            tmp_path = path + '.tmp'
+            new_rows.to_parquet(tmp_path, index=False, row_group_size=50000)
+            os.replace(tmp_path, path)
+            written += len(new_rows)
+
+        # The memory-map snapshot no longer matches the partitions
+        mmap_path = self._mmap_path(series_dir)
+        if os.path.exists(mmap_path):
+            os.remove(mmap_path)
+        return written
+
+    def read(self, symbol, timeframe, start=None, end=None, columns=None, source=None):
+        """
+        Bars with start <= timestamp <= end (either bound optional).
+
+        Args:
+            columns (list): Columns to load; 'timestamp' is always included.
+
+        Returns:
+            DataFrame: Sorted bars, or None if nothing is stored for the range.
+        """
+        import pyarrow.dataset as ds
+        series_dir = self._series_dir(symbol, timeframe, source)
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+
+        # 1. Partition pruning: only months overlapping the range
+        months = self.months(symbol, timeframe, source)
+        if start is not None:
+            months = [m for m in months if m >= start.strftime('%Y-%m')]
+        if end is not None:
+            months = [m for m in months if m <= end.strftime('%Y-%m')]
+        if not months:
+            return None
+
+        # 2. Column projection + predicate pushdown
+        columns = ['timestamp'] + [c for c in (columns or OHLCV_COLUMNS) if c != 'timestamp']
+        dataset = ds.dataset([self._month_path(series_dir, m) for m in months], format='parquet')
+        condition = None
+        if start is not None:
+            condition = ds.field('timestamp') >= start.to_datetime64()
+        if end is not None:
+            upper = ds.field('timestamp') <= end.to_datetime64()
+            condition = upper if condition is None else condition & upper
+        df = dataset.to_table(columns=columns, filter=condition).to_pandas()
+        if df.empty:
+            return None
+        return df.sort_values('timestamp').reset_index(drop=True)
+
+    def build_mmap(self, symbol, timeframe, source=None):
+        """
+        Consolidate all partitions into one uncompressed Arrow IPC file for read_mmap().
+        """
+        import pyarrow as pa
+        series_dir = self._series_dir(symbol, timeframe, source)
+        df = self.read(symbol, timeframe, source=source)
+        if df is None:
+            return None
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path = self._mmap_path(series_dir)
+        tmp_path = path + '.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=len(df))
+        os.replace(tmp_path, path)
+        return path
+
+    def read_mmap(self, symbol, timeframe, start=None, end=None, columns=None, source=None):
+        """
+        Fast path: slice the memory-mapped Arrow snapshot without copying the
+        untouched bars into memory. Builds the snapshot on first use and falls
+        back to read() if it cannot be built.
+        """
+        import pyarrow as pa
+        series_dir = self._series_dir(symbol, timeframe, source)
+        path = self._mmap_path(series_dir)
+        if not os.path.exists(path) and self.build_mmap(symbol, timeframe, source) is None:
+            return None
+
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        timestamps = table.column('timestamp').to_numpy()
+        lo = 0 if start is None else int(np.searchsorted(timestamps, pd.Timestamp(start).to_datetime64(), side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, pd.Timestamp(end).to_datetime64(), side='right'))
+        if hi <= lo:
+            return None
+
+        columns = ['timestamp'] + [c for c in (columns or OHLCV_COLUMNS) if c != 'timestamp']
+        return table.select(columns).slice(lo, hi - lo).to_pandas()
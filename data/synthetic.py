@@ -0,0 +1,101 @@
+﻿import numpy as np
+import pandas as pd
+
+TIMEFRAME_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '2h': 7200, '4h': 14400, '6h': 21600, '12h': 43200,
+    '1d': 86400
+}
+
+class SyntheticOHLCV:
+    """
+    Deterministic generator of realistic OHLCV bars.
+
+    Prices follow a GBM whose drift and volatility switch between a calm and a
+    volatile regime (two-state Markov chain). High/low are drawn from the
+    Brownian-bridge extremes of each bar and volume scales with the bar's
+    absolute return, so ranges, ATR and volume behave like real crypto data.
+    The same seed always yields the same bars.
+    """
+    def __init__(self, seed=42, timeframe='1h', annual_vol=0.60, annual_drift=0.0,
+                 regime_switching=True, vol_multiplier=2.5, switch_prob=0.005, base_volume=1000.0):
+        """
+        Args:
+            seed (int): Random seed.
+            timeframe (str): Bar size (e.g. '15m', '1h', '1d').
+            annual_vol (float): Annualized volatility of the calm regime.
+            annual_drift (float): Annualized arithmetic drift (expected price growth
+                rate). Log returns drift by this minus half the active regime's variance.
+            regime_switching (bool): Enable the volatile regime.
+            vol_multiplier (float): Volatility of the volatile regime relative to the calm one.
+            switch_prob (float): Per-bar probability of leaving the current regime.
+            base_volume (float): Median volume per bar in the calm regime.
+        """
+        if timeframe not in TIMEFRAME_SECONDS:
+            raise ValueError(f"Unsupported timeframe: {timeframe}")
+        self.seed = seed
+        self.timeframe = timeframe
+        self.annual_vol = annual_vol
+        self.annual_drift = annual_drift
+        self.regime_switching = regime_switching
+        self.vol_multiplier = vol_multiplier
+        self.switch_prob = switch_prob
+        self.base_volume = base_volume
+
+    def generate(self, n_bars=18000, start='2023-01-01', start_price=100.0, seed=None):
+        rng = np.random.default_rng(self.seed if seed is None else seed)
+        bar_seconds = TIMEFRAME_SECONDS[self.timeframe]
+        dt = bar_seconds / (365 * 86400)
+
+        # 1. Regime path (0 = calm, 1 = volatile)
+        if self.regime_switching:
+            switches = rng.random(n_bars) < self.switch_prob
+            regime = np.cumsum(switches) % 2
+        else:
+            regime = np.zeros(n_bars, dtype=int)
+        sigma = self.annual_vol * np.sqrt(dt) * np.where(regime == 1, self.vol_multiplier, 1.0)
+        # Ito correction per bar with the active regime's variance: E[price] grows at annual_drift in both regimes
+        mu = self.annual_drift * dt - 0.5 * sigma ** 2
+
+        # 2. Close-to-close log returns (GBM)
+        log_returns = mu + sigma * rng.standard_normal(n_bars)
+        log_close = np.log(start_price) + np.cumsum(log_returns)
+        log_open = np.concatenate(([np.log(start_price)], log_close[:-1]))
+
+        # 3. Intrabar extremes of a Brownian bridge from open to close
+        u_high = 1.0 - rng.random(n_bars)
+        u_low = 1.0 - rng.random(n_bars)
+        spread_high = np.sqrt(log_returns ** 2 - 2 * sigma ** 2 * np.log(u_high))
+        spread_low = np.sqrt(log_returns ** 2 - 2 * sigma ** 2 * np.log(u_low))
+        log_high = log_open + (log_returns + spread_high) / 2
+        log_low = log_open + (log_returns - spread_low) / 2
+
+        # 4. Volume: lognormal noise, higher on large moves and in the volatile regime
+        move = np.abs(log_returns) / sigma
+        volume = self.base_volume * np.exp(0.5 * rng.standard_normal(n_bars)) * (0.5 + move) * np.where(regime == 1, 1.5, 1.0)
+
+        timestamps = pd.Timestamp(start) + pd.to_timedelta(np.arange(n_bars) * bar_seconds, unit='s')
+        return pd.DataFrame({
+            'timestamp': timestamps,
+            'open': np.exp(log_open),
+            'high': np.exp(log_high),
+            'low': np.exp(log_low),
+            'close': np.exp(log_close),
+            'volume': volume
+        })
+
+    def generate_universe(self, symbols, n_bars=18000, start='2023-01-01'):
+        """
+        Generate independent bars for several symbols.
+        Each symbol gets its own stream derived from the generator seed, so
+        adding or reordering symbols does not change existing series.
+
+        Returns:
+            dict: {symbol: DataFrame}
+        """
+        universe = {}
+        for symbol in symbols:
+            price_seed, bars_seed = np.random.SeedSequence([self.seed, *symbol.encode()]).spawn(2)
+            start_price = float(np.round(10 ** np.random.default_rng(price_seed).uniform(0, 4), 2))
+            universe[symbol] = self.generate(n_bars, start=start, start_price=start_price, seed=bars_seed)
+        return universe
@@ -1,58 +1,192 @@
-﻿import time
+﻿import asyncio
+import itertools
+import time
 import numpy as np
+from execution.clock import WallClock
+from utils.rng import rng_service
 
 class ExecutionAlgo:
-    def __init__(self, router):
+    def __init__(self, router, clock=None, verbose=True, rng=None):
+        """
+        Args:
+            router: Order router exposing route_order(order) (and optionally route_order_async).
+            clock: Clock used to schedule child slices. WallClock in production,
+                VirtualClock for accelerated simulation.
+            verbose (bool): Print per-slice progress.
+            rng (np.random.Generator): Stream for the placeholder POV volume
+                (defaults to a new stream from the shared RNG service).
+        """
         self.router = router
+        self.clock = clock if clock is not None else WallClock()
+        self.verbose = verbose
+        self._order_ids = itertools.count(1)
+        self.rng = rng_service.resolve('execution_algo', rng=rng)
 
     def twap(self, symbol, side, total_quantity, duration_minutes, interval_seconds=60):
         """
         Time-Weighted Average Price (TWAP) execution.
         Slices order evenly over time.
         """
+        return self.clock.run(self.twap_async(symbol, side, total_quantity, duration_minutes, interval_seconds))
+
+    def pov(self, symbol, side, total_quantity, participation_rate=0.10, volume_feed=None, interval_seconds=60, max_idle_intervals=10):
+        """
+        Percentage of Volume (POV) execution.
+        Executes based on market volume to avoid impact.
+        """
+        return self.clock.run(self.pov_async(symbol, side, total_quantity, participation_rate, volume_feed, interval_seconds, max_idle_intervals))
+
+    def run_concurrent(self, parent_orders):
+        """
+        Run many parent orders concurrently on the algo clock.
+
+        Args:
+            parent_orders (list): Dicts with 'algo' ('twap' or 'pov') plus the
+                keyword arguments of twap_async / pov_async.
+
+        Returns:
+            list: Per-order fill and latency stats, in submission order.
+        """
+        return self.clock.run(self.run_concurrent_async(parent_orders))
+
+    async def run_concurrent_async(self, parent_orders):
+        tasks = []
+        for parent in parent_orders:
+            params = dict(parent)
+            algo = params.pop('algo')
+            if algo == 'twap':
+                tasks.append(self.twap_async(**params))
+            elif algo == 'pov':
+                tasks.append(self.pov_async(**params))
+            else:
+                raise ValueError(f"Unknown execution algo: {algo}")
+        return await asyncio.gather(*tasks)
+
+    async def twap_async(self, symbol, side, total_quantity, duration_minutes, interval_seconds=60):
         num_slices = int((duration_minutes * 60) / interval_seconds)
+        stats = self._new_stats('twap', symbol, side, total_quantity)
         if num_slices == 0:
-            return
+            return self._finalize_stats(stats)
 
         slice_qty = total_quantity / num_slices
-        print(f"Starting TWAP: {total_quantity} {symbol} over {duration_minutes} min. Slice: {slice_qty:.4f}")
+        if self.verbose:
+            print(f"Starting TWAP: {total_quantity} {symbol} over {duration_minutes} min. Slice: {slice_qty:.4f}")
 
+        # Slices are scheduled against the start time, so routing delays don't accumulate drift
         for i in range(num_slices):
-            order = {
-                'symbol': symbol,
-                'side': side,
-                'quantity': slice_qty
-            }
-            self.router.route_order(order)
-            # In simulation we don't actually sleep for long
-            # time.sleep(interval_seconds) 
-            print(f"Executed slice {i+1}/{num_slices}")
-
-    def pov(self, symbol, side, total_quantity, participation_rate=0.10):
+            scheduled_at = stats['start_time'] + i * interval_seconds
+            await self.clock.sleep(scheduled_at - self.clock.now())
+            await self._send_slice(stats, slice_qty, scheduled_at)
+            if self.verbose:
+                print(f"Executed slice {i+1}/{num_slices}")
+
+        return self._finalize_stats(stats)
+
+    async def pov_async(self, symbol, side, total_quantity, participation_rate=0.10, volume_feed=None, interval_seconds=60, max_idle_intervals=10):
         """
-        Percentage of Volume (POV) execution.
-        Executes based on market volume to avoid impact.
+        Args:
+            volume_feed: Object with async next_volume(symbol) returning the market
+                volume traded in the last interval (None when the feed ends).
+                Falls back to a random placeholder volume when not provided.
+            max_idle_intervals (int): Give up after this many consecutive intervals
+                without a fill (no volume, or the router filled nothing). The rest
+                is reported as 'unfilled_quantity' with stop_reason 'idle'.
         """
         remaining_qty = total_quantity
-        print(f"Starting POV: {total_quantity} {symbol} at {participation_rate*100}% rate")
+        stats = self._new_stats('pov', symbol, side, total_quantity)
+        if self.verbose:
+            print(f"Starting POV: {total_quantity} {symbol} at {participation_rate*100}% rate")
+
+        interval = 0
+        idle = 0
+        while remaining_qty > 1e-12:
+            if idle >= max_idle_intervals:
+                stats['stop_reason'] = 'idle'
+                break
+            # Wait for the next volume bucket to complete
+            interval += 1
+            scheduled_at = stats['start_time'] + interval * interval_seconds
+            await self.clock.sleep(scheduled_at - self.clock.now())
+
+            if volume_feed is not None:
+                market_volume = await volume_feed.next_volume(symbol)
+                if market_volume is None:
+                    stats['stop_reason'] = 'feed_ended'
+                    break
+            else:
+                market_volume = self.rng.uniform(10, 50) # Random placeholder
 
-        while remaining_qty > 0:
-            # Simulate fetching recent market volume (e.g., last minute volume)
-            market_volume = np.random.uniform(10, 50) # Random placeholder
-            
             # Calculate our trade size
-            my_trade_size = market_volume * participation_rate
-            
-            if my_trade_size > remaining_qty:
-                my_trade_size = remaining_qty
-
-            order = {
-                'symbol': symbol,
-                'side': side,
-                'quantity': my_trade_size
-            }
-            self.router.route_order(order)
-            
-            remaining_qty -= my_trade_size
-            print(f"Executed {my_trade_size:.4f}. Remaining: {remaining_qty:.4f}")
-            # time.sleep(60) # Wait for next volume bucket
+            my_trade_size = min(market_volume * participation_rate, remaining_qty)
+            if my_trade_size <= 0:
+                idle += 1
+                continue
+
+            filled = await self._send_slice(stats, my_trade_size, scheduled_at)
+            remaining_qty -= filled
+            idle = idle + 1 if filled <= 0 else 0
+            if self.verbose:
+                print(f"Executed {filled:.4f}. Remaining: {remaining_qty:.4f}")
+
+        if self.verbose and stats['stop_reason'] is not None:
+            print(f"POV stopped ({stats['stop_reason']}). Unfilled: {remaining_qty:.4f}")
+        return self._finalize_stats(stats)
+
+    async def _send_slice(self, stats, quantity, scheduled_at):
+        order = {
+            'symbol': stats['symbol'],
+            'side': stats['side'],
+            'quantity': quantity
+        }
+        sent_at = self.clock.now()
+        t0 = time.perf_counter()
+        if hasattr(self.router, 'route_order_async'):
+            execution = await self.router.route_order_async(order)
+        else:
+            execution = self.router.route_order(order)
+        latency = time.perf_counter() - t0
+
+        filled = quantity
+        price = None
+        if isinstance(execution, dict):
+            filled = execution.get('quantity', quantity)
+            price = execution.get('price')
+
+        stats['slices'] += 1
+        stats['filled_quantity'] += filled
+        if price is not None:
+            stats['_notional'] += filled * price
+        stats['_latencies'].append(latency)
+        stats['_slips'].append(max(sent_at - scheduled_at, 0.0))
+        return filled
+
+    def _new_stats(self, algo, symbol, side, total_quantity):
+        return {
+            'order_id': next(self._order_ids),
+            'algo': algo,
+            'symbol': symbol,
+            'side': side,
+            'target_quantity': total_quantity,
+            'filled_quantity': 0.0,
+            'slices': 0,
+            'stop_reason': None,
+            'start_time': self.clock.now(),
+            '_notional': 0.0,
+            '_latencies': [],
+            '_slips': []
+        }
+
+    def _finalize_stats(self, stats):
+        latencies = np.array(stats.pop('_latencies')) * 1000.0
+        slips = np.array(stats.pop('_slips'))
+        notional = stats.pop('_notional')
+
+        stats['end_time'] = self.clock.now()
+        stats['unfilled_quantity'] = max(stats['target_quantity'] - stats['filled_quantity'], 0.0)
+        stats['fill_ratio'] = stats['filled_quantity'] / stats['target_quantity'] if stats['target_quantity'] else 0.0
+        stats['avg_price'] = notional / stats['filled_quantity'] if stats['filled_quantity'] and notional else None
+        stats['latency_ms_mean'] = float(latencies.mean()) if len(latencies) else 0.0
+        stats['latency_ms_p95'] = float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+        stats['latency_ms_max'] = float(latencies.max()) if len(latencies) else 0.0
+        stats['schedule_slip_mean'] = float(slips.mean()) if len(slips) else 0.0
+        return stats
@@ -1,18 +1,20 @@
-﻿import ccxt
+﻿import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from data.exchange_pool import exchange_pool
 
 class RealExecution:
-    def __init__(self, exchange_id='binance', api_key=None, secret=None, sandbox=False):
-        exchange_class = getattr(ccxt, exchange_id)
-        config = {
-            'apiKey': api_key,
-            'secret': secret,
-            'enableRateLimit': True,
-        }
-        self.exchange = exchange_class(config)
-        if sandbox:
-            self.exchange.set_sandbox_mode(True)
-        self.exchange.load_markets()
+    def __init__(self, exchange_id='binance', api_key=None, secret=None, sandbox=False, pool=None):
+        """
+        Args:
+            pool (ExchangePool): Client registry. Defaults to the process-wide pool, so
+                every instance for the same exchange and credentials shares one client
+                and market metadata comes from the disk cache.
+        """
+        self.pool = pool or exchange_pool
+        self.exchange = self.pool.get(exchange_id, api_key=api_key, secret=secret, sandbox=sandbox)
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
 
     def place_order(self, symbol, side, type, amount, price=None):
         """
@@ -23,13 +25,44 @@ class RealExecution:
                 order = self.exchange.create_order(symbol, type, side, amount, price)
             else:
                 order = self.exchange.create_order(symbol, type, side, amount)
-            
+
             print(f"Order placed: {order['id']} - {side} {amount} {symbol}")
             return order
         except Exception as e:
             print(f"Order failed: {e}")
             return None
 
+    def place_orders(self, orders, max_workers=8):
+        """
+        Submit several orders concurrently while respecting the exchange rate limit.
+        Requests start at least `exchange.rateLimit` ms apart but their round trips overlap.
+
+        Args:
+            orders (list): Dicts with 'symbol', 'side', 'type', 'amount' and optional 'price'.
+            max_workers (int): Maximum orders in flight at once.
+
+        Returns:
+            list: Placed orders in the same order as the input (None for failures).
+        """
+        if not orders:
+            return []
+
+        def submit(order):
+            self._wait_for_rate_limit()
+            return self.place_order(order['symbol'], order['side'], order['type'], order['amount'], order.get('price'))
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(orders))) as executor:
+            return list(executor.map(submit, orders))
+
+    def _wait_for_rate_limit(self):
+        interval = getattr(self.exchange, 'rateLimit', 0) / 1000.0
+        with self._rate_lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_request_at)
+            self._next_request_at = start_at + interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
     def get_balance(self, currency='USDT'):
         try:
             balance = self.exchange.fetch_balance()
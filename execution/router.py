@@ -1,41 +1,157 @@
-﻿import random
+﻿import asyncio
+import time
+from data.exchange_pool import exchange_pool
 
 class SmartOrderRouter:
-    def __init__(self, exchanges=['binance', 'coinbase', 'kraken']):
-        self.exchanges = exchanges
+    def __init__(self, exchanges=['binance', 'coinbase', 'kraken'], venues=None, cache_ttl=1.0,
+                 depth=20, fees=None, latency_budget_ms=None, verbose=True):
+        """
+        Args:
+            exchanges (list): Venue ids to route across.
+            venues (dict): {venue_id: client}. Clients expose ccxt's fetch_order_book
+                (or fetch_order_book_async). Defaults to ccxt clients for `exchanges`.
+            cache_ttl (float): Seconds an order book stays valid in the cache.
+            depth (int): Order book levels requested per venue.
+            fees (dict): {venue_id: taker fee rate} used to compare effective prices.
+            latency_budget_ms (float): Warn when a routing decision takes longer.
+            verbose (bool): Print routing decisions.
+        """
+        self.exchanges = list(venues.keys()) if venues else exchanges
+        self.venues = venues
+        self.cache_ttl = cache_ttl
+        self.depth = depth
+        self.fees = fees or {}
+        self.latency_budget_ms = latency_budget_ms
+        self.verbose = verbose
+        self.last_decision_ms = 0.0
+        self._book_cache = {}
 
-    def get_best_price(self, symbol, side='buy', quantity=1.0):
+    def _get_venues(self):
+        if self.venues is None:
+            self.venues = {name: exchange_pool.get(name, load_markets=False) for name in self.exchanges}
+        return self.venues
+
+    async def fetch_books_async(self, symbol):
+        """
+        Fetch order books from all venues concurrently, serving fresh ones from the cache.
+
+        Returns:
+            dict: {venue_id: order_book} for every venue that responded.
+        """
+        venues = self._get_venues()
+        now = time.monotonic()
+        books = {}
+        stale = []
+        for name in self.exchanges:
+            cached = self._book_cache.get((name, symbol))
+            if cached and now - cached[0] <= self.cache_ttl:
+                books[name] = cached[1]
+            else:
+                stale.append(name)
+
+        if stale:
+            fetched = await asyncio.gather(
+                *(self._fetch_book(venues[name], symbol) for name in stale),
+                return_exceptions=True
+            )
+            fetched_at = time.monotonic()
+            for name, book in zip(stale, fetched):
+                if isinstance(book, Exception) or not book:
+                    print(f"Order book fetch failed on {name}: {book}")
+                    continue
+                self._book_cache[(name, symbol)] = (fetched_at, book)
+                books[name] = book
+        return books
+
+    async def _fetch_book(self, venue, symbol):
+        if hasattr(venue, 'fetch_order_book_async'):
+            return await venue.fetch_order_book_async(symbol, self.depth)
+        return await asyncio.to_thread(venue.fetch_order_book, symbol, self.depth)
+
+    def fetch_books(self, symbol):
+        return asyncio.run(self.fetch_books_async(symbol))
+
+    def split_order(self, books, side, quantity):
         """
-        Simulate finding the best price across multiple exchanges.
-        In a real system, this would query live order books.
-        """
-        prices = {}
-        # Simulate slight price variations
-        base_price = 100000.0 # Placeholder BTC price
-        
-        for exchange in self.exchanges:
-            # Random deviation +/- 0.05%
-            deviation = base_price * random.uniform(-0.0005, 0.0005)
-            prices[exchange] = base_price + deviation
-
-        if side == 'buy':
-            best_exchange = min(prices, key=prices.get)
-            best_price = prices[best_exchange]
-        else:
-            best_exchange = max(prices, key=prices.get)
-            best_price = prices[best_exchange]
+        Split a parent order across venues by walking the combined depth.
+        Levels from every venue are merged and consumed cheapest-first
+        (fee-adjusted), which minimizes the expected cost of the fill.
+
+        Returns:
+            dict: Allocations per venue, average price and any unfilled quantity.
+        """
+        book_side = 'asks' if side == 'buy' else 'bids'
+        levels = []
+        for name, book in books.items():
+            fee = self.fees.get(name, 0.0)
+            for price, qty in book.get(book_side, []):
+                effective = price * (1 + fee) if side == 'buy' else price * (1 - fee)
+                levels.append((effective, price, qty, name))
+        levels.sort(key=lambda level: level[0], reverse=(side != 'buy'))
+
+        remaining = quantity
+        fills = {}
+        for effective, price, qty, name in levels:
+            if remaining <= 0:
+                break
+            take = min(qty, remaining)
+            fill = fills.setdefault(name, {'exchange': name, 'quantity': 0.0, 'notional': 0.0})
+            fill['quantity'] += take
+            fill['notional'] += take * price
+            remaining -= take
 
+        allocations = []
+        for fill in fills.values():
+            fill['price'] = fill['notional'] / fill['quantity']
+            allocations.append(fill)
+        allocations.sort(key=lambda fill: fill['quantity'], reverse=True)
+
+        filled = quantity - max(remaining, 0.0)
+        notional = sum(fill['notional'] for fill in allocations)
         return {
-            'exchange': best_exchange,
-            'price': best_price,
-            'quantity': quantity,
-            'side': side
+            'allocations': allocations,
+            'price': notional / filled if filled > 0 else None,
+            'filled': filled,
+            'unfilled': max(remaining, 0.0)
         }
 
-    def route_order(self, order):
+    async def get_best_price_async(self, symbol, side='buy', quantity=1.0):
+        t0 = time.perf_counter()
+        books = await self.fetch_books_async(symbol)
+        split = self.split_order(books, side, quantity)
+        self.last_decision_ms = (time.perf_counter() - t0) * 1000.0
+
+        if self.latency_budget_ms is not None and self.last_decision_ms > self.latency_budget_ms:
+            print(f"WARNING: Routing decision took {self.last_decision_ms:.1f}ms (budget {self.latency_budget_ms}ms)")
+
+        allocations = split['allocations']
+        return {
+            'exchange': allocations[0]['exchange'] if allocations else None,
+            'price': split['price'],
+            'quantity': split['filled'],
+            'side': side,
+            'allocations': allocations,
+            'unfilled': split['unfilled']
+        }
+
+    def get_best_price(self, symbol, side='buy', quantity=1.0):
         """
-        Route the order to the best exchange.
+        Find the cheapest execution across all venues' live order books.
         """
-        best_execution = self.get_best_price(order['symbol'], order['side'], order['quantity'])
-        print(f"Routing order to {best_execution['exchange']} @ {best_execution['price']:.2f}")
+        return asyncio.run(self.get_best_price_async(symbol, side, quantity))
+
+    async def route_order_async(self, order):
+        best_execution = await self.get_best_price_async(order['symbol'], order['side'], order['quantity'])
+        if self.verbose:
+            if best_execution['price'] is None:
+                print(f"No liquidity to route {order['symbol']} {order['side']}")
+            else:
+                venues = ", ".join(f"{a['exchange']} {a['quantity']:.4f}" for a in best_execution['allocations'])
+                print(f"Routing order @ {best_execution['price']:.2f} -> {venues}")
         return best_execution
+
+    def route_order(self, order):
+        """
+        Route the order to the best exchange(s).
+        """
+        return asyncio.run(self.route_order_async(order))
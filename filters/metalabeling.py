@@ -1,10 +1,9 @@
 ﻿import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report
 
 class MetaLabeling:
     def __init__(self):
+        from sklearn.ensemble import RandomForestClassifier
         self.model = RandomForestClassifier(n_estimators=100, max_depth=5, random_state=42)
 
     def train(self, X, y):
@@ -32,5 +31,6 @@ class MetaLabeling:
         return filtered_signals
 
     def evaluate(self, X_test, y_test):
+        from sklearn.metrics import classification_report
         y_pred = self.model.predict(X_test)
         return classification_report(y_test, y_pred)
@@ -1,15 +1,23 @@
 ﻿import yaml
-import pandas as pd
-import numpy as np
 import os
 from dotenv import load_dotenv
 from data.fetcher import DataFetcher
+from data.storage import OHLCVStore
 from strategy.indicators import Indicators
 from strategy.regime import RegimeDetection
 from strategy.logic import StrategyLogic
-from analysis.backtest import BacktestEngine
-from analysis.visualizer import Visualizer
-from utils.telegram_notifier import TelegramNotifier
+from strategy.mtf import MultiTimeframeFeatures
+from strategy.exit_kernel import run_kernel_backtest
+from analysis.backtest import BacktestEngine, PortfolioBacktest
+from analysis.profiler import profiler
+from analysis import result_cache as result_cache_module
+from analysis.result_cache import result_cache
+from analysis import run_store as run_store_module
+from analysis.run_store import run_store
+from analysis.bootstrap import BlockBootstrap
+from risk.covariance import periods_per_year
+from risk.portfolio_guardrails import PortfolioGuardrails
+from utils import rng as rng_module
 import time
 
 def load_config(path='config.yaml'):
@@ -17,11 +25,17 @@ def load_config(path='config.yaml'):
         return yaml.safe_load(file)
 
 def run_strategy_for_symbol(symbol, config):
+    with profiler.context(symbol=symbol):
+        return _run_strategy_for_symbol(symbol, config)
+
+def _fetch_symbol(symbol, config):
     print(f"\n--- Processing {symbol} ---")
     
     # 1. Data Layer
     source = config['backtest'].get('source', 'yahoo')
-    fetcher = DataFetcher(source=source)
+    data_config = config.get('data', {})
+    store = OHLCVStore(data_config['store_dir'], source=source) if data_config.get('store_dir') else None
+    fetcher = DataFetcher(source=source, base_timeframe=data_config.get('base_timeframe'), store=store)
     timeframe = config['backtest']['timeframe']
     limit = config['backtest']['limit']
     
@@ -31,7 +45,113 @@ def run_strategy_for_symbol(symbol, config):
     if df is None or df.empty:
         print(f"!!! WARNING: No data for {symbol}. Skipping. !!!")
         return None
+    return df
+
+def _engine_params(config):
+    return {
+        'initial_capital': config['backtest']['initial_capital'],
+        'fee': config['backtest'].get('fee', 0.001),
+        'max_drawdown': config['strategy']['risk'].get('max_drawdown', 0.15)
+    }
+
+def _run_strategy_for_symbol(symbol, config):
+    df = _fetch_symbol(symbol, config)
+    if df is None:
+        return None
+
+    # 2-3. Strategy + Backtest (served from the result cache when this exact run was done before)
+    engine_params = _engine_params(config)
+
+    def run_backtest():
+        trades = []
+        features = []
+        metrics, results = _backtest(df, config, engine_params, trades, features)
+        return metrics, results, {'trades': trades, 'features': features[0]}
+
+    # The trade log and feature frame are cached too: the run store, bootstrap and charts need them on a hit
+    metrics, results, hit, artifacts = result_cache.get_or_run(
+        df, {'strategy': config['strategy'], 'engine': engine_params}, run_backtest, pipeline='main',
+        artifacts=('trades', 'features')
+    )
+    trades = artifacts['trades'].to_dict('records')
+    features = artifacts['features']
+    if hit:
+        print(f"Result cache hit for {symbol}; skipping backtest.")
+    return _summarize(symbol, config, df, metrics, results, trades, features)
+
+def run_portfolio(symbols, config, guardrails):
+    """
+    Backtest all symbols on one timeline under portfolio-level guardrails
+    (config['portfolio_risk']). Symbols interact through the shared limits, so
+    the joint run is not served from the per-symbol result cache.
+
+    Returns:
+        list: Per-symbol summaries, as returned by run_strategy_for_symbol.
+    """
+    if config['strategy']['risk'].get('exit_model') == 'intrabar':
+        print("Portfolio guardrails use the per-bar engine; exit_model 'intrabar' is ignored.")
+
+    # 1-2. Data and features per symbol
+    inputs = {}
+    for symbol in symbols:
+        with profiler.context(symbol=symbol):
+            df = _fetch_symbol(symbol, config)
+            if df is not None:
+                inputs[symbol] = (df, _features(df, config))
+    if not inputs:
+        return []
+
+    # 3. Joint backtest
+    print(f"\n--- Portfolio backtest of {len(inputs)} symbols with shared guardrails ---")
+    risk = config['strategy']['risk']
+    portfolio = PortfolioBacktest(**_engine_params(config), portfolio_guardrails=guardrails,
+                                  covariance_sizing=risk.get('portfolio_sizing'),
+                                  target_volatility=config['strategy'].get('target_volatility', 0.20),
+                                  ewma_lambda=risk.get('ewma_lambda', 0.94),
+                                  periods_per_year=periods_per_year(config['backtest']['timeframe']))
+    for symbol, (_, features) in inputs.items():
+        portfolio.add(symbol, features, StrategyLogic(config))
+    results = portfolio.run()
+    metrics = portfolio.calculate_metrics()
+
+    summaries = []
+    for symbol, (df, features) in inputs.items():
+        with profiler.context(symbol=symbol):
+            summaries.append(_summarize(symbol, config, df, metrics[symbol], results[symbol],
+                                        portfolio.engines[symbol].positions, features, name='portfolio'))
+    return summaries
+
+def _summarize(symbol, config, df, metrics, results, trades, features, name='main'):
+    timeframe = config['backtest']['timeframe']
+
+    # 4. Persist the run (metadata, metrics, trades, equity curve)
+    run_id = run_store.save_run(symbol, config, metrics, results, trades=trades, df=df, timeframe=timeframe, name=name)
+    if run_id:
+        print(f"Run stored as {run_id}")
+
+    # 5. Confidence intervals for the metrics (block bootstrap over bar returns and trade PnLs)
+    bootstrap = BlockBootstrap.from_config(config)
+    if bootstrap is not None:
+        intervals = bootstrap.run(results, trades, periods_per_year=periods_per_year(timeframe))
+        level = int(bootstrap.confidence * 100)
+        for name, row in intervals.iterrows():
+            print(f"  {name:<14} {row['estimate']:>10.2f}  {level}% CI [{row['lower']:.2f}, {row['upper']:.2f}]")
+        if 'profit_factor' not in intervals.index:
+            print(f"  No profit factor / win rate intervals: {len(trades)} closed trades (2 needed)")
+    
+    # Return summary
+    return {
+        'symbol': symbol,
+        'report': {'symbol': symbol, 'results': results, 'data': features, 'trades': trades},
+        'profit_factor': metrics['profit_factor'],
+        'win_rate': metrics['win_rate'],
+        'total_trades': metrics['total_trades'],
+        'max_drawdown': metrics['max_drawdown'],
+        'total_return': ((results['equity'].iloc[-1] - config['backtest']['initial_capital']) / config['backtest']['initial_capital']) * 100,
+        'final_equity': results['equity'].iloc[-1]
+    }
 
+def _features(df, config):
     # 2. Strategy Layer
     inds = config['strategy']['indicators']
     df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
@@ -47,30 +167,35 @@ def run_strategy_for_symbol(symbol, config):
     regime_detector = RegimeDetection(df)
     df = regime_detector.detect_regime()
 
+    # Higher-timeframe features (aligned, no look-ahead) when strategy.mtf is configured
+    mtf = MultiTimeframeFeatures.from_config(config)
+    if mtf is not None:
+        df = mtf.compute(df)
+    return df
+
+def _backtest(df, config, engine_params, trades=None, features=None):
+    df = _features(df, config)
+    if features is not None:
+        features.append(df)
+
     # 3. Backtest
-    engine = BacktestEngine(
-        initial_capital=config['backtest']['initial_capital'], 
-        fee=config['backtest'].get('fee', 0.001),
-        max_drawdown=config['strategy']['risk'].get('max_drawdown', 0.15)
-    )
+    if config['strategy']['risk'].get('exit_model') == 'intrabar':
+        # Compiled/vectorized exit kernel with high/low stop and target touches
+        metrics, results, kernel_trades = run_kernel_backtest(df, config, engine_params['initial_capital'], engine_params['fee'])
+        if trades is not None:
+            trades.extend(kernel_trades.to_dict('records'))
+        return metrics, results
+
+    engine = BacktestEngine(**engine_params)
     
     logic = StrategyLogic(config)
     def strategy_wrapper(row, capital, current_position):
         return logic.get_signal(row, capital, current_position)
 
     results = engine.run(df, strategy_wrapper)
-    metrics = engine.calculate_metrics()
-    
-    # Return summary
-    return {
-        'symbol': symbol,
-        'profit_factor': metrics['profit_factor'],
-        'win_rate': metrics['win_rate'],
-        'total_trades': metrics['total_trades'],
-        'max_drawdown': metrics['max_drawdown'],
-        'total_return': ((results['equity'].iloc[-1] - config['backtest']['initial_capital']) / config['backtest']['initial_capital']) * 100,
-        'final_equity': results['equity'].iloc[-1]
-    }
+    if trades is not None:
+        trades.extend(engine.positions)
+    return engine.calculate_metrics(), results
 
 def main():
     print("--- Starting Multi-Asset Quant Strategy Pipeline ---")
@@ -84,6 +209,7 @@ def main():
         bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
         chat_id = os.getenv('TELEGRAM_CHAT_ID')
         if bot_token and chat_id:
+            from utils.telegram_notifier import TelegramNotifier
             telegram = TelegramNotifier(bot_token, chat_id)
             print(" Telegram notifications enabled")
         else:
@@ -96,6 +222,15 @@ def main():
         print("Failed to load config. Exiting.")
         return
 
+    profiling = config.get('profiling', {})
+    if profiling.get('enabled'):
+        profiler.enable(track_memory=profiling.get('track_memory', True))
+        print(" Stage profiling enabled")
+
+    result_cache_module.configure(config)
+    run_store_module.configure(config)
+    rng_module.configure(config)
+
     # Handle single symbol vs list of symbols
     if 'symbols' in config['backtest']:
         symbols = config['backtest']['symbols']
@@ -112,20 +247,37 @@ def main():
             print(f" Failed to send start notification: {e}")
     
     portfolio_results = []
+    report_jobs = []
     start_time = time.time()
-    
-    for symbol in symbols:
+
+    # With portfolio_risk enabled the symbols share one timeline and one set of limits
+    guardrails = PortfolioGuardrails.from_config(config)
+    if guardrails is not None:
         try:
-            res = run_strategy_for_symbol(symbol, config)
-            if res:
+            for res in run_portfolio(symbols, config, guardrails):
+                report_jobs.append(res.pop('report'))
                 portfolio_results.append(res)
         except Exception as e:
-            print(f"Error processing {symbol}: {e}")
+            print(f"Error in portfolio backtest: {e}")
             if telegram:
                 try:
-                    telegram.send_alert("Backtest Hatası", f"{symbol}: {str(e)}")
+                    telegram.send_alert("Backtest Hatası", f"Portfolio: {str(e)}")
                 except:
                     pass
+    else:
+        for symbol in symbols:
+            try:
+                res = run_strategy_for_symbol(symbol, config)
+                if res:
+                    report_jobs.append(res.pop('report'))
+                    portfolio_results.append(res)
+            except Exception as e:
+                print(f"Error processing {symbol}: {e}")
+                if telegram:
+                    try:
+                        telegram.send_alert("Backtest Hatası", f"{symbol}: {str(e)}")
+                    except:
+                        pass
             
     # Portfolio Summary
     print("\n" + "="*60)
@@ -151,6 +303,21 @@ def main():
     
     print("="*60)
     print("Check individual logs for details.")
+
+    # Per-symbol charts, rendered in parallel headless workers
+    reports = config.get('reports', {})
+    if reports.get('enabled') and report_jobs:
+        from analysis.visualizer import render_reports
+        with profiler.stage('plotting'):
+            paths = render_reports(report_jobs, output_dir=reports.get('dir', 'reports'),
+                                   max_workers=reports.get('workers'), max_points=reports.get('max_points', 2000))
+        print(f"Rendered {len(paths)} charts to {reports.get('dir', 'reports')}/")
+    if result_cache.enabled:
+        print(f"Result cache: {result_cache.hits} hits, {result_cache.misses} misses")
+
+    if profiler.enabled:
+        profiler.print_summary()
+        profiler.save(profiling.get('output', 'profile_report.json'))
     
     # Send portfolio summary to Telegram
     if telegram and portfolio_results:
@@ -1,4 +1,4 @@
-﻿import optuna
+﻿import argparse
 import pandas as pd
 import numpy as np
 import yaml
@@ -6,13 +6,22 @@ from data.fetcher import DataFetcher
 from strategy.indicators import Indicators
 from strategy.regime import RegimeDetection
 from strategy.logic import StrategyLogic
+from strategy.mtf import MultiTimeframeFeatures
 from analysis.backtest import BacktestEngine
+from analysis.profiler import profiler
+from analysis import result_cache as result_cache_module
+from analysis.result_cache import result_cache
+from analysis.optimizer import create_study, run_study, make_pruning_callback, study_name, best_trial
 
 def load_config(path='config.yaml'):
     with open(path, 'r', encoding='utf-8-sig') as file:
         return yaml.safe_load(file)
 
 def objective(trial):
+    with profiler.context(symbol=current_symbol, trial=trial.number):
+        return _objective(trial)
+
+def _objective(trial):
     global current_symbol, cached_df
     
     # 1. Load Base Config
@@ -30,38 +39,47 @@ def objective(trial):
     if cached_df is None or cached_df.empty:
         return 0.0
         
-    df = cached_df.copy()
-
-    # 4. Recalculate Indicators
-    inds = config['strategy']['indicators']
-    df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
-    df = Indicators.rsi(df, window=inds['rsi_period'])
-    df = Indicators.bollinger_bands(df, window=inds['bb_window'], num_std=inds['bb_std'])
-    df = Indicators.atr(df, window=inds['atr_window'])
-    df = Indicators.adx(df, window=14)
-    try:
-        df = Indicators.garch_volatility(df)
-    except:
-        df['garch_vol'] = 2.0
-        
-    regime = RegimeDetection(df)
-    df = regime.detect_regime()
-
-    # 5. Run Backtest
-    engine = BacktestEngine(
-        initial_capital=config['backtest']['initial_capital'], 
-        fee=config['backtest'].get('fee', 0.001),
-        max_drawdown=0.15 
-    )
-    logic = StrategyLogic(config)
-    
-    def strategy_wrapper(row, capital, current_position):
-        return logic.get_signal(row, capital, current_position)
+    engine_params = {
+        'initial_capital': config['backtest']['initial_capital'],
+        'fee': config['backtest'].get('fee', 0.001),
+        'max_drawdown': 0.15
+    }
 
-    results = engine.run(df, strategy_wrapper)
-    
-    # 6. Calculate Metric
-    metrics = engine.calculate_metrics()
+    def run_backtest():
+        df = cached_df.copy()
+
+        # 4. Recalculate Indicators
+        inds = config['strategy']['indicators']
+        df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
+        df = Indicators.rsi(df, window=inds['rsi_period'])
+        df = Indicators.bollinger_bands(df, window=inds['bb_window'], num_std=inds['bb_std'])
+        df = Indicators.atr(df, window=inds['atr_window'])
+        df = Indicators.adx(df, window=14)
+        try:
+            df = Indicators.garch_volatility(df)
+        except:
+            df['garch_vol'] = 2.0
+
+        regime = RegimeDetection(df)
+        df = regime.detect_regime()
+        mtf = MultiTimeframeFeatures.from_config(config)
+        if mtf is not None:
+            df = mtf.compute(df)
+
+        # 5. Run Backtest
+        engine = BacktestEngine(**engine_params)
+        logic = StrategyLogic(config)
+
+        def strategy_wrapper(row, capital, current_position):
+            return logic.get_signal(row, capital, current_position)
+
+        results = engine.run(df, strategy_wrapper, on_checkpoint=make_pruning_callback(trial, min_trades=20))
+        return engine.calculate_metrics(), results
+
+    # 6. Calculate Metric (identical parameter sets are served from the result cache)
+    metrics, _, _ = result_cache.get_or_run(
+        cached_df, {'strategy': config['strategy'], 'engine': engine_params}, run_backtest, pipeline='per_coin'
+    )
     profit_factor = metrics['profit_factor']
     win_rate = metrics['win_rate']
     
@@ -77,7 +95,13 @@ def objective(trial):
     print(f"  Trial {trial.number}: PF={profit_factor:.2f}, WR={win_rate:.2f}%, Trades={metrics['total_trades']}, Score={score:.2f}")
     return score
 
-def optimize_coin(symbol, config):
+def optimize_coin(symbol, config, study_prefix='per_coin', n_trials=20):
+    """
+    Args:
+        study_prefix (str): Study name prefix; the symbol, timeframe and dataset
+            hash are appended, so changed data never resumes a stale study.
+        n_trials (int): Total finished trials wanted.
+    """
     global current_symbol, cached_df
     current_symbol = symbol
     
@@ -90,34 +114,48 @@ def optimize_coin(symbol, config):
     limit = 18000
     
     print(f"Fetching data...")
-    cached_df = fetcher.fetch_ohlcv(symbol, timeframe, limit=limit)
+    with profiler.context(symbol=symbol):
+        cached_df = fetcher.fetch_ohlcv(symbol, timeframe, limit=limit)
     
     if cached_df is None or cached_df.empty:
         print(f"!!! ERROR: No data for {symbol}. Skipping. !!!")
         return None
     
-    print(f"Running optimization (20 trials)...")
-    study = optuna.create_study(direction='maximize')
-    study.optimize(objective, n_trials=20, show_progress_bar=False) 
+    print(f"Running optimization ({n_trials} trials)...")
+    study = create_study(study_name(f"{study_prefix}_{symbol}_{timeframe}", cached_df))
+    run_study(study, objective, n_trials, show_progress_bar=False)
 
+    trial = best_trial(study)
+    if trial is None:
+        print(f"No trial completed for {symbol} (all pruned or failed).")
+        return None
     print(f"Best trial for {symbol}:")
-    trial = study.best_trial
     print(f"  Score: {trial.value:.2f}")
     print(f"  Params: {trial.params}")
     
     return trial.params
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize strategy parameters per coin")
+    parser.add_argument('--study-prefix', default='per_coin', help="Prefix of the per-symbol study names")
+    parser.add_argument('--trials', type=int, default=20, help="Total finished trials wanted per symbol")
+    args = parser.parse_args()
+
     print("--- Per-Coin Optimization ---")
     
     config = load_config()
     symbols = config['backtest']['symbols']
+
+    profiling = config.get('profiling', {})
+    if profiling.get('enabled'):
+        profiler.enable(track_memory=profiling.get('track_memory', True))
+    result_cache_module.configure(config)
     
     results = {}
     
     for symbol in symbols:
         try:
-            params = optimize_coin(symbol, config)
+            params = optimize_coin(symbol, config, study_prefix=args.study_prefix, n_trials=args.trials)
             if params:
                 results[symbol] = params
         except Exception as e:
@@ -130,3 +168,7 @@ if __name__ == "__main__":
         print(f"{symbol}: {params}")
     
     print("\nSave these to config manually or run a verification backtest.")
+
+    if profiler.enabled:
+        profiler.print_summary()
+        profiler.save(profiling.get('output', 'profile_report.json'))
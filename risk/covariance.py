@@ -0,0 +1,236 @@
+﻿import numpy as np
+import pandas as pd
+from data.synthetic import TIMEFRAME_SECONDS
+
+def periods_per_year(timeframe):
+    """
+    Number of `timeframe` bars in a (24/7) year, for annualizing volatility.
+    """
+    return 365 * 86400 / TIMEFRAME_SECONDS[timeframe]
+
+# Updates an EWMACovariance needs before its estimate is used
+MIN_PERIODS = 20
+
+class EWMACovariance:
+    """
+    Exponentially weighted covariance of log returns across a universe of
+    assets (RiskMetrics style, zero mean).
+
+    Each update is one rank-1 step, O(n^2) for n assets, so no history is
+    rescanned:
+        S = lam * S + (1 - lam) * r r^T     (only pairs with valid returns)
+        W = lam * W + (1 - lam)             (weight actually observed per pair)
+    and the covariance is S / W, which removes the start-up bias and lets
+    assets with missing bars (new listings, gaps) enter the matrix gradually.
+    """
+    def __init__(self, symbols, lam=0.94, periods_per_year=8760, min_periods=MIN_PERIODS):
+        """
+        Args:
+            symbols (list): Asset names (column order of every update).
+            lam (float): Decay per bar (0.94 = RiskMetrics daily).
+            periods_per_year (float): Bars per year, used to annualize.
+            min_periods (int): Updates needed before the estimate is used.
+        """
+        self.symbols = list(symbols)
+        self.lam = lam
+        self.periods_per_year = periods_per_year
+        self.min_periods = min_periods
+        n = len(self.symbols)
+        self._sum = np.zeros((n, n))
+        self._weight = np.zeros((n, n))
+        self._last_prices = None
+        self.count = 0
+
+    def update(self, returns):
+        """
+        Add one bar of returns (NaN where an asset has no return).
+        """
+        returns = np.asarray(returns, dtype=float)
+        valid = ~np.isnan(returns)
+        r = np.where(valid, returns, 0.0)
+        self._sum *= self.lam
+        self._sum += (1 - self.lam) * np.outer(r, r)
+        self._weight *= self.lam
+        self._weight += (1 - self.lam) * np.outer(valid, valid)
+        self.count += 1
+        return self
+
+    def update_prices(self, prices):
+        """
+        Add one bar of prices; log returns are taken against the previous call.
+        The first call only stores the prices.
+        """
+        prices = np.asarray(prices, dtype=float)
+        if self._last_prices is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.update(np.log(prices / self._last_prices))
+        # Carry the last known price of an asset over missing bars
+        self._last_prices = prices if self._last_prices is None else np.where(np.isnan(prices), self._last_prices, prices)
+        return self
+
+    def update_prices_batch(self, prices):
+        """
+        Add many bars of prices at once; identical to calling update_prices() row by row.
+
+        Args:
+            prices (array or DataFrame): Shape (bars, assets).
+        """
+        prices = np.asarray(prices, dtype=float)
+        if len(prices) == 0:
+            return self
+        if self._last_prices is not None:
+            prices = np.vstack([self._last_prices, prices])
+        # Carry the last known price of an asset over missing bars, as update_prices() does
+        filled = pd.DataFrame(prices).ffill().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.update_batch(np.log(prices[1:] / filled[:-1]))
+        self._last_prices = filled[-1]
+        return self
+
+    def update_batch(self, returns):
+        """
+        Add many bars at once; identical to calling update() row by row.
+
+        Args:
+            returns (array or DataFrame): Shape (bars, assets).
+        """
+        returns = np.asarray(returns, dtype=float)
+        if returns.size == 0:
+            return self
+        valid = (~np.isnan(returns)).astype(float)
+        r = np.nan_to_num(returns, nan=0.0)
+        n_bars = len(r)
+        # Weight of bar t after the last bar: (1 - lam) * lam^(n_bars - 1 - t)
+        decay = (1 - self.lam) * self.lam ** np.arange(n_bars - 1, -1, -1, dtype=float)
+        self._sum = self.lam ** n_bars * self._sum + (r * decay[:, None]).T @ r
+        self._weight = self.lam ** n_bars * self._weight + (valid * decay[:, None]).T @ valid
+        self.count += n_bars
+        return self
+
+    @property
+    def ready(self):
+        return self.count >= self.min_periods
+
+    def covariance(self, annualized=True):
+        """
+        Returns:
+            ndarray: (assets, assets) covariance; NaN for pairs never observed together.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = np.where(self._weight > 0, self._sum / self._weight, np.nan)
+        return cov * self.periods_per_year if annualized else cov
+
+    def volatility(self, annualized=True):
+        return np.sqrt(np.diag(self.covariance(annualized)))
+
+    def correlation(self):
+        cov = self.covariance(annualized=False)
+        vol = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return cov / np.outer(vol, vol)
+
+    def weights(self, method='volatility_target', target_volatility=0.20, leverage_cap=2.0):
+        """
+        Target weights (fraction of capital, signed long) for every asset.
+
+        Args:
+            method (str): 'volatility_target' (each asset sized to the target on its own),
+                'portfolio_volatility' (inverse-volatility mix scaled to the target)
+                or 'risk_parity' (equal risk contributions, scaled to the target).
+
+        Returns:
+            dict: {symbol: weight}; assets without an estimate get 0.
+        """
+        cov = self.covariance()
+        if method == 'volatility_target':
+            w = volatility_target_weights(cov, target_volatility, leverage_cap)
+        elif method == 'portfolio_volatility':
+            w = volatility_target_weights(cov, target_volatility, leverage_cap, portfolio=True)
+        elif method == 'risk_parity':
+            w = risk_parity_weights(cov, target_volatility, leverage_cap)
+        else:
+            raise ValueError(f"Unknown sizing method: {method}")
+        return dict(zip(self.symbols, w))
+
+    def target_sizes(self, capital, **kwargs):
+        """
+        Target position size in quote currency per asset (see weights()).
+        """
+        return {symbol: capital * weight for symbol, weight in self.weights(**kwargs).items()}
+
+def _usable(cov):
+    """
+    Mask of assets with a positive, finite variance.
+    """
+    variance = np.diag(cov)
+    return np.isfinite(variance) & (variance > 0)
+
+def volatility_target_weights(cov, target_volatility=0.20, leverage_cap=2.0, portfolio=False):
+    """
+    Volatility-targeted weights for all assets in one call.
+
+    portfolio=False: w_i = min(target / vol_i, leverage_cap), the vectorized
+    form of PositionSizing.calculate_volatility_target_size.
+    portfolio=True: inverse-volatility weights scaled so the whole portfolio
+    (with correlations) runs at the target; gross leverage is capped.
+    """
+    cov = np.asarray(cov, dtype=float)
+    usable = _usable(cov)
+    w = np.zeros(len(cov))
+    if not usable.any():
+        return w
+    vol = np.sqrt(np.diag(cov)[usable])
+    if not portfolio:
+        w[usable] = np.minimum(target_volatility / vol, leverage_cap)
+        return w
+    w[usable] = 1.0 / vol
+    return _scale_to_target(w, cov, usable, target_volatility, leverage_cap)
+
+def risk_parity_weights(cov, target_volatility=None, leverage_cap=2.0, tol=1e-10, max_iter=500):
+    """
+    Equal-risk-contribution weights: every asset contributes w_i * (S w)_i
+    equally to the portfolio variance. Solved by a vectorized fixed-point
+    iteration from the inverse-volatility start.
+
+    Args:
+        target_volatility (float): Scale the result to this portfolio volatility
+            (None returns weights summing to 1).
+    """
+    cov = np.asarray(cov, dtype=float)
+    usable = _usable(cov)
+    w = np.zeros(len(cov))
+    if not usable.any():
+        return w
+    sub = np.nan_to_num(cov[np.ix_(usable, usable)], nan=0.0)
+    x = 1.0 / np.sqrt(np.diag(sub))
+    x /= x.sum()
+    for _ in range(max_iter):
+        contribution = x * (sub @ x)
+        share = contribution / contribution.sum()
+        if np.abs(share - 1.0 / len(x)).max() < tol:
+            break
+        x = x * np.sqrt((1.0 / len(x)) / share)
+        x /= x.sum()
+    w[usable] = x
+    if target_volatility is None:
+        return w
+    return _scale_to_target(w, cov, usable, target_volatility, leverage_cap)
+
+def _scale_to_target(w, cov, usable, target_volatility, leverage_cap):
+    sub = np.nan_to_num(cov[np.ix_(usable, usable)], nan=0.0)
+    portfolio_vol = np.sqrt(w[usable] @ sub @ w[usable])
+    if portfolio_vol > 0:
+        w = w * target_volatility / portfolio_vol
+    gross = np.abs(w).sum()
+    if gross > leverage_cap:
+        w = w * leverage_cap / gross
+    return w
+
+def ewma_volatility(close, lam=0.94, periods_per_year=8760):
+    """
+    Annualized EWMA volatility of one price series at every bar, matching
+    EWMACovariance.update_prices fed bar by bar (bias-corrected, zero mean).
+    """
+    returns = np.log(pd.Series(close, dtype=float)).diff()
+    variance = (returns ** 2).ewm(alpha=1 - lam, adjust=True).mean()
+    return np.sqrt(variance.to_numpy() * periods_per_year)
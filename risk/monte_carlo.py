@@ -1,61 +1,68 @@
-﻿import numpy as np
+﻿import os
+import numpy as np
 import pandas as pd
+from utils.rng import rng_service
 
 class MonteCarloSimulation:
-    def __init__(self, num_simulations=1000, num_trades=100):
+    def __init__(self, num_simulations=1000, num_trades=100, seed=None, chunk_size=10000, max_workers=None):
+        """
+        Args:
+            seed (int): Seed for reproducible runs. By default each instance gets
+                its own stream from the shared RNG service (utils.rng).
+            chunk_size (int): Simulations per chunk. Each chunk has its own child
+                seed, so results do not depend on max_workers.
+            max_workers (int): Threads evaluating chunks (default: CPU count).
+        """
         self.num_simulations = num_simulations
         self.num_trades = num_trades
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.seed_sequence = np.random.SeedSequence(seed) if seed is not None else rng_service.spawn('monte_carlo')
+
+    def _simulate_chunk(self, size, seed_sequence, win_rate, avg_win, avg_loss, starting_capital):
+        """
+        Equity paths of `size` simulations as one (size, trades) matrix.
+        """
+        rng = np.random.default_rng(seed_sequence)
+        wins = rng.random((size, self.num_trades)) < win_rate
+        factors = np.where(wins, 1 + avg_win, max(1 - avg_loss, 0.0)) # Equity cannot go below 0
+        equity = starting_capital * np.cumprod(factors, axis=1)
+
+        # Track DD (the peak includes the starting capital)
+        peak = np.maximum(np.maximum.accumulate(equity, axis=1), starting_capital)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(peak > 0, (peak - equity) / peak, 0.0)
+        return equity[:, -1], drawdown.max(axis=1)
 
     def simulate(self, win_rate, avg_win, avg_loss, starting_capital=10000):
         """
         Run Monte Carlo simulation for a trading strategy.
-        
+
         Args:
             win_rate (float): Probability of winning (0.0 to 1.0).
             avg_win (float): Average profit per winning trade (%).
             avg_loss (float): Average loss per losing trade (%).
             starting_capital (float): Initial capital.
-            
+
         Returns:
             dict: Statistics of the simulation (Max DD, Final Equity, Ruin Prob).
         """
-        results = []
-        max_drawdowns = []
-        ruin_count = 0
+        from concurrent.futures import ThreadPoolExecutor
+        sizes = [min(self.chunk_size, self.num_simulations - start) for start in range(0, self.num_simulations, self.chunk_size)]
+        seeds = rng_service.chunk_seeds(self.seed_sequence, len(sizes))
+        args = (win_rate, avg_win, avg_loss, starting_capital)
+
+        workers = min(self.max_workers or os.cpu_count() or 1, len(sizes))
+        if workers <= 1:
+            parts = [self._simulate_chunk(size, seed, *args) for size, seed in zip(sizes, seeds)]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(lambda job: self._simulate_chunk(job[0], job[1], *args), zip(sizes, seeds)))
 
-        for _ in range(self.num_simulations):
-            equity = [starting_capital]
-            peak = starting_capital
-            max_dd = 0.0
-            
-            # Generate trade outcomes
-            # 1 = Win, 0 = Loss
-            outcomes = np.random.choice([1, 0], size=self.num_trades, p=[win_rate, 1-win_rate])
-            
-            for outcome in outcomes:
-                current_cap = equity[-1]
-                if outcome == 1:
-                    pnl = current_cap * avg_win
-                else:
-                    pnl = -current_cap * avg_loss
-                
-                new_cap = current_cap + pnl
-                if new_cap <= 0:
-                    new_cap = 0
-                
-                equity.append(new_cap)
-                
-                # Track DD
-                if new_cap > peak:
-                    peak = new_cap
-                dd = (peak - new_cap) / peak if peak > 0 else 0
-                if dd > max_dd:
-                    max_dd = dd
-            
-            results.append(equity[-1])
-            max_drawdowns.append(max_dd)
-            if equity[-1] <= starting_capital * 0.5: # Definition of "ruin" can vary
-                ruin_count += 1
+        results = np.concatenate([part[0] for part in parts])
+        max_drawdowns = np.concatenate([part[1] for part in parts])
+        # Definition of "ruin" can vary
+        ruin_count = np.count_nonzero(results <= starting_capital * 0.5)
 
         stats = {
             'mean_final_equity': np.mean(results),
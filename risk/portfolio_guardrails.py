@@ -0,0 +1,173 @@
+﻿import numpy as np
+import pandas as pd
+
+DAY_NS = 86_400 * 1_000_000_000
+
+class PortfolioGuardrails:
+    """
+    Risk limits evaluated on equity/exposure arrays of many streams (symbols
+    or strategies) at once, so the cost of a check does not grow with a
+    Python loop over assets.
+
+    Limits:
+        - Per-stream drawdown from its own peak (halts that stream for good)
+        - Portfolio drawdown from the peak of the summed equity (halts all)
+        - Daily loss of the summed equity versus the first bar of the UTC day
+          (halts all until the next day)
+        - Gross (sum |exposure|) and net (|sum exposure|) exposure as a multiple
+          of portfolio equity (blocks new entries while at or above the cap)
+
+    evaluate() is the batch path over whole (bars, streams) matrices;
+    update() is the per-bar path for an event loop and gives the same answers.
+    """
+    def __init__(self, max_drawdown=0.20, symbol_max_drawdown=None, max_gross_exposure=None, max_net_exposure=None, daily_loss_limit=None):
+        """
+        Args:
+            max_drawdown (float): Portfolio drawdown limit (fraction). None disables it.
+            symbol_max_drawdown (float): Per-stream drawdown limit (fraction).
+            max_gross_exposure (float): Cap on sum |exposure| / portfolio equity.
+            max_net_exposure (float): Cap on |sum exposure| / portfolio equity.
+            daily_loss_limit (float): Largest intraday loss of portfolio equity (fraction).
+        """
+        self.max_drawdown = max_drawdown
+        self.symbol_max_drawdown = symbol_max_drawdown
+        self.max_gross_exposure = max_gross_exposure
+        self.max_net_exposure = max_net_exposure
+        self.daily_loss_limit = daily_loss_limit
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build from config['portfolio_risk'], or return None when the section is missing or disabled.
+        """
+        settings = dict(config.get('portfolio_risk') or {})
+        if not settings.pop('enabled', False):
+            return None
+        return cls(**settings)
+
+    def reset(self):
+        """
+        Clear the state of the per-bar path.
+        """
+        self._peaks = None
+        self._symbol_halted = None
+        self._portfolio_peak = -np.inf
+        self._portfolio_halted = False
+        self._day = None
+        self._day_open = None
+        self._day_halted = False
+
+    def _exposure_block(self, total, exposure):
+        """
+        True where new entries are blocked by the gross/net exposure caps.
+        """
+        block = np.zeros(np.shape(total), dtype=bool)
+        if exposure is None:
+            return block
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.max_gross_exposure is not None:
+                block |= np.abs(exposure).sum(axis=-1) / total >= self.max_gross_exposure
+            if self.max_net_exposure is not None:
+                block |= np.abs(exposure.sum(axis=-1)) / total >= self.max_net_exposure
+        return block
+
+    def evaluate(self, equity, exposure=None, timestamps=None):
+        """
+        Batch evaluation over all bars and streams.
+
+        Args:
+            equity (array or DataFrame): Equity per bar and stream, shape (bars, streams).
+                A DataFrame indexed by timestamp (e.g. RunStore.equity_matrix) also
+                provides the timestamps.
+            exposure (array): Signed position notional per bar and stream, same shape.
+            timestamps (array): Bar times; needed for the daily loss limit.
+
+        Returns:
+            dict: 'halt' (bars, streams) bool - flatten and skip signals,
+                'block_entries' (bars,) bool - no new positions,
+                plus the underlying series: 'symbol_drawdown', 'portfolio_drawdown',
+                'daily_loss', 'gross_exposure' and 'net_exposure'.
+        """
+        if isinstance(equity, pd.DataFrame):
+            if timestamps is None and isinstance(equity.index, pd.DatetimeIndex):
+                timestamps = equity.index
+            equity = equity.ffill().to_numpy(dtype=float)
+        equity = np.atleast_2d(np.asarray(equity, dtype=float))
+        if exposure is not None:
+            exposure = np.asarray(exposure, dtype=float).reshape(equity.shape)
+        n_bars, n_streams = equity.shape
+        total = equity.sum(axis=1)
+
+        # 1. Per-stream drawdown (sticky once breached)
+        symbol_drawdown = 1.0 - equity / np.maximum.accumulate(equity, axis=0)
+        halt = np.zeros((n_bars, n_streams), dtype=bool)
+        if self.symbol_max_drawdown is not None:
+            halt |= np.maximum.accumulate(symbol_drawdown > self.symbol_max_drawdown, axis=0)
+
+        # 2. Portfolio drawdown (sticky once breached)
+        portfolio_drawdown = 1.0 - total / np.maximum.accumulate(total)
+        if self.max_drawdown is not None:
+            halt |= np.maximum.accumulate(portfolio_drawdown > self.max_drawdown)[:, None]
+
+        # 3. Daily loss versus the first bar of each day (sticky within the day)
+        daily_loss = np.zeros(n_bars)
+        if timestamps is not None and n_bars:
+            day = pd.to_datetime(timestamps).to_numpy().astype('datetime64[ns]').astype(np.int64) // DAY_NS
+            day_id = np.concatenate(([0], np.cumsum(day[1:] != day[:-1])))
+            day_starts = np.concatenate(([0], np.flatnonzero(day[1:] != day[:-1]) + 1))
+            daily_loss = 1.0 - total / total[day_starts][day_id]
+            if self.daily_loss_limit is not None:
+                breached_day = np.maximum.accumulate(np.where(daily_loss > self.daily_loss_limit, day_id, -1))
+                halt |= (breached_day == day_id)[:, None]
+
+        # 4. Exposure caps
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gross = np.abs(exposure).sum(axis=1) / total if exposure is not None else np.zeros(n_bars)
+            net = exposure.sum(axis=1) / total if exposure is not None else np.zeros(n_bars)
+
+        return {
+            'halt': halt,
+            'block_entries': self._exposure_block(total, exposure),
+            'symbol_drawdown': symbol_drawdown,
+            'portfolio_drawdown': portfolio_drawdown,
+            'daily_loss': daily_loss,
+            'gross_exposure': gross,
+            'net_exposure': net
+        }
+
+    def update(self, equity, exposure=None, timestamp=None):
+        """
+        Per-bar evaluation for one row of equity/exposure (one value per stream).
+
+        Returns:
+            tuple: (halt, block_entries) - bool array per stream and a bool.
+        """
+        equity = np.asarray(equity, dtype=float)
+        total = equity.sum()
+        if self._peaks is None:
+            self._peaks = equity.copy()
+            self._symbol_halted = np.zeros(len(equity), dtype=bool)
+
+        # 1. Per-stream drawdown
+        np.maximum(self._peaks, equity, out=self._peaks)
+        if self.symbol_max_drawdown is not None:
+            self._symbol_halted |= 1.0 - equity / self._peaks > self.symbol_max_drawdown
+
+        # 2. Portfolio drawdown
+        self._portfolio_peak = max(self._portfolio_peak, total)
+        if self.max_drawdown is not None and 1.0 - total / self._portfolio_peak > self.max_drawdown:
+            self._portfolio_halted = True
+
+        # 3. Daily loss
+        if timestamp is not None:
+            day = pd.Timestamp(timestamp).value // DAY_NS
+            if day != self._day:
+                self._day, self._day_open, self._day_halted = day, total, False
+            if self.daily_loss_limit is not None and 1.0 - total / self._day_open > self.daily_loss_limit:
+                self._day_halted = True
+
+        halt = self._symbol_halted | (self._portfolio_halted or self._day_halted)
+        if exposure is not None:
+            exposure = np.asarray(exposure, dtype=float)
+        return halt, bool(self._exposure_block(total, exposure))
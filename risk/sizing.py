@@ -1,4 +1,5 @@
 ﻿import numpy as np
+from utils.rng import rng_service
 
 class PositionSizing:
     def __init__(self, target_volatility=0.20):
@@ -40,3 +41,161 @@ class PositionSizing:
         if win_loss_ratio <= 0:
             return 0.0
         return win_rate - (1 - win_rate) / win_loss_ratio
+
+    def kelly_fraction(self, trade_returns, tol=1e-10, max_iter=200, max_fraction=10.0):
+        """
+        Growth-optimal fraction for a sequence of trade returns: the f that
+        maximizes mean(log(1 + f * r)), found by bisection on its derivative.
+
+        Args:
+            trade_returns (array): Return of each trade on the notional traded
+                (see trade_returns()).
+            max_fraction (float): Upper bound on the result. Without a losing
+                trade the growth-optimal fraction is unbounded, so it is returned.
+
+        Returns:
+            float: Fraction of equity per trade (0 if no positive edge).
+        """
+        r = np.asarray(trade_returns, dtype=float)
+        if len(r) == 0 or r.mean() <= 0:
+            return 0.0
+        if r.min() >= 0:
+            return float(max_fraction)
+        # Stay below the fraction at which the worst trade wipes out the account
+        low, high = 0.0, min(-1.0 / r.min() * (1 - 1e-9), max_fraction)
+        if (r / (1 + high * r)).mean() > 0:
+            return high
+        for _ in range(max_iter):
+            mid = 0.5 * (low + high)
+            if (r / (1 + mid * r)).mean() > 0:
+                low = mid
+            else:
+                high = mid
+            if high - low < tol:
+                break
+        return low
+
+    def fraction_sweep(self, trade_returns, fractions=None, kelly_multipliers=None, n_bootstrap=0, ruin_level=0.5, seed=None, chunk_size=64, max_elements=2**22):
+        """
+        Evaluate many sizing fractions against the realized trades at once.
+
+        Every fraction f turns the trades into equity multipliers 1 + f * r; the
+        whole fraction x trade matrix is evaluated in log space (cumulative
+        growth, running peak, drawdown). With n_bootstrap > 0 the trades are
+        also resampled with replacement and each fraction is evaluated on every
+        resample. Resamples are drawn and evaluated in blocks of at most
+        `chunk_size` fractions x `max_elements` values, so memory does not grow
+        with n_bootstrap * len(trade_returns).
+
+        Args:
+            trade_returns (array): Return of each trade on the notional traded.
+            fractions (array): Fractions of equity per trade (default 0.01 .. 1.0).
+            kelly_multipliers (array): Fractional-Kelly multipliers (e.g. 0.25, 0.5, 1.0),
+                added as extra rows at multiplier * kelly_fraction().
+            n_bootstrap (int): Number of bootstrap resamples (0 = historical order only).
+            ruin_level (float): Equity (fraction of start) counted as ruin when touched.
+            chunk_size (int): Fractions evaluated at once.
+            max_elements (int): Largest fraction x resample x trade block evaluated at once.
+
+        Returns:
+            DataFrame: One row per fraction with 'fraction', 'kelly_multiplier',
+                'growth' (mean log growth per trade), 'terminal_multiple',
+                'max_drawdown', 'ruined' and, with bootstrap, 'growth_mean',
+                'growth_p05', 'terminal_median', 'max_drawdown_p95' and 'ruin_probability'.
+        """
+        import pandas as pd
+        r = np.asarray(trade_returns, dtype=float)
+        if fractions is None:
+            fractions = np.linspace(0.01, 1.0, 100)
+        fractions = np.asarray(fractions, dtype=float)
+        multipliers = np.full(len(fractions), np.nan)
+        if kelly_multipliers is not None:
+            kelly = self.kelly_fraction(r)
+            kelly_multipliers = np.asarray(kelly_multipliers, dtype=float)
+            fractions = np.concatenate([fractions, kelly_multipliers * kelly])
+            multipliers = np.concatenate([multipliers, kelly_multipliers])
+
+        sweep = pd.DataFrame({'fraction': fractions, 'kelly_multiplier': multipliers})
+        if len(r) == 0:
+            return sweep
+
+        # 1. Historical trade order
+        stats = _path_stats(fractions, r[None, :], ruin_level)
+        sweep['growth'] = stats['growth'][:, 0]
+        sweep['terminal_multiple'] = np.exp(stats['log_terminal'][:, 0])
+        sweep['max_drawdown'] = stats['max_drawdown'][:, 0]
+        sweep['ruined'] = stats['ruined'][:, 0]
+
+        # 2. Bootstrap resamples, chunked over resamples and fractions; only the
+        #    per-path statistics (fractions x resamples) are kept for the quantiles
+        if n_bootstrap > 0:
+            rng = rng_service.resolve('fraction_sweep', seed=seed)
+            paths = {name: np.empty((len(fractions), n_bootstrap)) for name in ['growth', 'log_terminal', 'max_drawdown', 'ruined']}
+            block = max(1, max_elements // (min(chunk_size, len(fractions)) * len(r)))
+            for first in range(0, n_bootstrap, block):
+                rows = slice(first, min(first + block, n_bootstrap))
+                samples = r[rng.integers(0, len(r), size=(rows.stop - rows.start, len(r)))]
+                for start in range(0, len(fractions), chunk_size):
+                    part = slice(start, start + chunk_size)
+                    for name, values in _path_stats(fractions[part], samples, ruin_level).items():
+                        paths[name][part, rows] = values
+            sweep['growth_mean'] = paths['growth'].mean(axis=1)
+            sweep['growth_p05'] = np.percentile(paths['growth'], 5, axis=1)
+            sweep['terminal_median'] = np.exp(np.median(paths['log_terminal'], axis=1))
+            sweep['max_drawdown_p95'] = np.percentile(paths['max_drawdown'], 95, axis=1)
+            sweep['ruin_probability'] = paths['ruined'].mean(axis=1)
+        return sweep
+
+    def select_fraction(self, sweep, max_drawdown=0.25, max_ruin_probability=0.01):
+        """
+        Pick the fraction with the highest growth within the risk limits
+        (bootstrap columns are used when present).
+
+        Returns:
+            float: The chosen fraction, or 0.0 if none qualifies.
+        """
+        bootstrap = 'growth_mean' in sweep.columns
+        growth = sweep['growth_mean'] if bootstrap else sweep['growth']
+        drawdown = sweep['max_drawdown_p95'] if bootstrap else sweep['max_drawdown']
+        ruin = sweep['ruin_probability'] if bootstrap else sweep['ruined'].astype(float)
+        allowed = (drawdown <= max_drawdown) & (ruin <= max_ruin_probability) & (growth > 0)
+        if not allowed.any():
+            return 0.0
+        return float(sweep['fraction'][growth.where(allowed).idxmax()])
+
+def _path_stats(fractions, returns, ruin_level):
+    """
+    Growth, drawdown and ruin of every (fraction, path) pair.
+
+    Args:
+        fractions (array): Shape (k,).
+        returns (array): Trade returns per path, shape (paths, trades).
+
+    Returns:
+        dict: Arrays of shape (k, paths).
+    """
+    factors = 1.0 + fractions[:, None, None] * returns[None, :, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_equity = np.cumsum(np.log(np.maximum(factors, 0.0)), axis=2)
+    peak = np.maximum(np.maximum.accumulate(log_equity, axis=2), 0.0)
+    min_log = log_equity.min(axis=2)
+    return {
+        'growth': log_equity[:, :, -1] / returns.shape[1],
+        'log_terminal': log_equity[:, :, -1],
+        'max_drawdown': 1.0 - np.exp((log_equity - peak).min(axis=2)),
+        'ruined': min_log <= np.log(ruin_level)
+    }
+
+def trade_returns(trades):
+    """
+    Return of each closed trade on the notional traded (net of fees).
+
+    Args:
+        trades (list or DataFrame): BacktestEngine.positions or the exit kernel's trades.
+    """
+    import pandas as pd
+    trades = pd.DataFrame(trades)
+    if trades.empty:
+        return np.empty(0)
+    notional = (trades['quantity'] * trades['entry_price']).abs().to_numpy(dtype=float)
+    return trades['pnl'].to_numpy(dtype=float) / notional
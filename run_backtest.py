@@ -1,11 +1,12 @@
 ﻿import pandas as pd
-import matplotlib.pyplot as plt
 import yaml
 from data.fetcher import DataFetcher
+from data.synthetic import SyntheticOHLCV
 from strategy.indicators import Indicators
 from strategy.regime import RegimeDetection
 from strategy.logic import StrategyLogic
 from analysis.backtest import BacktestEngine
+from analysis.profiler import profiler
 
 def load_config(path='config.yaml'):
     # Use utf-8-sig to handle BOM if present
@@ -33,18 +34,7 @@ def main():
     
     if df is None or df.empty:
         print("Failed to fetch data. Using mock data.")
-        dates = pd.date_range(start='2023-01-01', periods=limit, freq=timeframe)
-        df = pd.DataFrame({
-            'timestamp': dates,
-            'open': 100, 'high': 105, 'low': 95, 'close': 100, 'volume': 1000
-        })
-        import numpy as np
-        returns = np.random.normal(0, 0.01, limit)
-        price_path = 100 * np.cumprod(1 + returns)
-        df['close'] = price_path
-        df['open'] = price_path
-        df['high'] = price_path * 1.01
-        df['low'] = price_path * 0.99
+        df = SyntheticOHLCV(seed=42, timeframe=timeframe).generate(limit)
 
     print(f"Data points: {len(df)}")
 
@@ -91,14 +81,16 @@ def main():
 
     # 6. Visualize
     print("Generating plot...")
-    plt.figure(figsize=(12, 6))
-    plt.plot(results['timestamp'], results['equity'], label='Strategy Equity')
-    plt.title(f'Backtest Results: {symbol} {timeframe}')
-    plt.xlabel('Date')
-    plt.ylabel('Equity ($)')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig('backtest_result_config.png')
+    with profiler.stage('plotting'):
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(12, 6))
+        plt.plot(results['timestamp'], results['equity'], label='Strategy Equity')
+        plt.title(f'Backtest Results: {symbol} {timeframe}')
+        plt.xlabel('Date')
+        plt.ylabel('Equity ($)')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig('backtest_result_config.png')
     print("Plot saved to backtest_result_config.png")
 
 if __name__ == "__main__":
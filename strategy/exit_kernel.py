@@ -0,0 +1,363 @@
+﻿import numpy as np
+import pandas as pd
+from strategy.logic import StrategyLogic
+from analysis.profiler import profiler
+
+# Exit reasons in the trade arrays
+EXIT_STOP = 1
+EXIT_TARGET = 2
+EXIT_REVERSE = 3
+EXIT_END = 4
+EXIT_REASONS = {EXIT_STOP: 'stop', EXIT_TARGET: 'target', EXIT_REVERSE: 'reverse', EXIT_END: 'end'}
+
+_numba_kernel = None
+
+def entry_signals(df, config):
+    """
+    Vectorized entry rules of StrategyLogic.get_signal: 1 (long), -1 (short), 0.
+    """
+    inds = config['strategy']['indicators']
+    adx_threshold = inds.get('adx_threshold', 25)
+    trend = (df['regime'] == 'TREND').to_numpy()
+    adx = df['adx'].to_numpy() if 'adx' in df.columns else np.zeros(len(df))
+    strong = adx > adx_threshold
+    ma_short, ma_long, rsi = df['ma_short'].to_numpy(), df['ma_long'].to_numpy(), df['rsi'].to_numpy()
+
+    long_entry = trend & (ma_short > ma_long) & (rsi < inds['rsi_overbought']) & strong
+    short_entry = trend & (ma_short < ma_long) & (rsi > inds['rsi_oversold']) & strong
+    signals = np.where(long_entry, 1, np.where(short_entry, -1, 0)).astype(np.int8)
+
+    # Optional higher-timeframe trend filter (strategy.mtf.filter)
+    mtf = config['strategy'].get('mtf') or {}
+    if mtf.get('filter'):
+        column = f"{mtf['filter']}_trend"
+        trend_htf = df[column].to_numpy() if column in df.columns else np.zeros(len(df))
+        signals = np.where(trend_htf == signals, signals, 0).astype(np.int8)
+    return signals
+
+def _exit_loop(entries, open_, high, low, close, atr, sl_atr, tp_atr):
+    """
+    Reference loop over all bars. Compiled with numba when available.
+    """
+    n = len(close)
+    entry_idx = np.empty(n, dtype=np.int64)
+    exit_idx = np.empty(n, dtype=np.int64)
+    direction = np.empty(n, dtype=np.int8)
+    entry_price = np.empty(n, dtype=np.float64)
+    exit_price = np.empty(n, dtype=np.float64)
+    reason = np.empty(n, dtype=np.int8)
+
+    count = 0
+    pos = 0
+    entry_bar = 0
+    ep = 0.0
+    reached2 = False
+    reached4 = False
+    for i in range(n):
+        if pos == 0:
+            if entries[i] != 0:
+                pos = entries[i]
+                entry_bar = i
+                ep = close[i]
+                reached2 = False
+                reached4 = False
+            continue
+
+        a = atr[i]
+        hit = 0
+        price = 0.0
+        if pos > 0:
+            stop = ep - a * sl_atr
+            if reached2:
+                stop = max(stop, ep + a * 0.5)
+            if reached4:
+                stop = max(stop, ep + a * 2.0)
+            target = ep + a * tp_atr
+            if low[i] <= stop:
+                hit = EXIT_STOP
+                price = min(open_[i], stop)
+            elif high[i] >= target:
+                hit = EXIT_TARGET
+                price = max(open_[i], target)
+            elif entries[i] == -1:
+                hit = EXIT_REVERSE
+                price = close[i]
+            else:
+                excursion = (high[i] - ep) / a
+                reached2 = reached2 or excursion > 2.0
+                reached4 = reached4 or excursion > 4.0
+        else:
+            stop = ep + a * sl_atr
+            if reached2:
+                stop = min(stop, ep - a * 0.5)
+            if reached4:
+                stop = min(stop, ep - a * 2.0)
+            target = ep - a * tp_atr
+            if high[i] >= stop:
+                hit = EXIT_STOP
+                price = max(open_[i], stop)
+            elif low[i] <= target:
+                hit = EXIT_TARGET
+                price = min(open_[i], target)
+            elif entries[i] == 1:
+                hit = EXIT_REVERSE
+                price = close[i]
+            else:
+                excursion = (ep - low[i]) / a
+                reached2 = reached2 or excursion > 2.0
+                reached4 = reached4 or excursion > 4.0
+
+        if hit != 0:
+            entry_idx[count] = entry_bar
+            exit_idx[count] = i
+            direction[count] = pos
+            entry_price[count] = ep
+            exit_price[count] = price
+            reason[count] = hit
+            count += 1
+            if hit == EXIT_REVERSE:
+                pos = -pos
+                entry_bar = i
+                ep = close[i]
+                reached2 = False
+                reached4 = False
+            else:
+                pos = 0
+
+    if pos != 0:
+        entry_idx[count] = entry_bar
+        exit_idx[count] = n - 1
+        direction[count] = pos
+        entry_price[count] = ep
+        exit_price[count] = close[n - 1]
+        reason[count] = EXIT_END
+        count += 1
+    return entry_idx[:count], exit_idx[:count], direction[:count], entry_price[:count], exit_price[:count], reason[:count]
+
+def _find_exit(start, pos, ep, entries, open_, high, low, close, atr, sl_atr, tp_atr, chunk=256):
+    """
+    NumPy path: locate the exit of one position with vectorized scans over
+    growing windows. The ratchet flags are carried between windows.
+
+    Returns:
+        tuple: (exit bar, exit price, reason) or None if the data ends first.
+    """
+    n = len(close)
+    carry2 = carry4 = False
+    while start < n:
+        end = min(n, start + chunk)
+        a = atr[start:end]
+        if pos > 0:
+            excursion = (high[start:end] - ep) / a
+        else:
+            excursion = (ep - low[start:end]) / a
+
+        # Ratchet levels reached on earlier bars of the position (latched)
+        seen2 = np.logical_or.accumulate(excursion > 2.0)
+        seen4 = np.logical_or.accumulate(excursion > 4.0)
+        reached2 = np.concatenate(([carry2], seen2[:-1] | carry2))
+        reached4 = np.concatenate(([carry4], seen4[:-1] | carry4))
+
+        if pos > 0:
+            stop = ep - a * sl_atr
+            stop = np.where(reached2, np.maximum(stop, ep + a * 0.5), stop)
+            stop = np.where(reached4, np.maximum(stop, ep + a * 2.0), stop)
+            target = ep + a * tp_atr
+            stop_hit = low[start:end] <= stop
+            target_hit = high[start:end] >= target
+        else:
+            stop = ep + a * sl_atr
+            stop = np.where(reached2, np.minimum(stop, ep - a * 0.5), stop)
+            stop = np.where(reached4, np.minimum(stop, ep - a * 2.0), stop)
+            target = ep - a * tp_atr
+            stop_hit = high[start:end] >= stop
+            target_hit = low[start:end] <= target
+        reverse = entries[start:end] == -pos
+
+        any_exit = stop_hit | target_hit | reverse
+        if any_exit.any():
+            k = int(np.argmax(any_exit))
+            i = start + k
+            if stop_hit[k]:
+                price = min(open_[i], stop[k]) if pos > 0 else max(open_[i], stop[k])
+                return i, price, EXIT_STOP
+            if target_hit[k]:
+                price = max(open_[i], target[k]) if pos > 0 else min(open_[i], target[k])
+                return i, price, EXIT_TARGET
+            return i, close[i], EXIT_REVERSE
+
+        carry2 = carry2 or bool(seen2[-1])
+        carry4 = carry4 or bool(seen4[-1])
+        start = end
+        chunk *= 2
+    return None
+
+def _numpy_exits(entries, open_, high, low, close, atr, sl_atr, tp_atr):
+    n = len(close)
+    candidates = np.flatnonzero(entries)
+    rows = []
+    i = 0
+    pos = 0
+    while True:
+        if pos == 0:
+            # Next entry signal at or after bar i
+            k = np.searchsorted(candidates, i)
+            if k >= len(candidates):
+                break
+            i = int(candidates[k])
+            pos = int(entries[i])
+        ep = close[i]
+        found = _find_exit(i + 1, pos, ep, entries, open_, high, low, close, atr, sl_atr, tp_atr)
+        if found is None:
+            rows.append((i, n - 1, pos, ep, close[n - 1], EXIT_END))
+            break
+        exit_bar, price, hit = found
+        rows.append((i, exit_bar, pos, ep, price, hit))
+        i = exit_bar
+        if hit == EXIT_REVERSE:
+            pos = -pos
+        else:
+            pos = 0
+            i += 1
+
+    if not rows:
+        empty = np.empty(0)
+        return (empty.astype(np.int64), empty.astype(np.int64), empty.astype(np.int8),
+                empty, empty, empty.astype(np.int8))
+    arr = list(zip(*rows))
+    return (np.array(arr[0], dtype=np.int64), np.array(arr[1], dtype=np.int64), np.array(arr[2], dtype=np.int8),
+            np.array(arr[3], dtype=np.float64), np.array(arr[4], dtype=np.float64), np.array(arr[5], dtype=np.int8))
+
+def _get_numba_kernel():
+    global _numba_kernel
+    if _numba_kernel is None:
+        try:
+            import numba
+            _numba_kernel = numba.njit(cache=True, nogil=True)(_exit_loop)
+        except ImportError:
+            _numba_kernel = False
+    return _numba_kernel or None
+
+@profiler.timed('exit_kernel')
+def resolve_exits(df, config, entries=None, use_numba=None):
+    """
+    Resolve the stop / ratchet / target exits of every position.
+
+    Same rules as StrategyLogic.get_signal (fixed ATR stop, stop raised to
+    +0.5 ATR after a 2 ATR move and +2 ATR after 4 ATR, ATR take-profit,
+    reversal on an opposite entry signal) with two differences:
+      - touches are detected on the bar's high/low, filled at the level
+        (or at the open if the bar gaps through it); if both the stop and the
+        target are inside one bar, the stop is assumed to fill first.
+      - the ratchet is latched on the best excursion since entry.
+    One position is held at a time (no scaling into an open position).
+
+    Args:
+        entries (ndarray): Entry signals; computed with entry_signals() if None.
+        use_numba (bool): Force (True) or disable (False) the compiled loop;
+            None uses numba when it is installed, otherwise the NumPy path.
+
+    Returns:
+        dict of arrays: entry_idx, exit_idx, direction, entry_price, exit_price, reason.
+    """
+    risk = config['strategy']['risk']
+    if entries is None:
+        entries = entry_signals(df, config)
+    arrays = [np.ascontiguousarray(df[c].to_numpy(dtype=np.float64)) for c in ('open', 'high', 'low', 'close', 'atr')]
+    entries = np.ascontiguousarray(entries, dtype=np.int8)
+
+    kernel = _get_numba_kernel() if use_numba is not False else None
+    if use_numba and kernel is None:
+        raise ImportError("numba is not installed")
+    run = kernel or _numpy_exits
+    result = run(entries, *arrays, float(risk['stop_loss_atr']), float(risk['take_profit_atr']))
+
+    keys = ['entry_idx', 'exit_idx', 'direction', 'entry_price', 'exit_price', 'reason']
+    return dict(zip(keys, result))
+
+def run_kernel_backtest(df, config, initial_capital=10000.0, fee=0.001):
+    """
+    Full backtest on the exit kernel: trade arrays, sizing and equity curve.
+
+    Sizing uses StrategyLogic._calculate_size on the portfolio value at entry
+    (with the same EWMA volatility when sizing_method is volatility_target),
+    and fees are charged like BacktestEngine. The circuit breaker is not applied.
+
+    Returns:
+        tuple: (metrics dict, equity DataFrame, trades DataFrame)
+    """
+    exits = resolve_exits(df, config)
+    logic = StrategyLogic(config)
+    close = df['close'].to_numpy(dtype=np.float64)
+    atr = df['atr'].to_numpy(dtype=np.float64)
+    n = len(df)
+    volatility = np.full(n, np.nan)
+    if logic.sizing_method != 'fixed':
+        volatility = logic.volatility_series(close)
+
+    # 1. Sequential sizing over trades (one loop iteration per position)
+    count = len(exits['entry_idx'])
+    quantity = np.zeros(count)
+    pnl = np.zeros(count)
+    fees = np.zeros(count)
+    open_fees = np.zeros(count)
+    cash = initial_capital
+    for t in range(count):
+        e = exits['entry_idx'][t]
+        ep = exits['entry_price'][t]
+        # A reversal opens on the bar the previous trade closed; size on the value before that close
+        value = cash
+        if t > 0 and exits['reason'][t - 1] == EXIT_REVERSE and exits['exit_idx'][t - 1] == e:
+            value = cash + fees[t - 1]
+        size = logic._calculate_size(value, atr[e], None if np.isnan(volatility[e]) else volatility[e])
+        quantity[t] = exits['direction'][t] * size / ep
+        open_fees[t] = abs(quantity[t] * ep) * fee
+        cash -= open_fees[t]
+        gross = quantity[t] * (exits['exit_price'][t] - ep)
+        fees[t] = abs(quantity[t] * exits['exit_price'][t]) * fee
+        pnl[t] = gross - fees[t]
+        cash += pnl[t]
+
+    # 2. Equity curve: cash + open quantity marked to the close (vectorized)
+    cash_delta = np.zeros(n)
+    qty_delta = np.zeros(n)
+    basis_delta = np.zeros(n)
+    np.add.at(cash_delta, exits['entry_idx'], -open_fees)
+    np.add.at(cash_delta, exits['exit_idx'], pnl)
+    np.add.at(qty_delta, exits['entry_idx'], quantity)
+    np.add.at(qty_delta, exits['exit_idx'], -quantity)
+    np.add.at(basis_delta, exits['entry_idx'], quantity * exits['entry_price'])
+    np.add.at(basis_delta, exits['exit_idx'], -quantity * exits['entry_price'])
+    qty = np.cumsum(qty_delta)
+    basis = np.cumsum(basis_delta)
+    equity = initial_capital + np.cumsum(cash_delta) + qty * close - basis
+    equity_df = pd.DataFrame({'timestamp': df['timestamp'].to_numpy(), 'equity': equity})
+
+    timestamps = df['timestamp'].to_numpy()
+    trades = pd.DataFrame({
+        'entry_idx': exits['entry_idx'],
+        'exit_idx': exits['exit_idx'],
+        'entry_time': timestamps[exits['entry_idx']],
+        'exit_time': timestamps[exits['exit_idx']],
+        'entry_price': exits['entry_price'],
+        'exit_price': exits['exit_price'],
+        'quantity': quantity,
+        'pnl': pnl,
+        'fee': fees,
+        'reason': [EXIT_REASONS[r] for r in exits['reason']]
+    })
+
+    # 3. Metrics (same definitions as BacktestEngine.calculate_metrics)
+    if count == 0:
+        metrics = {'profit_factor': 0.0, 'win_rate': 0.0, 'total_trades': 0, 'max_drawdown': 0.0}
+    else:
+        gross_profit = pnl[pnl > 0].sum()
+        gross_loss = pnl[pnl <= 0].sum()
+        running_max = np.maximum.accumulate(equity)
+        metrics = {
+            'profit_factor': float(gross_profit / abs(gross_loss)) if gross_loss != 0 else float('inf'),
+            'win_rate': float((pnl > 0).sum() / count * 100),
+            'total_trades': count,
+            'max_drawdown': float(abs(((equity - running_max) / running_max).min()) * 100)
+        }
+    return metrics, equity_df, trades
@@ -1,15 +1,17 @@
 ﻿import numpy as np
 import pandas as pd
-from scipy.stats import norm
+from analysis.profiler import profiler
 
 class Indicators:
     @staticmethod
+    @profiler.timed('indicator.ma_crossover')
     def ma_crossover(df, short_window=50, long_window=200):
         df['ma_short'] = df['close'].rolling(window=short_window).mean()
         df['ma_long'] = df['close'].rolling(window=long_window).mean()
         return df
 
     @staticmethod
+    @profiler.timed('indicator.rsi')
     def rsi(df, window=14):
         delta = df['close'].diff()
         gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
@@ -19,6 +21,7 @@ class Indicators:
         return df
 
     @staticmethod
+    @profiler.timed('indicator.bollinger_bands')
     def bollinger_bands(df, window=20, num_std=2):
         df['bb_mid'] = df['close'].rolling(window=window).mean()
         df['bb_std'] = df['close'].rolling(window=window).std()
@@ -27,6 +30,7 @@ class Indicators:
         return df
 
     @staticmethod
+    @profiler.timed('indicator.atr')
     def atr(df, window=14):
         high_low = df['high'] - df['low']
         high_close = np.abs(df['high'] - df['close'].shift())
@@ -37,6 +41,7 @@ class Indicators:
         return df
 
     @staticmethod
+    @profiler.timed('indicator.adx')
     def adx(df, window=14):
         """
         Calculate Average Directional Index (ADX).
@@ -64,6 +69,7 @@ class Indicators:
         return df
 
     @staticmethod
+    @profiler.timed('indicator.garch_volatility')
     def garch_volatility(df):
         from arch import arch_model
         returns = 100 * df['close'].pct_change().dropna()
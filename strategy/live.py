@@ -0,0 +1,386 @@
+﻿import hashlib
+import json
+import math
+import os
+import sys
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from strategy.indicators import Indicators
+from strategy.regime import RegimeDetection
+from strategy.logic import StrategyLogic
+from strategy.mtf import MultiTimeframeFeatures
+from analysis.backtest import BacktestEngine
+from analysis.result_cache import normalize_params, _json_default
+from data.synthetic import TIMEFRAME_SECONDS
+
+# Bars after which the ADX's exponential weights (alpha = 1/14) fall below 1e-12
+EWM_TAIL = 400
+
+class LiveStrategy:
+    """
+    Incremental strategy state for a live or paper process, with checkpoints.
+
+    Only a bounded tail of bars is kept: the rolling indicators, regime and
+    higher-timeframe features of a new bar are computed on that tail with the
+    same code as the backtest pipeline. GARCH volatility is continued with the
+    recursion of the fitted parameters instead of being refitted. Position,
+    capital, peak equity and the circuit breaker live in a BacktestEngine,
+    which is stepped once per closed bar.
+
+    checkpoint() writes the tail (parquet) and everything else (JSON) to a
+    small directory; restore() plus catch_up() resumes from there with only
+    the bars missed while the process was down. Each checkpoint writes a new
+    tail file named in state.json, so replacing state.json commits both.
+    Closed trades are appended to trades.jsonl; state.json only records how
+    much of it is committed, so its size does not grow with the session.
+    """
+    def __init__(self, config, symbol, checkpoint_dir='data_storage/live', checkpoint_every=1, garch=True):
+        """
+        Args:
+            checkpoint_dir (str): Root directory; each symbol gets its own subdirectory.
+            checkpoint_every (int): Write a checkpoint after this many processed bars (0 = only on request).
+            garch (bool): Maintain the 'garch_vol' feature like the backtest pipeline.
+        """
+        self.config = config
+        self.symbol = symbol
+        self.timeframe = config['backtest']['timeframe']
+        self.checkpoint_every = checkpoint_every
+        self.use_garch = garch
+        self.path = os.path.join(checkpoint_dir, symbol.replace('/', '-'))
+        self.engine_params = {
+            'initial_capital': config['backtest']['initial_capital'],
+            'fee': config['backtest'].get('fee', 0.001),
+            'max_drawdown': config['strategy']['risk'].get('max_drawdown', 0.15)
+        }
+        self.engine = BacktestEngine(stop_on_halt=False, **self.engine_params)
+        self.logic = StrategyLogic(config)
+        self.mtf = MultiTimeframeFeatures.from_config(config)
+        self.lookback = self._lookback()
+        self.bars = None
+        self.garch = None
+        self.last_timestamp = None
+        self.bars_processed = 0
+        self._since_checkpoint = 0
+        # Closed trades already in trades.jsonl, and its committed size (None = not started)
+        self._trades_written = 0
+        self._trades_bytes = None
+
+    @staticmethod
+    def _settings(config):
+        settings = config.get('live', {})
+        return {'checkpoint_dir': settings.get('checkpoint_dir', 'data_storage/live'),
+                'checkpoint_every': settings.get('checkpoint_every', 1),
+                'garch': settings.get('garch', True)}
+
+    @classmethod
+    def from_config(cls, config, symbol, **kwargs):
+        """
+        Build with the 'live' section of config.yaml (keyword arguments override it).
+        """
+        return cls(config, symbol, **dict(cls._settings(config), **kwargs))
+
+    def _lookback(self):
+        """
+        Bars needed so the features of the newest bar equal those computed on the full history.
+        """
+        inds = self.config['strategy']['indicators']
+        needs = [inds['ma_short'], inds['ma_long'], inds['bb_window'], inds['rsi_period'] + 1,
+                 inds['atr_window'] + 50] # ATR z-score window of RegimeDetection
+        if self.mtf is not None:
+            for tf, settings in self.mtf.timeframes.items():
+                ratio = TIMEFRAME_SECONDS[tf] // TIMEFRAME_SECONDS[self.timeframe]
+                windows = [settings['ma_short'], settings['ma_long'], settings['rsi_period'] + 1, settings['atr_window'] + 1]
+                needs.append(ratio * (max(windows) + 1))
+        return max(needs) + EWM_TAIL
+
+    def config_hash(self):
+        """
+        Hash of the settings that a checkpoint depends on; a restore with other settings is refused.
+        """
+        params = normalize_params({'symbol': self.symbol, 'timeframe': self.timeframe,
+                                   'strategy': self.config['strategy'], 'engine': self.engine_params})
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _features(self, bars):
+        """
+        Indicator, regime and higher-timeframe columns (as in the backtest pipeline).
+        """
+        inds = self.config['strategy']['indicators']
+        df = bars.copy()
+        df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
+        df = Indicators.rsi(df, window=inds['rsi_period'])
+        df = Indicators.bollinger_bands(df, window=inds['bb_window'], num_std=inds['bb_std'])
+        df = Indicators.atr(df, window=inds['atr_window'])
+        df = Indicators.adx(df, window=14)
+        df = RegimeDetection(df).detect_regime()
+        if self.mtf is not None:
+            df = self.mtf.compute(df)
+        return df
+
+    def _fit_garch(self, history):
+        """
+        Fit GARCH(1,1) once on the history and keep what the recursion needs.
+        """
+        from arch import arch_model
+        returns = 100 * history['close'].pct_change().dropna()
+        res = arch_model(returns, vol='Garch', p=1, o=0, q=1, dist='Normal').fit(disp='off')
+        params = res.params
+        variance = float(res.conditional_volatility.iloc[-1]) ** 2
+        self.garch = {
+            'mu': float(params['mu']), 'omega': float(params['omega']),
+            'alpha': float(params['alpha[1]']), 'beta': float(params['beta[1]']),
+            'variance': variance, 'resid': float(returns.iloc[-1] - params['mu']),
+            'last_close': float(history['close'].iloc[-1])
+        }
+
+    def _garch_step(self, close):
+        """
+        sigma2_t = omega + alpha * eps_{t-1}^2 + beta * sigma2_{t-1}; returns sigma_t.
+        """
+        g = self.garch
+        g['variance'] = g['omega'] + g['alpha'] * g['resid'] ** 2 + g['beta'] * g['variance']
+        g['resid'] = 100 * (close / g['last_close'] - 1) - g['mu']
+        g['last_close'] = close
+        return math.sqrt(g['variance'])
+
+    def warm_up(self, history, now=None):
+        """
+        Cold start from OHLCV history: keep the tail and fit GARCH. No trades are replayed.
+
+        Args:
+            now (Timestamp): Current UTC time (default: the clock). The newest
+                history bar may still be forming; bars not closed by `now` are dropped,
+                so catch_up() processes them once they close.
+        """
+        step = pd.Timedelta(seconds=TIMEFRAME_SECONDS[self.timeframe])
+        now = pd.Timestamp.now(tz='UTC').tz_localize(None) if now is None else pd.Timestamp(now)
+        history = history[history['timestamp'] + step <= now]
+        if history.empty:
+            raise ValueError(f"No closed bars in the history of {self.symbol}")
+        history = history.sort_values('timestamp').reset_index(drop=True)
+        if self.use_garch:
+            try:
+                self._fit_garch(history)
+            except Exception as e:
+                print(f"GARCH fit failed ({e}); using the default garch_vol")
+                self.garch = None
+        # Volatility sizing continues from the history, as in a backtest over the same bars
+        if self.logic.sizing_method != 'fixed':
+            self.logic.warm_up_volatility(history['close'])
+        self.bars = history.iloc[-self.lookback:].reset_index(drop=True)
+        self.last_timestamp = self.bars['timestamp'].iloc[-1]
+        self.checkpoint()
+        return self
+
+    def on_bars(self, new_bars):
+        """
+        Process newly closed bars (older or already seen bars are ignored).
+
+        Returns:
+            list: One dict per bar where the position changed: timestamp, action
+                ('open', 'close', 'reverse', 'add'), quantity before and after, price.
+        """
+        if self.bars is None:
+            raise RuntimeError("LiveStrategy needs warm_up() or restore() first")
+        new_bars = new_bars[new_bars['timestamp'] > self.last_timestamp].sort_values('timestamp')
+        if new_bars.empty:
+            return []
+
+        # 1. Features of all new bars in one pass over tail + new bars
+        combined = pd.concat([self.bars, new_bars[self.bars.columns]], ignore_index=True)
+        rows = self._features(combined).iloc[-len(new_bars):]
+
+        # 2. Step the engine bar by bar
+        actions = []
+        for _, row in rows.iterrows():
+            if self.use_garch:
+                row['garch_vol'] = self._garch_step(row['close']) if self.garch is not None else 2.0
+            before = self.engine.current_position['quantity']
+            self.engine.step(row, self.logic.get_signal)
+            after = self.engine.current_position['quantity']
+            if after != before:
+                actions.append({'timestamp': row['timestamp'], 'action': _action(before, after),
+                                'quantity_before': before, 'quantity_after': after, 'price': row['close']})
+
+        # 3. Keep bounded state
+        self.bars = combined.iloc[-self.lookback:].reset_index(drop=True)
+        self.last_timestamp = self.bars['timestamp'].iloc[-1]
+        self.engine.equity_curve = self.engine.equity_curve[-self.lookback:]
+        self.bars_processed += len(rows)
+        self._since_checkpoint += len(rows)
+        if self.checkpoint_every and self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+        return actions
+
+    def catch_up(self, fetcher, now=None):
+        """
+        Fetch and process the bars closed since the last processed one.
+        """
+        step = pd.Timedelta(seconds=TIMEFRAME_SECONDS[self.timeframe])
+        now = pd.Timestamp.now(tz='UTC').tz_localize(None) if now is None else pd.Timestamp(now)
+        missed = int((now - self.last_timestamp) / step)
+        if missed < 1:
+            return []
+        df = fetcher.fetch_ohlcv(self.symbol, self.timeframe, missed + 2)
+        if df is None or df.empty:
+            return []
+        # A bar is closed once its full period has passed
+        return self.on_bars(df[df['timestamp'] + step <= now])
+
+    def state(self):
+        """
+        Everything except the bar tail, as JSON-serializable values.
+        """
+        engine = self.engine
+        logic_state = None
+        if self.logic._volatility is not None:
+            vol = self.logic._volatility
+            logic_state = {'sum': vol._sum.tolist(), 'weight': vol._weight.tolist(), 'count': vol.count,
+                           'last_prices': None if vol._last_prices is None else vol._last_prices.tolist()}
+        position = dict(engine.current_position)
+        if position.get('entry_time') is not None:
+            position['entry_time'] = str(position['entry_time'])
+        return {
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'config_hash': self.config_hash(),
+            'last_timestamp': str(self.last_timestamp),
+            'bars_processed': self.bars_processed,
+            'engine': {
+                'capital': engine.capital,
+                'peak_equity': engine.peak_equity,
+                'circuit_breaker': engine.guardrails.circuit_breaker_triggered,
+                'current_position': position,
+                'trades': {'count': self._trades_written, 'bytes': self._trades_bytes}
+            },
+            'logic': logic_state,
+            'garch': self.garch
+        }
+
+    def checkpoint(self):
+        """
+        Write the checkpoint atomically: the bar tail goes to a new file, and
+        replacing state.json (which names that file) is the single commit
+        point. A crash at any step leaves the previous tail/state pair intact.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        tail_name = f"tail-{uuid.uuid4().hex[:12]}.parquet"
+        state_path = os.path.join(self.path, 'state.json')
+        self._append_trades()
+        self.bars.to_parquet(os.path.join(self.path, tail_name), index=False)
+        with open(state_path + '.tmp', 'w') as file:
+            json.dump(dict(self.state(), tail=tail_name), file, default=_json_default)
+        os.replace(state_path + '.tmp', state_path)
+
+        # Tails of earlier checkpoints (and of writes that never committed) are no longer referenced
+        for name in os.listdir(self.path):
+            if name.startswith('tail') and name.endswith('.parquet') and name != tail_name:
+                os.remove(os.path.join(self.path, name))
+        self._since_checkpoint = 0
+        return state_path
+
+    def _append_trades(self):
+        """
+        Append the trades closed since the last checkpoint to trades.jsonl (a cold start begins a new file).
+        """
+        trades_path = os.path.join(self.path, 'trades.jsonl')
+        with open(trades_path, 'w' if self._trades_bytes is None else 'a') as file:
+            for trade in self.engine.positions[self._trades_written:]:
+                record = {k: str(v) if k.endswith('_time') else v for k, v in trade.items()}
+                file.write(json.dumps(record, default=_json_default) + '\n')
+            self._trades_bytes = file.tell()
+        self._trades_written = len(self.engine.positions)
+
+    @classmethod
+    def restore(cls, config, symbol, **kwargs):
+        """
+        Rebuild from the last checkpoint of `symbol` (settings as in from_config).
+
+        Returns:
+            LiveStrategy: The restored instance, or None if there is no usable
+                checkpoint (missing, other settings, or a torn write).
+        """
+        live = cls.from_config(config, symbol, **kwargs)
+        state_path = os.path.join(live.path, 'state.json')
+        if not os.path.exists(state_path):
+            return None
+        try:
+            with open(state_path) as file:
+                state = json.load(file)
+            bars = pd.read_parquet(os.path.join(live.path, state['tail']))
+        except Exception as e:
+            print(f"Checkpoint for {symbol} is unreadable: {e}")
+            return None
+        if state['config_hash'] != live.config_hash():
+            print(f"Checkpoint for {symbol} was written with other settings; ignoring it.")
+            return None
+        trades_path = os.path.join(live.path, 'trades.jsonl')
+        committed = state['engine']['trades']['bytes'] or 0
+        trades_size = os.path.getsize(trades_path) if os.path.exists(trades_path) else 0
+        if str(bars['timestamp'].iloc[-1]) != state['last_timestamp'] or trades_size < committed:
+            print(f"Checkpoint for {symbol} is inconsistent; ignoring it.")
+            return None
+
+        live.bars = bars
+        live.last_timestamp = bars['timestamp'].iloc[-1]
+        live.bars_processed = state['bars_processed']
+        live.garch = state['garch']
+
+        engine = live.engine
+        engine.capital = state['engine']['capital']
+        engine.peak_equity = state['engine']['peak_equity']
+        engine.guardrails.circuit_breaker_triggered = state['engine']['circuit_breaker']
+        position = state['engine']['current_position']
+        if position.get('entry_time') is not None:
+            position['entry_time'] = pd.Timestamp(position['entry_time'])
+        engine.current_position = position
+
+        # Closed trades: the committed part of trades.jsonl (lines of a torn checkpoint are cut off)
+        engine.positions = []
+        if committed:
+            with open(trades_path, 'r+') as file:
+                file.truncate(committed)
+                lines = file.read().splitlines()
+            engine.positions = [{k: pd.Timestamp(v) if k.endswith('_time') and v != 'None' else v for k, v in json.loads(line).items()}
+                                for line in lines]
+        live._trades_written = state['engine']['trades']['count']
+        live._trades_bytes = committed
+
+        if state['logic'] is not None:
+            vol = live.logic.new_volatility()
+            vol._sum = np.array(state['logic']['sum'])
+            vol._weight = np.array(state['logic']['weight'])
+            vol.count = state['logic']['count']
+            vol._last_prices = None if state['logic']['last_prices'] is None else np.array(state['logic']['last_prices'])
+            live.logic._volatility = vol
+        return live
+
+def _action(before, after):
+    if before == 0:
+        return 'open'
+    if after == 0:
+        return 'close'
+    if np.sign(before) != np.sign(after):
+        return 'reverse'
+    return 'add'
+
+if __name__ == "__main__":
+    # Usage: python -m strategy.live <symbol> - resume (or cold start) and process the missed bars
+    from main import load_config
+    from data.fetcher import DataFetcher
+    config = load_config()
+    symbol = sys.argv[1] if len(sys.argv) > 1 else config['backtest']['symbols'][0]
+    fetcher = DataFetcher(source=config['backtest'].get('source', 'yahoo'))
+
+    t0 = time.perf_counter()
+    live = LiveStrategy.restore(config, symbol)
+    if live is None:
+        print(f"No checkpoint for {symbol}; cold start from {config['backtest']['limit']} bars...")
+        history = fetcher.fetch_ohlcv(symbol, config['backtest']['timeframe'], config['backtest']['limit'])
+        live = LiveStrategy.from_config(config, symbol).warm_up(history)
+    actions = live.catch_up(fetcher)
+    print(f"{symbol}: resumed at {live.last_timestamp} in {time.perf_counter() - t0:.2f}s, {len(actions)} position changes")
+    for action in actions:
+        print(f"  {action['timestamp']} {action['action']:<8} {action['quantity_before']:.6f} -> {action['quantity_after']:.6f} @ {action['price']:.2f}")
@@ -1,6 +1,69 @@
-﻿class StrategyLogic:
+﻿import copy
+import numpy as np
+from risk.sizing import PositionSizing
+from risk.covariance import EWMACovariance, periods_per_year, ewma_volatility, MIN_PERIODS
+
+class StrategyLogic:
     def __init__(self, config):
         self.params = config
+        # Optional higher-timeframe trend filter, e.g. strategy.mtf.filter: "4h"
+        mtf = config['strategy'].get('mtf') or {}
+        self.trend_column = f"{mtf['filter']}_trend" if mtf.get('filter') else None
+
+        # Position sizing: "fixed" (position_fraction of equity) or "volatility_target" (EWMA volatility of the close)
+        risk = config['strategy']['risk']
+        self.position_fraction = risk.get('position_fraction', 0.1)
+        self.sizing_method = risk.get('sizing_method', 'fixed')
+        if self.sizing_method not in ('fixed', 'volatility_target'):
+            raise ValueError(f"Unknown sizing method: {self.sizing_method}")
+        self.ewma_lambda = risk.get('ewma_lambda', 0.94)
+        self.periods_per_year = periods_per_year(config['backtest']['timeframe'])
+        self.sizer = PositionSizing(config['strategy'].get('target_volatility', 0.20))
+        self._volatility = None
+
+    def reset(self):
+        """
+        Clear the per-run state (the EWMA volatility estimator). BacktestEngine.run
+        and MultiStrategyEngine.run call it before the first bar.
+        """
+        self._volatility = None
+
+    def for_run(self):
+        """
+        A copy with its own per-run state, for engines that step the same
+        instance side by side (MultiStrategyEngine.add, PortfolioBacktest.add).
+        """
+        logic = copy.copy(self)
+        logic.reset()
+        return logic
+
+    def new_volatility(self):
+        return EWMACovariance(['close'], lam=self.ewma_lambda, periods_per_year=self.periods_per_year)
+
+    def warm_up_volatility(self, close):
+        """
+        Start the EWMA estimator from a close history, in the state the per-bar
+        updates over those bars would leave it (live warm-up).
+        """
+        self._volatility = self.new_volatility().update_prices_batch(np.asarray(close, dtype=float)[:, None])
+
+    def _update_volatility(self, row):
+        """
+        Feed this bar's close to the EWMA estimator and return the annualized
+        volatility (None until warmed up).
+        """
+        if self._volatility is None:
+            self._volatility = self.new_volatility()
+        self._volatility.update_prices([row['close']])
+        return self._volatility.volatility()[0] if self._volatility.ready else None
+
+    def volatility_series(self, close):
+        """
+        Batch equivalent of the per-bar estimate for a whole close series (NaN while warming up).
+        """
+        volatility = ewma_volatility(close, self.ewma_lambda, self.periods_per_year)
+        volatility[:MIN_PERIODS] = np.nan
+        return volatility
 
     def get_signal(self, row, capital, current_position):
         """
@@ -9,6 +72,7 @@
             size (float): Position size in Quote Currency (e.g. USDT)
         """
         signal = 0
+        volatility = self._update_volatility(row) if self.sizing_method != 'fixed' else None
         
         # Entry Logic
         adx_threshold = self.params['strategy']['indicators'].get('adx_threshold', 25)
@@ -25,6 +89,10 @@
                     if current_adx > adx_threshold:
                         signal = -1
 
+        # Higher-timeframe confirmation: entries only in the direction of the HTF trend
+        if signal != 0 and self.trend_column is not None and row.get(self.trend_column, 0) != signal:
+            signal = 0
+
         # Exit Logic (Trailing Stop & Fixed SL/TP)
         if current_position['quantity'] != 0:
             entry_price = current_position['entry_price']
@@ -75,7 +143,7 @@
                     return 2, 0 # Close Long (TP)
                 
                 if signal == -1:
-                    return -1, self._calculate_size(capital, atr)
+                    return -1, self._calculate_size(capital, atr, volatility)
 
             # Short Position Exits
             elif current_position['quantity'] < 0:
@@ -97,14 +165,16 @@
                     return -2, 0 # Close Short (TP)
 
                 if signal == 1:
-                    return 1, self._calculate_size(capital, atr)
+                    return 1, self._calculate_size(capital, atr, volatility)
 
         # Calculate Size for New Entry
         size = 0
         if signal in [1, -1]:
-            size = self._calculate_size(capital, row['atr'])
+            size = self._calculate_size(capital, row['atr'], volatility)
 
         return signal, size
 
-    def _calculate_size(self, capital, atr):
-        return capital * 0.1 # Invest 10% of equity per trade
+    def _calculate_size(self, capital, atr, volatility=None):
+        if self.sizing_method == 'volatility_target' and volatility is not None and volatility > 0:
+            return self.sizer.calculate_volatility_target_size(capital, volatility)
+        return capital * self.position_fraction # Fixed fraction of equity per trade (also while the volatility estimate warms up)
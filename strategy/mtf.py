@@ -0,0 +1,134 @@
+﻿import numpy as np
+import pandas as pd
+from strategy.indicators import Indicators
+from data.resample import resample_ohlcv, IncrementalResampler
+from data.synthetic import TIMEFRAME_SECONDS
+from analysis.profiler import profiler
+
+DEFAULT_FEATURES = {'ma_short': 20, 'ma_long': 50, 'rsi_period': 14, 'atr_window': 14}
+
+class MultiTimeframeFeatures:
+    """
+    Higher-timeframe indicators aligned to the base bars.
+
+    For each higher timeframe the base bars are resampled, indicators are
+    computed once on the resampled bars and the values are joined back onto
+    the base index. A higher-timeframe bar only becomes visible on the base
+    bar that completes it, so a base row never sees a bar that is still
+    forming (no look-ahead).
+
+    Columns added per timeframe `tf`: {tf}_ma_short, {tf}_ma_long, {tf}_rsi,
+    {tf}_atr and {tf}_trend (+1 when ma_short > ma_long, -1 below, 0 unknown).
+
+    Only rolling-window indicators are used, so the incremental path in
+    update() recomputes just the last window of higher-timeframe bars and
+    matches compute() exactly.
+    """
+    def __init__(self, base_timeframe, timeframes):
+        """
+        Args:
+            base_timeframe (str): Resolution of the backtest bars, e.g. '1h'.
+            timeframes (dict): {'4h': {'ma_short': 20, 'ma_long': 50, ...}, ...}.
+                Missing settings fall back to DEFAULT_FEATURES.
+        """
+        self.base_timeframe = base_timeframe
+        self.timeframes = {}
+        for tf, settings in timeframes.items():
+            if TIMEFRAME_SECONDS.get(tf, 0) <= TIMEFRAME_SECONDS[base_timeframe]:
+                raise ValueError(f"{tf} is not a higher timeframe than {base_timeframe}")
+            self.timeframes[tf] = dict(DEFAULT_FEATURES, **(settings or {}))
+        self._resamplers = {}
+        self._latest = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build from config['strategy']['mtf'], or return None when no timeframes are set.
+        """
+        settings = config['strategy'].get('mtf') or {}
+        if not settings.get('timeframes'):
+            return None
+        return cls(config['backtest']['timeframe'], settings['timeframes'])
+
+    def columns(self, tf):
+        return [f"{tf}_{name}" for name in ('ma_short', 'ma_long', 'rsi', 'atr', 'trend')]
+
+    def _features(self, bars, tf):
+        """
+        Indicators on higher-timeframe bars, keyed by the time they become available.
+        """
+        settings = self.timeframes[tf]
+        bars = bars.copy()
+        bars = Indicators.ma_crossover(bars, short_window=settings['ma_short'], long_window=settings['ma_long'])
+        bars = Indicators.rsi(bars, window=settings['rsi_period'])
+        bars = Indicators.atr(bars, window=settings['atr_window'])
+        trend = np.sign(bars['ma_short'] - bars['ma_long']).fillna(0).astype(int)
+
+        # Visible from the start of the last base bar in the bucket, i.e. once that bar closes
+        available = bars['timestamp'] + pd.Timedelta(seconds=TIMEFRAME_SECONDS[tf] - TIMEFRAME_SECONDS[self.base_timeframe])
+        return pd.DataFrame({
+            'available': available.astype('datetime64[ns]'),
+            f"{tf}_ma_short": bars['ma_short'].to_numpy(),
+            f"{tf}_ma_long": bars['ma_long'].to_numpy(),
+            f"{tf}_rsi": bars['rsi'].to_numpy(),
+            f"{tf}_atr": bars['atr'].to_numpy(),
+            f"{tf}_trend": trend.to_numpy()
+        })
+
+    @profiler.timed('mtf_features')
+    def compute(self, df):
+        """
+        Batch path: add the higher-timeframe columns to `df` (a copy is returned).
+        """
+        df = df.copy()
+        timestamps = pd.DataFrame({'timestamp': df['timestamp'].astype('datetime64[ns]')})
+        for tf in self.timeframes:
+            bars = resample_ohlcv(df, tf, base_timeframe=self.base_timeframe, drop_incomplete=True)
+            if bars.empty:
+                for column in self.columns(tf):
+                    df[column] = 0 if column.endswith('_trend') else np.nan
+                continue
+            features = self._features(bars, tf)
+            aligned = pd.merge_asof(timestamps, features, left_on='timestamp', right_on='available', direction='backward')
+            for column in self.columns(tf):
+                values = aligned[column].to_numpy()
+                df[column] = np.nan_to_num(values, nan=0).astype(int) if column.endswith('_trend') else values
+        return df
+
+    def update(self, new_bars):
+        """
+        Incremental path for live or streaming use: feed newly closed base bars.
+
+        Higher-timeframe indicators are recomputed only when a higher-timeframe
+        bar completes, and only over the last window of bars.
+
+        Returns:
+            DataFrame: One row per new base bar with the higher-timeframe columns.
+        """
+        rows = pd.DataFrame({'timestamp': new_bars['timestamp'].astype('datetime64[ns]').to_numpy()})
+        for tf, settings in self.timeframes.items():
+            resampler = self._resamplers.get(tf)
+            if resampler is None:
+                resampler = IncrementalResampler(tf, self.base_timeframe)
+                self._resamplers[tf] = resampler
+
+            # 1. Features for the higher-timeframe bars completed by these base bars
+            completed = resampler.update(new_bars)
+            table = self._latest.get(tf)
+            if not completed.empty:
+                lookback = max(settings['ma_short'], settings['ma_long'], settings['rsi_period'] + 1, settings['atr_window'] + 1)
+                tail = resampler.bars.iloc[-(lookback + len(completed)):]
+                fresh = self._features(tail, tf).iloc[-len(completed):]
+                table = fresh if table is None else pd.concat([table, fresh], ignore_index=True)
+
+            # 2. Align onto the new base bars (the last known bar carries over between updates)
+            if table is None:
+                for column in self.columns(tf):
+                    rows[column] = 0 if column.endswith('_trend') else np.nan
+                continue
+            aligned = pd.merge_asof(rows[['timestamp']], table, left_on='timestamp', right_on='available', direction='backward')
+            for column in self.columns(tf):
+                values = aligned[column].to_numpy()
+                rows[column] = np.nan_to_num(values, nan=0).astype(int) if column.endswith('_trend') else values
+            self._latest[tf] = table.iloc[-1:].reset_index(drop=True)
+        return rows
@@ -1,31 +1,99 @@
 ﻿import pandas as pd
 import numpy as np
+from analysis.profiler import profiler
+
+# Regime codes (int8) and their labels
+MEAN_REVERSION = 0
+TREND = 1
+REGIME_LABELS = ['MEAN_REVERSION', 'TREND']
 
 class RegimeDetection:
-    def __init__(self, df):
+    def __init__(self, df, zscore_window=50):
         self.df = df
+        self.zscore_window = zscore_window
+        self._zscore = None
 
-    def detect_regime(self, volatility_threshold=1.5):
+    def atr_zscore(self):
+        """
+        Rolling Z-score of ATR (relative volatility). Computed once per instance
+        and reused by every threshold evaluation.
+        """
+        if self._zscore is None:
+            # Ensure volatility metrics exist
+            if 'atr' not in self.df.columns:
+                raise ValueError("ATR must be calculated first.")
+            rolling = self.df['atr'].rolling(window=self.zscore_window)
+            self._zscore = ((self.df['atr'] - rolling.mean()) / rolling.std()).to_numpy()
+        return self._zscore
+
+    @profiler.timed('regime')
+    def detect_regime(self, volatility_threshold=1.5, hurst_threshold=None):
         """
         Detect Market Regime: Trend vs Mean Reversion.
         Logic:
         - High Volatility -> Trend (or Breakout)
         - Low Volatility -> Mean Reversion (Range)
-        
-        This is a simplified logic. Can be enhanced with ADX or Hurst Exponent.
-        """
-        # Ensure volatility metrics exist
-        if 'atr' not in self.df.columns:
-            raise ValueError("ATR must be calculated first.")
+        - Optionally, TREND also requires a rolling Hurst exponent above
+          `hurst_threshold` (persistent price moves).
 
-        # Calculate a rolling Z-score of ATR to determine relative volatility
-        self.df['atr_zscore'] = (self.df['atr'] - self.df['atr'].rolling(window=50).mean()) / self.df['atr'].rolling(window=50).std()
+        Adds 'atr_zscore', 'regime_code' (int8) and 'regime' (categorical label).
+        """
+        zscore = self.atr_zscore()
+        self.df['atr_zscore'] = zscore
 
         # Define Regime: 1 for Trend, 0 for Mean Reversion
-        self.df['regime'] = np.where(self.df['atr_zscore'] > volatility_threshold, 'TREND', 'MEAN_REVERSION')
-        
+        codes = (zscore > volatility_threshold)
+        if hurst_threshold is not None:
+            codes &= self.hurst() > hurst_threshold
+        codes = codes.astype(np.int8)
+
+        self.df['regime_code'] = codes
+        self.df['regime'] = pd.Categorical.from_codes(codes, categories=REGIME_LABELS)
         return self.df
 
+    def regime_matrix(self, volatility_thresholds):
+        """
+        Evaluate many volatility thresholds in one call (for threshold sweeps).
+
+        Returns:
+            ndarray: int8 matrix of shape (bars, thresholds); 1 = TREND.
+        """
+        thresholds = np.asarray(volatility_thresholds, dtype=float)
+        zscore = self.atr_zscore()
+        return (zscore[:, None] > thresholds[None, :]).astype(np.int8)
+
+    def hurst(self, window=100, lags=(1, 2, 4, 8, 16)):
+        """
+        Rolling Hurst exponent from the scaling of lagged log-price differences:
+        Var(p[t] - p[t-k]) ~ k^(2H). The slope of log(std) on log(k) is fitted
+        per bar in closed form, with one rolling variance per lag.
+
+        H > 0.5: trending, H < 0.5: mean-reverting, H ~ 0.5: random walk.
+        """
+        log_price = np.log(self.df['close'])
+        x = np.log(np.asarray(lags, dtype=float))
+        weights = (x - x.mean()) / ((x - x.mean()) ** 2).sum()
+
+        hurst = np.zeros(len(self.df))
+        for lag, weight in zip(lags, weights):
+            variance = log_price.diff(lag).rolling(window=window).var().to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                hurst += weight * 0.5 * np.log(variance)
+        self.df['hurst'] = hurst
+        return hurst
+
+    def variance_ratio(self, q=4, window=100):
+        """
+        Rolling Lo-MacKinlay variance ratio VR(q) = Var(q-bar returns) / (q * Var(1-bar returns)).
+        VR > 1: trending, VR < 1: mean-reverting.
+        """
+        log_price = np.log(self.df['close'])
+        var_1 = log_price.diff().rolling(window=window).var()
+        var_q = log_price.diff(q).rolling(window=window).var()
+        ratio = (var_q / (q * var_1)).to_numpy()
+        self.df['variance_ratio'] = ratio
+        return ratio
+
     def get_signal(self):
         """
         Generate signal based on current regime.
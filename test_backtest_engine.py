@@ -0,0 +1,89 @@
+﻿import yaml
+from data.synthetic import SyntheticOHLCV
+from strategy.indicators import Indicators
+from strategy.regime import RegimeDetection
+from strategy.logic import StrategyLogic
+import copy
+from analysis.backtest import BacktestEngine, MultiStrategyEngine, equity_floor, max_trades
+
+def load_config(path='config.yaml'):
+    with open(path, 'r', encoding='utf-8-sig') as file:
+        return yaml.safe_load(file)
+
+def prepare_data(config, seed=0, n_bars=6000):
+    inds = config['strategy']['indicators']
+    df = SyntheticOHLCV(seed=seed, annual_vol=1.5).generate(n_bars)
+    df = Indicators.ma_crossover(df, short_window=inds['ma_short'], long_window=inds['ma_long'])
+    df = Indicators.rsi(df, window=inds['rsi_period'])
+    df = Indicators.atr(df, window=inds['atr_window'])
+    df = Indicators.adx(df, window=14)
+    return RegimeDetection(df).detect_regime()
+
+def run_engine(config, df, **kwargs):
+    engine = BacktestEngine(initial_capital=10000, fee=0.001, **kwargs)
+    logic = StrategyLogic(config)
+    results = engine.run(df, logic.get_signal)
+    return engine, results
+
+def test_stop_on_halt_matches_full_loop():
+    print("Testing early termination at the circuit breaker...")
+    config = load_config()
+    config['strategy']['risk']['stop_loss_atr'] = 1.0
+    df = prepare_data(config)
+
+    full_engine, full = run_engine(config, df, max_drawdown=0.05, stop_on_halt=False)
+    fast_engine, fast = run_engine(config, df, max_drawdown=0.05, stop_on_halt=True)
+
+    assert fast_engine.stop_reason == 'circuit_breaker'
+    assert len(fast) == len(df)
+    assert fast.equals(full)
+    assert fast_engine.calculate_metrics() == full_engine.calculate_metrics()
+    print(f"SUCCESS: Halted at {fast_engine.stopped_at}, equity curve identical.")
+
+def test_stop_conditions():
+    print("Testing stop-condition callbacks...")
+    config = load_config()
+    df = prepare_data(config, seed=1)
+
+    engine, results = run_engine(config, df, max_drawdown=0.99, stop_conditions=[max_trades(3)])
+    assert engine.stop_reason == 'stop_condition'
+    assert len(engine.positions) == 3
+    assert len(results) == len(df)
+    assert results['equity'].iloc[-1] == engine.capital
+
+    engine, results = run_engine(config, df, max_drawdown=0.99, stop_conditions=[equity_floor(20000)])
+    assert engine.stop_reason == 'stop_condition'
+    assert (results['equity'] == 10000).all()
+    print("SUCCESS: Runs stop on max trades and equity floor.")
+
+def test_multi_strategy_matches_separate_runs():
+    print("Testing multi-strategy single pass...")
+    config = load_config()
+    df = prepare_data(config, seed=2)
+
+    variants = {}
+    for name, sl_atr, adx in [('verified', 3.06, 32), ('relaxed', 2.0, 20), ('tight', 1.0, 25)]:
+        variant = copy.deepcopy(config)
+        variant['strategy']['risk']['stop_loss_atr'] = sl_atr
+        variant['strategy']['indicators']['adx_threshold'] = adx
+        variants[name] = variant
+
+    multi = MultiStrategyEngine(initial_capital=10000, fee=0.001, max_drawdown=0.10)
+    for name, variant in variants.items():
+        multi.add(name, StrategyLogic(variant))
+    multi.add('floored', StrategyLogic(config), max_drawdown=0.99, stop_conditions=[max_trades(5)])
+    results = multi.run(df)
+    metrics = multi.calculate_metrics()
+
+    for name, variant in variants.items():
+        engine, expected = run_engine(variant, df, max_drawdown=0.10)
+        assert results[name].equals(expected), name
+        assert metrics[name] == engine.calculate_metrics(), name
+    assert multi.engines['floored'].stop_reason == 'stop_condition'
+    assert len(results['floored']) == len(df)
+    print(f"SUCCESS: {len(results)} strategies in one pass match separate runs.")
+
+if __name__ == "__main__":
+    test_stop_on_halt_matches_full_loop()
+    test_stop_conditions()
+    test_multi_strategy_matches_separate_runs()
@@ -0,0 +1,80 @@
+﻿import tempfile
+import time
+import numpy as np
+from data.synthetic import SyntheticOHLCV
+from analysis.bootstrap import BlockBootstrap, resample_indices, bar_metrics
+from analysis.result_cache import ResultCache
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+def test_resample_indices():
+    print("Testing block resampling indices...")
+    rng = np.random.default_rng(0)
+    idx = resample_indices(500, 400, 25, rng)
+    assert idx.shape == (400, 500) and idx.min() >= 0 and idx.max() < 500
+    # Consecutive indices inside blocks: breaks occur with probability 1 / block_length
+    breaks = np.mean(np.diff(idx, axis=1) % 500 != 1)
+    assert abs(breaks - 1 / 25) < 0.005
+
+    idx = resample_indices(100, 3, 10, rng, method='circular')
+    assert (np.diff(idx, axis=1)[:, [i for i in range(99) if (i + 1) % 10]] % 100 == 1).all()
+    print(f"SUCCESS: Block breaks at rate {breaks:.3f}.")
+
+def test_bar_metrics():
+    print("Testing vectorized bar metrics...")
+    returns = np.array([[0.1, -0.5, 0.2, 0.3]])
+    equity = np.cumprod(np.concatenate([[1.0], 1 + returns[0]]))
+    metrics = bar_metrics(returns, periods_per_year=1)
+    assert np.isclose(metrics['total_return'][0], (equity[-1] - 1) * 100)
+    assert np.isclose(metrics['max_drawdown'][0], 50.0)
+    assert np.isclose(metrics['sharpe'][0], returns.mean() / returns.std())
+    print("SUCCESS: Sharpe, drawdown and return.")
+
+def test_intervals_reproducible():
+    print("Testing bootstrap confidence intervals...")
+    config = load_config()
+    engine, results = run_engine(config, prepare_data(config, seed=3, n_bars=18000), max_drawdown=0.99)
+    metrics = engine.calculate_metrics()
+
+    bootstrap = BlockBootstrap(num_resamples=2000, seed=11, chunk_size=300, max_workers=1)
+    t0 = time.perf_counter()
+    intervals = bootstrap.run(results, engine.positions)
+    elapsed = time.perf_counter() - t0
+    again = BlockBootstrap(num_resamples=2000, seed=11, chunk_size=300, max_workers=4).run(results, engine.positions)
+
+    assert intervals.equals(again)
+    assert set(intervals.index) == {'sharpe', 'max_drawdown', 'total_return', 'profit_factor', 'win_rate'}
+    assert np.isclose(intervals.loc['profit_factor', 'estimate'], metrics['profit_factor'])
+    assert np.isclose(intervals.loc['win_rate', 'estimate'], metrics['win_rate'])
+    assert np.isclose(intervals.loc['max_drawdown', 'estimate'], metrics['max_drawdown'])
+    assert (intervals['lower'] <= intervals['upper']).all()
+    pf = intervals.loc['profit_factor']
+    print(f"SUCCESS: PF {pf['estimate']:.2f} [{pf['lower']:.2f}, {pf['upper']:.2f}], 2000 resamples in {elapsed:.2f}s.")
+
+def test_intervals_same_on_cache_hit():
+    print("Testing bootstrap intervals on a result-cache hit...")
+    config = load_config()
+    df = SyntheticOHLCV(seed=4).generate(3000)
+    features = prepare_data(config, seed=4, n_bars=3000)
+    cache = ResultCache(cache_dir=tempfile.mkdtemp())
+
+    def run_fn():
+        engine, results = run_engine(config, features, max_drawdown=0.99)
+        return engine.calculate_metrics(), results, {'trades': engine.positions}
+
+    runs = []
+    for _ in range(2):
+        _, results, hit, artifacts = cache.get_or_run(df, {'strategy': config['strategy']}, run_fn, artifacts=('trades',))
+        trades = artifacts['trades'].to_dict('records')
+        runs.append((hit, BlockBootstrap(num_resamples=500, seed=2).run(results, trades)))
+
+    assert [hit for hit, _ in runs] == [False, True]
+    # The profit factor and win rate intervals survive the cache hit
+    assert 'profit_factor' in runs[1][1].index
+    assert runs[0][1].equals(runs[1][1])
+    print("SUCCESS: Identical intervals on the first run and on a cache hit.")
+
+if __name__ == "__main__":
+    test_resample_indices()
+    test_bar_metrics()
+    test_intervals_reproducible()
+    test_intervals_same_on_cache_hit()
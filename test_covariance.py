@@ -0,0 +1,101 @@
+﻿import numpy as np
+from risk.covariance import EWMACovariance, volatility_target_weights, risk_parity_weights
+from risk.sizing import PositionSizing
+from strategy.logic import StrategyLogic
+from analysis.backtest import BacktestEngine, MultiStrategyEngine
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+def test_batch_matches_incremental():
+    print("Testing incremental EWMA covariance...")
+    rng = np.random.default_rng(0)
+    returns = rng.multivariate_normal([0, 0, 0], [[1, 0.5, 0.2], [0.5, 2, 0.1], [0.2, 0.1, 0.5]], size=3000) * 0.01
+    returns[:500, 2] = np.nan # Asset listed later
+    returns[1200, 0] = np.nan # Missing bar
+
+    incremental = EWMACovariance(['A', 'B', 'C'], lam=0.97)
+    for row in returns:
+        incremental.update(row)
+    batch = EWMACovariance(['A', 'B', 'C'], lam=0.97)
+    batch.update_batch(returns[:1000]).update_batch(returns[1000:])
+
+    assert np.allclose(incremental.covariance(), batch.covariance(), rtol=1e-10)
+
+    # Prices with gaps: one batch call per chunk equals update_prices() bar by bar
+    prices = 100 * np.exp(np.nancumsum(returns, axis=0))
+    prices[np.isnan(returns)] = np.nan
+    per_bar = EWMACovariance(['A', 'B', 'C'], lam=0.97)
+    for row in prices:
+        per_bar.update_prices(row)
+    chunked = EWMACovariance(['A', 'B', 'C'], lam=0.97).update_prices_batch(prices[:700]).update_prices_batch(prices[700:])
+    assert per_bar.count == chunked.count
+    assert np.allclose(per_bar.covariance(), chunked.covariance(), rtol=1e-10)
+    correlation = incremental.correlation()
+    assert np.allclose(np.diag(correlation), 1.0)
+    assert 0.2 < correlation[0, 1] < 0.6
+    print(f"SUCCESS: Covariance identical, corr(A, B) = {correlation[0, 1]:.2f}.")
+
+def test_weights():
+    print("Testing vectorized sizing weights...")
+    cov = np.array([[0.04, 0.01, 0.0], [0.01, 0.09, 0.02], [0.0, 0.02, 0.25]])
+    vol = np.sqrt(np.diag(cov))
+
+    w = volatility_target_weights(cov, target_volatility=0.2)
+    sizing = PositionSizing(target_volatility=0.2)
+    assert np.allclose(w * 1000, [sizing.calculate_volatility_target_size(1000, v) for v in vol])
+
+    w = risk_parity_weights(cov)
+    contribution = w * (cov @ w)
+    assert np.allclose(contribution, contribution.mean(), rtol=1e-6)
+    assert abs(w.sum() - 1) < 1e-12
+
+    for weights in (volatility_target_weights(cov, 0.1, portfolio=True), risk_parity_weights(cov, 0.1)):
+        assert abs(np.sqrt(weights @ cov @ weights) - 0.1) < 1e-9
+    print("SUCCESS: Volatility target, portfolio target and risk parity weights.")
+
+def test_strategy_volatility_sizing():
+    print("Testing volatility-targeted sizing in StrategyLogic...")
+    config = load_config()
+    config['strategy']['risk']['sizing_method'] = 'volatility_target'
+    df = prepare_data(config, seed=4)
+
+    logic = StrategyLogic(config)
+    per_bar = [logic._update_volatility(row) for _, row in df.iterrows()]
+    per_bar = np.array([np.nan if v is None else v for v in per_bar])
+    batch = logic.volatility_series(df['close'])
+    assert np.allclose(per_bar, batch, equal_nan=True)
+
+    engine, results = run_engine(config, df, max_drawdown=0.99)
+    _, fixed_results = run_engine(load_config(), df, max_drawdown=0.99)
+    assert len(engine.positions) > 0
+    assert not results['equity'].equals(fixed_results['equity'])
+    print(f"SUCCESS: EWMA volatility matches, {len(engine.positions)} trades sized to target.")
+
+def test_shared_logic_keeps_volatility_per_engine():
+    print("Testing one volatility-targeted StrategyLogic in several engines...")
+    config = load_config()
+    config['strategy']['risk']['sizing_method'] = 'volatility_target'
+    df = prepare_data(config, seed=4, n_bars=3000)
+
+    alone, alone_results = run_engine(config, df, max_drawdown=0.99)
+    logic = StrategyLogic(config)
+    multi = MultiStrategyEngine(initial_capital=10000, fee=0.001, max_drawdown=0.99)
+    multi.add('first', logic)
+    multi.add('second', logic)
+    results = multi.run(df)
+    for name in ('first', 'second'):
+        assert results[name].equals(alone_results)
+        assert multi.engines[name].positions == alone.positions
+
+    # Reusing an instance for a second run starts its estimator over
+    engine = BacktestEngine(initial_capital=10000, fee=0.001, max_drawdown=0.99)
+    engine.run(df, logic.get_signal)
+    again = BacktestEngine(initial_capital=10000, fee=0.001, max_drawdown=0.99)
+    again.run(df, logic.get_signal)
+    assert again.positions == engine.positions == alone.positions
+    print(f"SUCCESS: {len(alone.positions)} trades identical in every engine.")
+
+if __name__ == "__main__":
+    test_batch_matches_incremental()
+    test_weights()
+    test_strategy_volatility_sizing()
+    test_shared_logic_keeps_volatility_per_engine()
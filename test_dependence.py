@@ -0,0 +1,61 @@
+﻿import time
+import numpy as np
+from analysis.dependence import TradeDependence
+
+def _acf(x, lag):
+    x = x - x.mean()
+    return (x[:-lag] * x[lag:]).sum() / (x ** 2).sum()
+
+def test_batch_matches_single_sequences():
+    print("Testing batch dependence diagnostics...")
+    rng = np.random.default_rng(0)
+    sequences = {f"trial_{i}": rng.normal(0.1, 1.0, rng.integers(30, 200)) for i in range(50)}
+    # Strongly autocorrelated sequence (AR(1))
+    ar = np.zeros(300)
+    for t in range(1, 300):
+        ar[t] = 0.8 * ar[t - 1] + rng.normal()
+    sequences['ar1'] = ar
+    sequences['short'] = np.array([1.0, -1.0, 2.0])
+    sequences['all_wins'] = np.ones(20)
+    sequences['empty'] = np.array([])
+
+    dependence = TradeDependence()
+    result = dependence.batch(sequences, max_lag=5)
+
+    for name, seq in sequences.items():
+        row = result.loc[name]
+        if len(seq) == 0:
+            assert row['runs'] == 0 and row['runs_p'] == 1.0
+            continue
+        single = dependence.runs_test((seq > 0).astype(int))
+        assert np.isclose(row['runs_z'], single['z_score'])
+        assert np.isclose(row['runs_p'], single['p_value'])
+        if 'runs' in single:
+            assert row['runs'] == single['runs']
+        for lag in range(1, min(6, len(seq))):
+            with np.errstate(invalid='ignore'):
+                assert np.isclose(row[f"acf_{lag}"], _acf(seq, lag), equal_nan=True)
+
+    assert not result.loc['ar1', 'is_random']
+    assert result.loc['ar1', 'ljung_box_p'] < 1e-6
+    assert np.isnan(result.loc['short', 'acf_4'])
+    print(f"SUCCESS: {len(sequences)} sequences match the per-sequence statistics.")
+
+def test_batch_speed():
+    print("Testing dependence screening of a full study...")
+    rng = np.random.default_rng(1)
+    sequences = [rng.normal(0, 1, rng.integers(20, 300)) for _ in range(2000)]
+    dependence = TradeDependence()
+    dependence.batch(sequences[:10])
+
+    t0 = time.perf_counter()
+    result = dependence.batch(sequences)
+    elapsed = time.perf_counter() - t0
+    assert len(result) == 2000
+    assert 0.85 < result['is_random'].mean() < 0.97
+    assert elapsed < 1.0
+    print(f"SUCCESS: 2000 sequences in {elapsed * 1000:.0f} ms.")
+
+if __name__ == "__main__":
+    test_batch_matches_single_sequences()
+    test_batch_speed()
@@ -0,0 +1,77 @@
+﻿import numpy as np
+import pandas as pd
+from strategy.exit_kernel import resolve_exits, run_kernel_backtest, _get_numba_kernel, EXIT_STOP, EXIT_TARGET, EXIT_END
+from test_backtest_engine import load_config, prepare_data
+
+def make_bars(closes, highs=None, lows=None, opens=None, atr=1.0):
+    closes = np.asarray(closes, dtype=float)
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=len(closes), freq='1h'),
+        'open': closes if opens is None else opens,
+        'high': closes + 0.1 if highs is None else highs,
+        'low': closes - 0.1 if lows is None else lows,
+        'close': closes,
+        'atr': atr
+    })
+
+def risk_config(sl_atr=2.0, tp_atr=5.0):
+    return {'strategy': {'risk': {'stop_loss_atr': sl_atr, 'take_profit_atr': tp_atr}}}
+
+def test_intrabar_touches():
+    print("Testing intrabar stop and target resolution...")
+    entries = np.array([1, 0, 0, 0, 0], dtype=np.int8)
+
+    # The low touches the 2 ATR stop at 98 although every close stays above it
+    df = make_bars([100, 99.5, 99, 99.2, 99.4], lows=[99.9, 99.0, 97.5, 99.0, 99.2])
+    exits = resolve_exits(df, risk_config(), entries=entries, use_numba=False)
+    assert list(exits['reason']) == [EXIT_STOP] and exits['exit_idx'][0] == 2
+    assert exits['exit_price'][0] == 98.0
+
+    # A gap through the target fills at the open
+    df = make_bars([100, 101, 107, 107, 107], opens=[100, 101, 106, 107, 107])
+    exits = resolve_exits(df, risk_config(), entries=entries, use_numba=False)
+    assert list(exits['reason']) == [EXIT_TARGET] and exits['exit_price'][0] == 106.0
+
+    # Ratchet latches at +0.5 ATR after a 2 ATR excursion, even once price falls back
+    df = make_bars([100, 102.5, 101, 100.4, 100], highs=[100, 102.6, 101.1, 100.9, 100.1], opens=[100, 102, 101.5, 100.8, 100.2])
+    exits = resolve_exits(df, risk_config(), entries=entries, use_numba=False)
+    assert list(exits['reason']) == [EXIT_STOP] and exits['exit_idx'][0] == 3
+    assert exits['exit_price'][0] == 100.5
+
+    # No exit before the data ends
+    df = make_bars([100, 100.5, 100.2, 100.1, 100.3])
+    exits = resolve_exits(df, risk_config(), entries=entries, use_numba=False)
+    assert list(exits['reason']) == [EXIT_END]
+    print("SUCCESS: Stops, targets, gaps and ratchet resolved on high/low.")
+
+def test_numpy_matches_compiled():
+    print("Testing NumPy path against the compiled loop...")
+    config = load_config()
+    df = prepare_data(config, seed=0, n_bars=8000)
+    expected = resolve_exits(df, config, use_numba=False)
+
+    if _get_numba_kernel() is None:
+        print("numba not installed; compiled path not checked.")
+        return
+    compiled = resolve_exits(df, config, use_numba=True)
+    for key in expected:
+        np.testing.assert_array_equal(compiled[key], expected[key])
+    print(f"SUCCESS: {len(expected['entry_idx'])} trades identical on both paths.")
+
+def test_kernel_backtest_accounting():
+    print("Testing kernel backtest accounting...")
+    config = load_config()
+    df = prepare_data(config, seed=1, n_bars=6000)
+    metrics, equity, trades = run_kernel_backtest(df, config, initial_capital=10000, fee=0.001)
+
+    assert len(equity) == len(df)
+    assert metrics['total_trades'] == len(trades)
+    # Once every position is closed, the equity is the starting capital plus net P&L minus entry fees
+    entry_fees = (trades['quantity'].abs() * trades['entry_price'] * 0.001).sum()
+    assert np.isclose(equity['equity'].iloc[-1], 10000 + trades['pnl'].sum() - entry_fees)
+    print(f"SUCCESS: {len(trades)} trades, final equity {equity['equity'].iloc[-1]:.2f}.")
+
+if __name__ == "__main__":
+    test_intrabar_touches()
+    test_numpy_matches_compiled()
+    test_kernel_backtest_accounting()
@@ -0,0 +1,45 @@
+﻿import os
+import subprocess
+import sys
+
+# Heavy stacks that a cached-data backtest never needs at import time
+LAZY_MODULES = ['ccxt', 'yfinance', 'scipy', 'matplotlib', 'optuna', 'sklearn', 'arch']
+IMPORT_BUDGET_SECONDS = 1.5
+
+def import_times(module='main'):
+    """
+    Cold-start import cost of a module, using `python -X importtime`.
+
+    Returns:
+        dict: {module_name: cumulative import time in seconds}.
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        times[name.strip()] = int(cumulative_us) / 1e6
+    return times
+
+def test_import_budget():
+    print("Measuring cold-start import time of main...")
+    times = import_times('main')
+
+    loaded_heavy = [name for name in times if name.split('.')[0] in LAZY_MODULES]
+    top_level = sorted(((t, name) for name, t in times.items() if '.' not in name), reverse=True)
+    for t, name in top_level[:10]:
+        print(f"  {name:<30} {t*1000:8.1f} ms")
+
+    assert not loaded_heavy, f"Heavy modules imported eagerly: {sorted(set(n.split('.')[0] for n in loaded_heavy))}"
+    assert times['main'] < IMPORT_BUDGET_SECONDS, f"import main took {times['main']:.2f}s"
+    print(f"SUCCESS: import main in {times['main']*1000:.0f} ms.")
+
+if __name__ == "__main__":
+    test_import_budget()
@@ -0,0 +1,192 @@
+﻿import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from data.synthetic import SyntheticOHLCV
+from strategy.live import LiveStrategy
+from analysis.backtest import BacktestEngine
+from test_backtest_engine import load_config, run_engine
+
+WARM = 1500
+
+def _setup(n_bars=4000):
+    config = load_config()
+    config['strategy']['risk']['max_drawdown'] = 0.99
+    df = SyntheticOHLCV(seed=1, annual_vol=1.5).generate(n_bars)
+    return config, df
+
+def _feed(live, df, chunk=100):
+    for start in range(0, len(df), chunk):
+        live.on_bars(df.iloc[start:start + chunk])
+
+def test_restart_matches_uninterrupted_run():
+    print("Testing checkpoint and restore mid-run...")
+    config, df = _setup()
+    straight = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=tempfile.mkdtemp(), checkpoint_every=0, garch=False)
+    straight.warm_up(df.iloc[:WARM])
+    _feed(straight, df.iloc[WARM:])
+
+    checkpoint_dir = tempfile.mkdtemp()
+    first = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir, checkpoint_every=50, garch=False)
+    first.warm_up(df.iloc[:WARM])
+    _feed(first, df.iloc[WARM:2750])
+    # The process dies; bars keep arriving
+    t0 = time.perf_counter()
+    resumed = LiveStrategy.restore(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir, garch=False)
+    resumed.on_bars(df.iloc[:2750 + 24]) # Catch up with the 24 missed bars (already seen ones are skipped)
+    elapsed = time.perf_counter() - t0
+    _feed(resumed, df.iloc[2750 + 24:])
+
+    assert len(straight.engine.positions) > 5
+    assert resumed.engine.positions == straight.engine.positions
+    assert resumed.engine.capital == straight.engine.capital
+    assert resumed.engine.current_position == straight.engine.current_position
+    assert resumed.engine.peak_equity == straight.engine.peak_equity
+    assert resumed.bars_processed == straight.bars_processed
+    assert elapsed < 1.0
+    print(f"SUCCESS: {len(resumed.engine.positions)} trades identical; restore + catch-up in {elapsed * 1000:.0f} ms.")
+
+def test_live_matches_backtest():
+    print("Testing live features and trades against the batch backtest...")
+    config, df = _setup(3000)
+    live = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=tempfile.mkdtemp(), checkpoint_every=0, garch=False)
+    live.warm_up(df.iloc[:WARM])
+    _feed(live, df.iloc[WARM:])
+
+    features = live._features(df)
+    engine, _ = run_engine(config, features.iloc[WARM:].reset_index(drop=True), max_drawdown=0.99)
+    assert [(p['entry_time'], p['exit_time']) for p in engine.positions] == [(p['entry_time'], p['exit_time']) for p in live.engine.positions]
+    assert np.isclose(engine.capital, live.engine.capital, rtol=1e-9)
+    print(f"SUCCESS: {len(engine.positions)} trades match the backtest.")
+
+def test_live_volatility_target_matches_backtest():
+    print("Testing volatility-targeted sizing from the first live bar...")
+    config, df = _setup(3000)
+    config['strategy']['risk']['sizing_method'] = 'volatility_target'
+    live = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=tempfile.mkdtemp(), checkpoint_every=0, garch=False)
+    live.warm_up(df.iloc[:WARM])
+    _feed(live, df.iloc[WARM:])
+
+    # Backtest over all bars that only trades after the warm-up: its estimator has seen the same history
+    logic = LiveStrategy(config, 'BTC/USDT', garch=False).logic
+    def after_warm_up(row, capital, current_position):
+        signal = logic.get_signal(row, capital, current_position)
+        return signal if row['timestamp'] >= df['timestamp'].iloc[WARM] else (0, 0.0)
+    engine = BacktestEngine(initial_capital=10000, fee=0.001, max_drawdown=0.99)
+    engine.run(live._features(df), after_warm_up)
+
+    assert len(engine.positions) > 5
+    assert [p['entry_time'] for p in engine.positions] == [p['entry_time'] for p in live.engine.positions]
+    assert np.allclose([p['quantity'] for p in engine.positions], [p['quantity'] for p in live.engine.positions], rtol=1e-9)
+    print(f"SUCCESS: {len(engine.positions)} trades sized identically.")
+
+def test_garch_recursion_and_stale_checkpoint():
+    print("Testing the GARCH recursion and settings checks...")
+    from arch import arch_model
+    config, df = _setup(1300)
+    checkpoint_dir = tempfile.mkdtemp()
+    live = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir)
+    live.warm_up(df.iloc[:1200])
+    params = dict(live.garch)
+    vols = [live._garch_step(close) for close in df['close'].iloc[1200:]]
+
+    returns = 100 * df['close'].pct_change().dropna()
+    fixed = arch_model(returns, vol='Garch', p=1, o=0, q=1, dist='Normal').fix([params['mu'], params['omega'], params['alpha'], params['beta']])
+    assert np.allclose(vols, fixed.conditional_volatility.iloc[-100:].to_numpy(), rtol=1e-8)
+
+    assert LiveStrategy.restore(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir) is not None
+    config['strategy']['indicators']['ma_short'] += 1
+    assert LiveStrategy.restore(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir) is None
+    assert LiveStrategy.restore(config, 'ETH/USDT', checkpoint_dir=checkpoint_dir) is None
+    print("SUCCESS: GARCH volatility continues exactly; stale checkpoints are refused.")
+
+def test_torn_checkpoint_keeps_previous():
+    print("Testing a crash in the middle of a checkpoint...")
+    import strategy.live as live_module
+    config, df = _setup(2000)
+    checkpoint_dir = tempfile.mkdtemp()
+    live = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir, checkpoint_every=0, garch=False)
+    live.warm_up(df.iloc[:WARM])
+    _feed(live, df.iloc[WARM:1700])
+    live.checkpoint()
+    committed = live.last_timestamp
+    _feed(live, df.iloc[1700:1800])
+
+    # The new tail is written, then the process dies before state.json is replaced
+    replace = live_module.os.replace
+    def crash(source, target):
+        if target.endswith('state.json'):
+            raise OSError("killed")
+        replace(source, target)
+    live_module.os.replace = crash
+    try:
+        live.checkpoint()
+    except OSError:
+        pass
+    finally:
+        live_module.os.replace = replace
+
+    restored = LiveStrategy.restore(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir, garch=False)
+    assert restored.last_timestamp == committed
+    assert restored.bars_processed == 1700 - WARM
+    # The next checkpoint removes the orphaned tail
+    restored.checkpoint()
+    tails = [name for name in os.listdir(restored.path) if name.startswith('tail')]
+    assert len(tails) == 1
+    print("SUCCESS: The previous checkpoint survives; orphaned tails are cleaned up.")
+
+def test_closed_trades_appended_outside_state():
+    print("Testing that closed trades are appended to trades.jsonl...")
+    import json
+    config, df = _setup(4000)
+    checkpoint_dir = tempfile.mkdtemp()
+    live = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir, checkpoint_every=1, garch=False)
+    live.warm_up(df.iloc[:WARM])
+    sizes = []
+    for start in range(WARM, len(df), 500):
+        _feed(live, df.iloc[start:start + 500], chunk=25)
+        sizes.append(os.path.getsize(os.path.join(live.path, 'state.json')))
+    with open(os.path.join(live.path, 'trades.jsonl')) as file:
+        assert len(file.read().splitlines()) == len(live.engine.positions) > 5
+    # The state holds the open position and counters only, however many trades closed
+    assert max(sizes) - min(sizes) < 200
+
+    # Lines appended by a checkpoint whose state.json was never written are cut off on restore
+    committed = list(live.engine.positions)
+    with open(os.path.join(live.path, 'trades.jsonl'), 'a') as file:
+        file.write(json.dumps({'entry_time': 'x', 'pnl': 1.0}) + '\n')
+    restored = LiveStrategy.restore(config, 'BTC/USDT', checkpoint_dir=checkpoint_dir, garch=False)
+    assert restored.engine.positions == committed
+    _feed(restored, df.iloc[:len(df)]) # Nothing new: no lines added
+    restored.checkpoint()
+    with open(os.path.join(live.path, 'trades.jsonl')) as file:
+        assert len(file.read().splitlines()) == len(committed)
+    print(f"SUCCESS: {len(committed)} trades in trades.jsonl; state.json stays {max(sizes)} bytes.")
+
+def test_warm_up_drops_forming_bar():
+    print("Testing warm-up on history that ends with a forming bar...")
+    config, df = _setup(2000)
+    forming = df['timestamp'].iloc[WARM - 1]
+    live = LiveStrategy(config, 'BTC/USDT', checkpoint_dir=tempfile.mkdtemp(), checkpoint_every=0, garch=False)
+    live.warm_up(df.iloc[:WARM], now=forming + pd.Timedelta(minutes=30))
+    assert live.last_timestamp == df['timestamp'].iloc[WARM - 2]
+
+    class Fetcher:
+        def fetch_ohlcv(self, symbol, timeframe, limit):
+            return df.iloc[:WARM + 1].tail(limit)
+
+    # Once closed, catch_up() processes the bar with its final values
+    live.catch_up(Fetcher(), now=forming + pd.Timedelta(hours=1))
+    assert live.last_timestamp == forming and live.bars_processed == 1
+    assert live.bars['close'].iloc[-1] == df['close'].iloc[WARM - 1]
+    print("SUCCESS: The forming bar is left for catch_up().")
+
+if __name__ == "__main__":
+    test_restart_matches_uninterrupted_run()
+    test_live_matches_backtest()
+    test_live_volatility_target_matches_backtest()
+    test_garch_recursion_and_stale_checkpoint()
+    test_torn_checkpoint_keeps_previous()
+    test_closed_trades_appended_outside_state()
+    test_warm_up_drops_forming_bar()
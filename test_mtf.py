@@ -0,0 +1,57 @@
+﻿import numpy as np
+import pandas as pd
+from data.synthetic import SyntheticOHLCV
+from strategy.mtf import MultiTimeframeFeatures
+from strategy.logic import StrategyLogic
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+SETTINGS = {'4h': {'ma_short': 5, 'ma_long': 12, 'rsi_period': 6, 'atr_window': 6}, '1d': {'ma_short': 3, 'ma_long': 7}}
+
+def test_no_lookahead():
+    print("Testing higher-timeframe alignment...")
+    df = SyntheticOHLCV(seed=0, timeframe='1h').generate(24 * 40, start='2024-01-01')
+    full = MultiTimeframeFeatures('1h', SETTINGS).compute(df)
+
+    # Values seen at each bar must not change when the future is removed
+    for cut in [100, 333, 500, 707]:
+        truncated = MultiTimeframeFeatures('1h', SETTINGS).compute(df.iloc[:cut])
+        for column in ['4h_ma_short', '4h_rsi', '1d_ma_long', '4h_trend']:
+            np.testing.assert_array_equal(truncated[column].to_numpy(), full[column].iloc[:cut].to_numpy())
+
+    # A 4h bar becomes visible on its last 1h bar: 03:00 sees the 00:00-04:00 bar, 02:00 does not
+    ma = full.set_index('timestamp')['4h_ma_short']
+    assert ma.loc['2024-01-02 02:00'] == ma.loc['2024-01-01 23:00']
+    assert ma.loc['2024-01-02 03:00'] != ma.loc['2024-01-02 02:00']
+    print("SUCCESS: Higher-timeframe features use completed bars only.")
+
+def test_incremental_matches_batch():
+    print("Testing incremental higher-timeframe updates...")
+    df = SyntheticOHLCV(seed=1, timeframe='1h').generate(24 * 30, start='2024-02-01')
+    expected = MultiTimeframeFeatures('1h', SETTINGS).compute(df)
+
+    features = MultiTimeframeFeatures('1h', SETTINGS)
+    rows = pd.concat([features.update(df.iloc[i:i + 50]) for i in range(0, len(df), 50)], ignore_index=True)
+    for column in features.columns('4h') + features.columns('1d'):
+        np.testing.assert_allclose(rows[column].to_numpy(), expected[column].to_numpy(), rtol=1e-9, equal_nan=True)
+    print("SUCCESS: Incremental updates match the batch computation.")
+
+def test_trend_filter():
+    print("Testing higher-timeframe trend filter...")
+    config = load_config()
+    config['strategy']['mtf'] = {'timeframes': {'4h': {'ma_short': 10, 'ma_long': 30}}, 'filter': '4h'}
+    df = MultiTimeframeFeatures.from_config(config).compute(prepare_data(config, seed=2, n_bars=3000))
+
+    logic = StrategyLogic(config)
+    flat = {'quantity': 0.0, 'entry_price': 0.0}
+    for _, row in df.iterrows():
+        signal, _ = logic.get_signal(row, 10000, flat)
+        if signal in (1, -1):
+            assert row['4h_trend'] == signal
+
+    engine, _ = run_engine(config, df, max_drawdown=0.99)
+    print(f"SUCCESS: Filtered entries follow the 4h trend ({len(engine.positions)} trades).")
+
+if __name__ == "__main__":
+    test_no_lookahead()
+    test_incremental_matches_batch()
+    test_trend_filter()
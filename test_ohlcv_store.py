@@ -0,0 +1,52 @@
+﻿import tempfile
+import pandas as pd
+from data.synthetic import SyntheticOHLCV
+from data.storage import OHLCVStore
+
+def make_store():
+    return OHLCVStore(data_dir=tempfile.mkdtemp())
+
+def test_append_dedup_and_range_read():
+    print("Testing partitioned OHLCV store...")
+    store = make_store()
+    df = SyntheticOHLCV(seed=0, timeframe='1h').generate(24 * 90, start='2024-01-01')
+
+    # Overlapping appends: the second write revises the last 100 bars of the first
+    first, second = df.iloc[:1200].copy(), df.iloc[1100:].copy()
+    second.loc[second.index[:100], 'close'] += 1.0
+    store.write(first, 'BTC/USDT', '1h')
+    store.write(second, 'BTC/USDT', '1h')
+
+    assert store.months('BTC/USDT', '1h') == ['2024-01', '2024-02', '2024-03']
+    full = store.read('BTC/USDT', '1h')
+    assert len(full) == len(df)
+    assert full['timestamp'].is_monotonic_increasing
+    assert (full['close'].iloc[1100:1200].to_numpy() == df['close'].iloc[1100:1200].to_numpy() + 1.0).all()
+
+    part = store.read('BTC/USDT', '1h', start='2024-02-10', end='2024-02-12 23:00', columns=['close'])
+    assert list(part.columns) == ['timestamp', 'close']
+    assert len(part) == 72
+    assert part['timestamp'].iloc[0] == pd.Timestamp('2024-02-10')
+    assert store.read('ETH/USDT', '1h') is None
+    print("SUCCESS: Appends deduplicated, range reads pruned.")
+
+def test_mmap_matches_parquet_read():
+    print("Testing memory-mapped fast path...")
+    store = make_store()
+    df = SyntheticOHLCV(seed=1, timeframe='15m').generate(96 * 60, start='2024-05-01')
+    store.write(df, 'ETH/USDT', '15m')
+
+    start, end = '2024-05-20', '2024-06-03 12:00'
+    expected = store.read('ETH/USDT', '15m', start=start, end=end)
+    fast = store.read_mmap('ETH/USDT', '15m', start=start, end=end)
+    pd.testing.assert_frame_equal(fast, expected)
+
+    # A later write invalidates the snapshot
+    more = SyntheticOHLCV(seed=2, timeframe='15m').generate(96, start='2024-06-30')
+    store.write(more, 'ETH/USDT', '15m')
+    assert len(store.read_mmap('ETH/USDT', '15m')) == len(df) + 96
+    print("SUCCESS: Memory-mapped reads match partitioned reads.")
+
+if __name__ == "__main__":
+    test_append_dedup_and_range_read()
+    test_mmap_matches_parquet_read()
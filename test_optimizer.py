@@ -0,0 +1,93 @@
+﻿import copy
+import optuna
+from data.synthetic import SyntheticOHLCV
+from strategy.indicators import Indicators
+from strategy.regime import RegimeDetection
+from analysis.optimizer import (study_name, best_trial, run_study, successive_halving, suggest_params,
+                                _evaluate_slice, load_config, MAX_REPORTED_PF)
+
+def full_features(df, config):
+    """
+    Features computed from scratch per candidate, as in the optimizer objective.
+    """
+    inds = config['strategy']['indicators']
+    df = Indicators.ma_crossover(df.copy(), short_window=inds['ma_short'], long_window=inds['ma_long'])
+    df = Indicators.rsi(df, window=inds['rsi_period'])
+    df = Indicators.bollinger_bands(df, window=inds['bb_window'], num_std=inds['bb_std'])
+    df = Indicators.atr(df, window=inds['atr_window'])
+    df = Indicators.adx(df, window=14)
+    try:
+        df = Indicators.garch_volatility(df)
+    except:
+        df['garch_vol'] = 2.0
+    return RegimeDetection(df).detect_regime()
+
+def test_study_name_follows_the_data():
+    print("Testing dataset-keyed study names...")
+    df = SyntheticOHLCV(seed=1).generate(500)
+    assert study_name('per_coin_BTC/USDT_1h', df) == study_name('per_coin_BTC/USDT_1h', df.copy())
+    # New bars (e.g. a later download) give a new study instead of resuming a stale one
+    assert study_name('per_coin_BTC/USDT_1h', SyntheticOHLCV(seed=1).generate(501)) != study_name('per_coin_BTC/USDT_1h', df)
+    print("SUCCESS: Study names change with the dataset.")
+
+def test_best_trial_when_all_pruned():
+    print("Testing best_trial with only pruned trials...")
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.create_study(direction='maximize')
+
+    def pruned(trial):
+        raise optuna.TrialPruned()
+
+    run_study(study, pruned, 3)
+    assert best_trial(study) is None
+    run_study(study, lambda trial: trial.suggest_float('x', 0, 1), 4)
+    assert best_trial(study).number == 3
+    print("SUCCESS: No ValueError without completed trials.")
+
+def test_successive_halving_matches_full_sweep():
+    print("Testing successive halving against a full-fidelity sweep...")
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    config = load_config()
+    # Trending data, so a parameter set's edge persists from the short slices to the full history
+    df = SyntheticOHLCV(seed=4, annual_drift=3.0, annual_vol=0.4, regime_switching=False).generate(5400)
+
+    study = optuna.create_study(direction='maximize', sampler=optuna.samplers.RandomSampler(seed=4))
+    result = successive_halving(df, config, n_candidates=9, min_trades=1, study=study)
+
+    # Full-fidelity sweep over the same candidates (same sampler seed), features from scratch
+    sampler_study = optuna.create_study(direction='maximize', sampler=optuna.samplers.RandomSampler(seed=4))
+    sweep = []
+    for _ in range(9):
+        trial = sampler_study.ask()
+        candidate = suggest_params(trial, copy.deepcopy(config))
+        score, metrics = _evaluate_slice(full_features(df, candidate), candidate, len(df), 1)
+        sweep.append(((score, min(metrics['profit_factor'], MAX_REPORTED_PF)), trial.params, metrics))
+    (best_key, best_params, best_metrics) = max(sweep, key=lambda row: row[0])
+
+    assert result['best_params'] == best_params
+    assert result['best_score'] == best_key[0] and result['best_metrics'] == best_metrics
+    # 9 x 600 + 3 x 1800 + 1 x 5400 bars instead of 9 x 5400
+    assert result['bar_evaluations'] == 3 * len(df)
+    assert result['full_fidelity_bar_evaluations'] == 9 * len(df)
+
+    # Only the full-length survivor is a completed trial; the others are pruned and tagged
+    assert best_trial(study).params == best_params
+    fidelities = sorted(t.user_attrs['fidelity'] for t in study.trials)
+    assert fidelities == [1/9] * 6 + [1/3] * 2 + [1.0]
+    print(f"SUCCESS: Same best candidate with {result['bar_evaluations']} of {result['full_fidelity_bar_evaluations']} bar evaluations.")
+
+def test_best_trial_ignores_low_fidelity():
+    print("Testing best_trial with multi-fidelity trials...")
+    study = optuna.create_study(direction='maximize')
+    for value, fidelity in ((5.0, 1/9), (2.0, 1.0), (3.0, 1/3)):
+        trial = study.ask()
+        trial.set_user_attr('fidelity', fidelity)
+        study.tell(trial, value)
+    assert best_trial(study).value == 2.0
+    print("SUCCESS: Short-slice results never become the best trial.")
+
+if __name__ == "__main__":
+    test_study_name_follows_the_data()
+    test_best_trial_when_all_pruned()
+    test_successive_halving_matches_full_sweep()
+    test_best_trial_ignores_low_fidelity()
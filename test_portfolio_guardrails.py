@@ -0,0 +1,137 @@
+﻿import numpy as np
+import pandas as pd
+from risk.portfolio_guardrails import PortfolioGuardrails
+from analysis.backtest import MultiStrategyEngine, PortfolioBacktest
+from strategy.logic import StrategyLogic
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+def test_batch_matches_per_bar():
+    print("Testing vectorized guardrails against the per-bar path...")
+    rng = np.random.default_rng(3)
+    n_bars, n_streams = 2000, 25
+    returns = rng.normal(0, 0.01, size=(n_bars, n_streams))
+    equity = 1000 * np.exp(np.cumsum(returns, axis=0))
+    exposure = rng.normal(0, 800, size=(n_bars, n_streams))
+    timestamps = pd.date_range('2023-01-01', periods=n_bars, freq='h')
+
+    guard = PortfolioGuardrails(max_drawdown=0.10, symbol_max_drawdown=0.15, max_gross_exposure=0.7, max_net_exposure=0.2, daily_loss_limit=0.01)
+    batch = guard.evaluate(equity, exposure, timestamps)
+
+    halts, blocks = [], []
+    for i in range(n_bars):
+        halt, block = guard.update(equity[i], exposure[i], timestamps[i])
+        halts.append(halt.copy())
+        blocks.append(block)
+    assert (np.array(halts) == batch['halt']).all()
+    assert (np.array(blocks) == batch['block_entries']).all()
+    assert batch['halt'].any() and not batch['halt'].all()
+    print(f"SUCCESS: {n_bars} bars x {n_streams} streams identical, {batch['halt'].mean():.0%} halted.")
+
+def test_daily_loss_resets_next_day():
+    print("Testing the daily loss limit...")
+    timestamps = pd.date_range('2023-01-01', periods=48, freq='h')
+    equity = np.full((48, 2), 500.0)
+    equity[5:, 0] = 470.0 # -3% of the portfolio on day one
+    guard = PortfolioGuardrails(max_drawdown=None, daily_loss_limit=0.02)
+    halt = guard.evaluate(equity, timestamps=timestamps)['halt']
+    assert not halt[:5].any()
+    assert halt[5:24].all()
+    assert not halt[24:].any()
+    print("SUCCESS: Halted for the rest of the day only.")
+
+def test_multi_strategy_engine_consults_guardrails():
+    print("Testing portfolio guardrails in the multi-strategy engine...")
+    config = load_config()
+    df = prepare_data(config, seed=2)
+
+    def run(guardrails):
+        engine = MultiStrategyEngine(initial_capital=10000, fee=0.001, max_drawdown=0.99, portfolio_guardrails=guardrails)
+        for i in range(3):
+            engine.add(f"variant_{i}", StrategyLogic(config))
+        return engine, engine.run(df)
+
+    plain_engine, plain = run(None)
+    loose_engine, loose = run(PortfolioGuardrails(max_drawdown=0.99, max_gross_exposure=100.0))
+    assert all(plain[name].equals(loose[name]) for name in plain)
+
+    # Zero gross exposure budget: no position can ever be opened
+    blocked_engine, blocked = run(PortfolioGuardrails(max_drawdown=None, max_gross_exposure=0.0))
+    assert all(not engine.positions for engine in blocked_engine.engines.values())
+    assert all((blocked[name]['equity'] == 10000).all() for name in blocked)
+    print("SUCCESS: Loose limits change nothing; an exposure cap blocks entries.")
+
+def test_portfolio_backtest_shares_guardrails():
+    print("Testing the multi-symbol portfolio backtest...")
+    config = load_config()
+    data = {'A': prepare_data(config, seed=2), 'B': prepare_data(config, seed=3, n_bars=4000)}
+    # B starts later: the shared timeline is the union of both symbols' bars
+    data['B']['timestamp'] += pd.Timedelta(hours=1500)
+
+    def run(guardrails):
+        portfolio = PortfolioBacktest(initial_capital=10000, fee=0.001, max_drawdown=0.10, portfolio_guardrails=guardrails)
+        for symbol, df in data.items():
+            portfolio.add(symbol, df, StrategyLogic(config))
+        return portfolio, portfolio.run()
+
+    # Without guardrails every symbol runs exactly as on its own
+    portfolio, results = run(None)
+    for symbol, df in data.items():
+        engine, alone = run_engine(config, df, max_drawdown=0.10)
+        assert results[symbol].equals(alone)
+        assert portfolio.engines[symbol].positions == engine.positions
+
+    # A zero gross exposure budget blocks entries on every symbol
+    portfolio, results = run(PortfolioGuardrails(max_drawdown=None, max_gross_exposure=0.0))
+    assert all(not engine.positions for engine in portfolio.engines.values())
+    assert all(len(results[symbol]) == len(df) for symbol, df in data.items())
+
+    # A tight combined drawdown halts and flattens both symbols for the rest of the run
+    plain, _ = run(None)
+    portfolio, results = run(PortfolioGuardrails(max_drawdown=0.01))
+    halted_at = max(trade['exit_time'] for engine in portfolio.engines.values() for trade in engine.positions)
+    for symbol, engine in portfolio.engines.items():
+        assert engine.halted and engine.current_position['quantity'] == 0
+        assert len(engine.positions) < len(plain.engines[symbol].positions)
+        after = results[symbol][results[symbol]['timestamp'] > halted_at]['equity']
+        assert (after == engine.capital).all()
+    print("SUCCESS: Separate runs reproduced; exposure and drawdown limits act across symbols.")
+
+def test_portfolio_backtest_covariance_sizing():
+    print("Testing cross-asset covariance sizing in the portfolio backtest...")
+    from risk.covariance import EWMACovariance
+    config = load_config()
+    data = {'A': prepare_data(config, seed=2, n_bars=3000), 'B': prepare_data(config, seed=3, n_bars=3000)}
+
+    def open_then_close(row, capital, current_position):
+        # One entry per trade (no adds), so each trade's notional is one sizing decision
+        return (1, 100.0) if current_position['quantity'] == 0 else (2, 0)
+
+    portfolio = PortfolioBacktest(initial_capital=10000, fee=0.001, max_drawdown=0.99, covariance_sizing='risk_parity', target_volatility=0.3)
+    for symbol, df in data.items():
+        portfolio.add(symbol, df, open_then_close)
+    results = portfolio.run()
+
+    # The same covariance fed directly; every entry is sized to its weight at that bar
+    covariance = EWMACovariance(['A', 'B'])
+    weights = {}
+    for timestamp, a, b in zip(data['A']['timestamp'], data['A']['close'], data['B']['close']):
+        covariance.update_prices([a, b])
+        if covariance.ready:
+            weights[timestamp] = covariance.weights(method='risk_parity', target_volatility=0.3)
+    checked = 0
+    for symbol, engine in portfolio.engines.items():
+        equity = results[symbol].set_index('timestamp')['equity']
+        for trade in engine.positions:
+            if trade['entry_time'] in weights:
+                notional = abs(trade['quantity'] * trade['entry_price'])
+                assert np.isclose(notional, weights[trade['entry_time']][symbol] * equity[trade['entry_time']])
+                checked += 1
+    assert checked > 5
+    print(f"SUCCESS: {checked} entries sized to risk-parity weights.")
+
+if __name__ == "__main__":
+    test_batch_matches_per_bar()
+    test_daily_loss_resets_next_day()
+    test_multi_strategy_engine_consults_guardrails()
+    test_portfolio_backtest_shares_guardrails()
+    test_portfolio_backtest_covariance_sizing()
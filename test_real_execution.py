@@ -0,0 +1,52 @@
+﻿import tempfile
+import time
+from data.exchange_pool import ExchangePool, MarketCache
+from execution.real import RealExecution
+from execution.sim_exchange import SimulatedExchange
+
+def make_pool(cache_dir, latency_ms=20.0, rate_limit_ms=5):
+    pool = ExchangePool(market_cache=MarketCache(cache_dir=cache_dir, ttl=3600))
+    pool.register('sim', lambda config: SimulatedExchange('sim', latency_ms=latency_ms, rate_limit_ms=rate_limit_ms))
+    return pool
+
+def test_client_pool_and_market_cache():
+    print("Testing pooled clients and disk-cached markets...")
+    cache_dir = tempfile.mkdtemp()
+
+    pool = make_pool(cache_dir)
+    first = RealExecution('sim', pool=pool)
+    second = RealExecution('sim', pool=pool)
+    assert first.exchange is second.exchange
+    assert first.exchange.market_loads == 1
+    # Same API key with another secret is another credential set
+    assert pool.get('sim', api_key='k', secret='a') is pool.get('sim', api_key='k', secret='a')
+    assert pool.get('sim', api_key='k', secret='a') is not pool.get('sim', api_key='k', secret='b')
+
+    # A fresh process (new pool) reads metadata from disk instead of downloading it
+    restarted = RealExecution('sim', pool=make_pool(cache_dir))
+    assert restarted.exchange.market_loads == 0
+    assert 'BTC/USDT' in restarted.exchange.markets
+    print("SUCCESS: Markets downloaded once and reused.")
+
+def test_batch_place_orders():
+    latency_ms = 20.0
+    print(f"Testing batch order submission ({latency_ms}ms per order)...")
+    execution = RealExecution('sim', pool=make_pool(tempfile.mkdtemp(), latency_ms=latency_ms, rate_limit_ms=5))
+    orders = [{'symbol': 'BTC/USDT', 'side': 'buy', 'type': 'market', 'amount': 0.01 * (i + 1)} for i in range(10)]
+    orders.append({'symbol': 'DOGE/USDT', 'side': 'buy', 'type': 'market', 'amount': 1.0})
+
+    t0 = time.perf_counter()
+    placed = execution.place_orders(orders)
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+
+    assert [o['amount'] for o in placed[:10]] == [o['amount'] for o in orders[:10]]
+    assert placed[-1] is None # Unknown market is rejected, not raised
+    assert elapsed_ms < len(orders) * latency_ms, elapsed_ms
+
+    starts = sorted(o['timestamp'] for o in placed[:10])
+    assert starts[-1] - starts[0] >= 9 * 5 - 1 # Submissions spaced by the rate limit
+    print(f"SUCCESS: {len(orders)} orders in {elapsed_ms:.1f}ms.")
+
+if __name__ == "__main__":
+    test_client_pool_and_market_cache()
+    test_batch_place_orders()
@@ -0,0 +1,57 @@
+﻿import numpy as np
+import pandas as pd
+from data.synthetic import SyntheticOHLCV
+from strategy.indicators import Indicators
+from strategy.regime import RegimeDetection
+
+def make_data(seed=0, n_bars=5000):
+    df = SyntheticOHLCV(seed=seed).generate(n_bars)
+    return Indicators.atr(df, window=14)
+
+def test_threshold_matrix_matches_single_calls():
+    print("Testing regime matrix over many thresholds...")
+    df = make_data()
+    thresholds = np.linspace(0.5, 2.5, 9)
+    matrix = RegimeDetection(df.copy()).regime_matrix(thresholds)
+    assert matrix.shape == (len(df), len(thresholds)) and matrix.dtype == np.int8
+
+    for j, threshold in enumerate(thresholds):
+        single = RegimeDetection(df.copy()).detect_regime(volatility_threshold=threshold)
+        np.testing.assert_array_equal(matrix[:, j], single['regime_code'].to_numpy())
+        assert ((single['regime'] == 'TREND').to_numpy() == (matrix[:, j] == 1)).all()
+    print("SUCCESS: Matrix columns match per-threshold detection.")
+
+def test_hurst_and_variance_ratio():
+    print("Testing rolling Hurst exponent and variance ratio...")
+    rng = np.random.default_rng(0)
+    n = 4000
+
+    # Random walk vs. mean-reverting (AR(1) around a level) log prices
+    walk = np.cumsum(rng.standard_normal(n) * 0.01)
+    reverting = np.zeros(n)
+    for i in range(1, n):
+        reverting[i] = 0.5 * reverting[i - 1] + rng.standard_normal() * 0.01
+
+    results = {}
+    for name, log_price in [('walk', walk), ('reverting', reverting)]:
+        df = pd.DataFrame({'close': 100 * np.exp(log_price)})
+        detector = RegimeDetection(df)
+        results[name] = (np.nanmean(detector.hurst(window=200)), np.nanmean(detector.variance_ratio(q=4, window=200)))
+
+    assert abs(results['walk'][0] - 0.5) < 0.05 and abs(results['walk'][1] - 1.0) < 0.1
+    assert results['reverting'][0] < 0.3 and results['reverting'][1] < 0.6
+    print(f"SUCCESS: H(walk)={results['walk'][0]:.2f}, H(reverting)={results['reverting'][0]:.2f}.")
+
+def test_hurst_filter_narrows_trend():
+    print("Testing combined volatility + Hurst classifier...")
+    df = make_data(seed=1)
+    base = RegimeDetection(df.copy()).detect_regime()
+    combined = RegimeDetection(df.copy()).detect_regime(hurst_threshold=0.5)
+    assert (combined['regime_code'] <= base['regime_code']).all()
+    assert combined['regime_code'].sum() < base['regime_code'].sum()
+    print("SUCCESS: Hurst filter only removes TREND bars.")
+
+if __name__ == "__main__":
+    test_threshold_matrix_matches_single_calls()
+    test_hurst_and_variance_ratio()
+    test_hurst_filter_narrows_trend()
@@ -0,0 +1,129 @@
+﻿import tempfile
+import pandas as pd
+from data.synthetic import SyntheticOHLCV
+from data.resample import resample_ohlcv, IncrementalResampler
+from data.storage import OHLCVStore
+from data.fetcher import DataFetcher, yahoo_period
+
+def test_resample_aggregation():
+    print("Testing OHLCV aggregation...")
+    base = SyntheticOHLCV(seed=0, timeframe='15m').generate(96 * 3 + 5, start='2024-01-01')
+    bars = resample_ohlcv(base, '1h', base_timeframe='15m')
+
+    # 3 days of complete hours; the 5 trailing 15m bars leave one full hour and one forming hour
+    assert len(bars) == 73
+    first = base.iloc[:4]
+    row = bars.iloc[0]
+    assert row['timestamp'] == pd.Timestamp('2024-01-01')
+    assert row['open'] == first['open'].iloc[0] and row['close'] == first['close'].iloc[-1]
+    assert row['high'] == first['high'].max() and row['low'] == first['low'].min()
+    assert row['volume'] == first['volume'].sum()
+
+    daily = resample_ohlcv(base, '1d', base_timeframe='15m')
+    assert len(daily) == 3
+    print("SUCCESS: 15m bars aggregate to 1h and 1d.")
+
+def test_incremental_matches_batch():
+    print("Testing incremental resampling...")
+    base = SyntheticOHLCV(seed=1, timeframe='1h').generate(24 * 20, start='2024-03-01')
+    resampler = IncrementalResampler('4h', '1h')
+    for start in range(0, len(base), 7):
+        resampler.update(base.iloc[:start + 7])
+    expected = resample_ohlcv(base, '4h', base_timeframe='1h')
+    pd.testing.assert_frame_equal(resampler.bars, expected, check_dtype=False)
+    print("SUCCESS: Incremental bars match the batch resample.")
+
+def test_fetcher_derives_from_base():
+    print("Testing fetcher with a single base download...")
+    now = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('1h')
+    history = SyntheticOHLCV(seed=2, timeframe='1h').generate(24 * 30, start=now - pd.Timedelta(hours=24 * 30 - 1))
+    calls = []
+
+    def network(symbol, timeframe, limit):
+        calls.append((timeframe, limit))
+        return history.tail(limit).reset_index(drop=True)
+
+    fetcher = DataFetcher(source='yahoo', base_timeframe='1h', store=OHLCVStore(tempfile.mkdtemp(), source='yahoo'))
+    fetcher._fetch_network = network
+
+    daily = fetcher.fetch_ohlcv('BTC-USD', '1d', limit=20)
+    four_hour = fetcher.fetch_ohlcv('BTC-USD', '4h', limit=100)
+    hourly = fetcher.fetch_ohlcv('BTC-USD', '1h', limit=50)
+
+    assert all(tf == '1h' for tf, _ in calls)
+    assert len(calls) == 1
+    assert len(four_hour) == 100 and len(daily) == 20 and len(hourly) == 50
+    assert (four_hour['timestamp'].diff().dropna() == pd.Timedelta(hours=4)).all()
+    assert fetcher.store.read('BTC-USD', '4h') is not None
+
+    # A new fetcher reuses the stored base bars: nothing newer exists, so no download
+    fresh = DataFetcher(source='yahoo', base_timeframe='1h', store=fetcher.store)
+    fresh._fetch_network = network
+    assert len(fresh.fetch_ohlcv('BTC-USD', '4h', limit=100)) == 100
+    assert len(calls) == 1
+    print(f"SUCCESS: 3 timeframes served from {len(calls)} download.")
+
+def test_fetcher_resumes_stored_derived_bars():
+    print("Testing derived bars resumed from the store...")
+    import data.resample as resample_module
+    now = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('1h')
+    history = SyntheticOHLCV(seed=3, timeframe='1h').generate(24 * 30, start=now - pd.Timedelta(hours=24 * 30))
+    available = [len(history) - 12]
+
+    def network(symbol, timeframe, limit):
+        return history.iloc[:available[0]].tail(limit).reset_index(drop=True)
+
+    store = OHLCVStore(tempfile.mkdtemp(), source='yahoo')
+    first = DataFetcher(source='yahoo', base_timeframe='1h', store=store)
+    first._fetch_network = network
+    first.fetch_ohlcv('BTC-USD', '4h', limit=100)
+
+    # A later run: 12 more hourly bars; a new fetcher only resamples what follows the stored 4h bars
+    available[0] = len(history)
+    resampled = []
+    batch = resample_module.resample_ohlcv
+    def spy(df, *args, **kwargs):
+        resampled.append(len(df))
+        return batch(df, *args, **kwargs)
+    resample_module.resample_ohlcv = spy
+    try:
+        second = DataFetcher(source='yahoo', base_timeframe='1h', store=store)
+        second._fetch_network = network
+        bars = second.fetch_ohlcv('BTC-USD', '4h', limit=100)
+    finally:
+        resample_module.resample_ohlcv = batch
+
+    assert sum(resampled) <= 12 + 4
+    expected = batch(history[history['timestamp'] + pd.Timedelta(hours=1) <= pd.Timestamp.now(tz='UTC').tz_localize(None)], '4h', base_timeframe='1h')
+    pd.testing.assert_frame_equal(bars, expected.tail(100).reset_index(drop=True), check_dtype=False)
+    print(f"SUCCESS: {sum(resampled)} base bars resampled on resume.")
+
+def test_fetcher_incremental_when_source_history_is_short():
+    print("Testing incremental fetch beyond the source's history...")
+    now = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('1h')
+    # Yahoo serves 2 years of 1h bars: fewer than the configured limit of 18000
+    n_bars = 730 * 24
+    history = SyntheticOHLCV(seed=3, timeframe='1h').generate(n_bars, start=now - pd.Timedelta(hours=n_bars - 1))
+    calls = []
+
+    def network(symbol, timeframe, limit):
+        calls.append(limit)
+        return history.tail(limit).reset_index(drop=True)
+
+    store = OHLCVStore(tempfile.mkdtemp(), source='yahoo')
+    for _ in range(2):
+        fetcher = DataFetcher(source='yahoo', base_timeframe='1h', store=store)
+        fetcher._fetch_network = network
+        assert len(fetcher.fetch_ohlcv('BTC-USD', '1h', limit=18000)) == n_bars
+
+    # One full download, then only the tail since the last stored bar
+    assert calls[0] == 18000 and len(calls) <= 2 and all(limit <= 2 for limit in calls[1:])
+    assert yahoo_period('1h', 3) == '1d' and yahoo_period('1h', 18000) == '2y' and yahoo_period('15m', 18000) == '60d'
+    print(f"SUCCESS: Downloads of {calls} bars.")
+
+if __name__ == "__main__":
+    test_resample_aggregation()
+    test_incremental_matches_batch()
+    test_fetcher_derives_from_base()
+    test_fetcher_resumes_stored_derived_bars()
+    test_fetcher_incremental_when_source_history_is_short()
@@ -0,0 +1,114 @@
+﻿import os
+import tempfile
+import time
+import pandas as pd
+from data.synthetic import SyntheticOHLCV
+from analysis.result_cache import ResultCache, normalize_params, dataset_hash, code_version
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+def test_hit_returns_stored_result():
+    print("Testing result cache hit/miss...")
+    config = load_config()
+    df = SyntheticOHLCV(seed=5).generate(1500)
+    cache = ResultCache(cache_dir=tempfile.mkdtemp())
+    calls = []
+
+    def run_fn():
+        calls.append(1)
+        engine, results = run_engine(config, prepare_data(config, seed=5, n_bars=1500), max_drawdown=0.15)
+        return engine.calculate_metrics(), results
+
+    params = {'strategy': config['strategy']}
+    metrics, equity, hit = cache.get_or_run(df, params, run_fn, pipeline='test')
+    assert not hit
+
+    t0 = time.perf_counter()
+    cached_metrics, cached_equity, hit = cache.get_or_run(df, params, run_fn, pipeline='test')
+    elapsed = time.perf_counter() - t0
+
+    assert hit and len(calls) == 1
+    assert cached_metrics == metrics
+    assert cached_equity['equity'].equals(equity['equity'])
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A different dataset or pipeline is a different key
+    other = SyntheticOHLCV(seed=6).generate(1500)
+    assert cache.key(other, params, 'test') != cache.key(df, params, 'test')
+    assert cache.key(df, params, 'other') != cache.key(df, params, 'test')
+    print(f"SUCCESS: Cache hit served in {elapsed*1000:.1f} ms.")
+
+def test_params_are_normalized():
+    print("Testing parameter normalization...")
+    a = {'ma_short': 20, 'stop_loss_atr': 3.0600000000000005, 'risk': {'b': 1, 'a': 2}}
+    b = {'risk': {'a': 2.0, 'b': 1}, 'stop_loss_atr': 3.06, 'ma_short': 20.0}
+    assert normalize_params(a) == normalize_params(b)
+    assert normalize_params({'x': 3.06}) != normalize_params({'x': 3.07})
+
+    df = SyntheticOHLCV(seed=7).generate(100)
+    assert dataset_hash(df) == dataset_hash(df.reset_index(drop=True).copy())
+    print("SUCCESS: Equivalent parameter sets share a key.")
+
+def test_hit_returns_trades_and_features():
+    print("Testing cached trade log and feature frame...")
+    config = load_config()
+    df = SyntheticOHLCV(seed=5).generate(1500)
+    features = prepare_data(config, seed=5, n_bars=1500)
+    cache = ResultCache(cache_dir=tempfile.mkdtemp())
+    params = {'strategy': config['strategy']}
+
+    def run_fn():
+        engine, results = run_engine(config, features, max_drawdown=0.15)
+        return engine.calculate_metrics(), results, {'trades': engine.positions, 'features': features}
+
+    # An entry stored without artifacts does not satisfy a request for them
+    cache.get_or_run(df, params, lambda: run_fn()[:2], pipeline='test')
+    *_, hit, first = cache.get_or_run(df, params, run_fn, pipeline='test', artifacts=('trades', 'features'))
+    assert not hit and len(first['trades']) > 0
+    *_, hit, cached = cache.get_or_run(df, params, run_fn, pipeline='test', artifacts=('trades', 'features'))
+    assert hit
+
+    assert cached['trades'].to_dict('records') == first['trades'].to_dict('records')
+    assert cached['trades']['pnl'].sum() == sum(trade['pnl'] for trade in run_fn()[2]['trades'])
+    pd.testing.assert_frame_equal(cached['features'], features.reset_index(drop=True))
+    print(f"SUCCESS: {len(cached['trades'])} trades and {len(cached['features'])} feature rows served from the cache.")
+
+def test_size_bounded_eviction():
+    print("Testing LRU eviction...")
+    cache = ResultCache(cache_dir=tempfile.mkdtemp(), max_mb=1)
+    df = SyntheticOHLCV(seed=8).generate(20000)
+    equity = df[['timestamp', 'close']].rename(columns={'close': 'equity'})
+
+    keys = []
+    for i in range(8):
+        key = cache.key(df, {'i': i})
+        cache.put(key, {'profit_factor': float(i)}, equity)
+        keys.append(key)
+        time.sleep(0.01)
+
+    total = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(cache.cache_dir) for f in files)
+    assert total <= cache.max_bytes
+    assert cache.get(keys[-1]) is not None
+    assert cache.get(keys[0]) is None
+    print(f"SUCCESS: Cache kept to {total/1024:.0f} KB.")
+
+def test_code_version_covers_data_dependencies():
+    print("Testing the code version against resampling changes...")
+    import os
+    import shutil
+    root = tempfile.mkdtemp()
+    for path in ['strategy/mtf.py', 'data/resample.py', 'data/synthetic.py']:
+        os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+        shutil.copy(path, os.path.join(root, path))
+    before = code_version(root)
+    with open(os.path.join(root, 'data/resample.py'), 'a') as file:
+        file.write('\n# changed\n')
+    assert code_version(root) != before
+    code_version(os.path.dirname(os.path.abspath(__file__))) # Restore the cached version of this tree
+    print("SUCCESS: A resampling change invalidates cached results.")
+
+if __name__ == "__main__":
+    test_hit_returns_stored_result()
+    test_params_are_normalized()
+    test_hit_returns_trades_and_features()
+    test_size_bounded_eviction()
+    test_code_version_covers_data_dependencies()
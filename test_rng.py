@@ -0,0 +1,97 @@
+﻿import numpy as np
+from contextlib import contextmanager
+from utils.rng import RNGService, rng_service
+from risk.monte_carlo import MonteCarloSimulation
+from analysis.permutation import PermutationTest
+from data.replay import OrderBookReplay
+from execution.sim_exchange import SimulatedExchange
+
+@contextmanager
+def global_rng_reseeded():
+    """
+    Let a test reseed the global rng_service; its seed, root and counters are restored afterwards.
+    """
+    saved = (rng_service.seed, rng_service._root, dict(rng_service._counters))
+    try:
+        yield rng_service
+    finally:
+        rng_service.seed, rng_service._root, rng_service._counters = saved
+
+def test_streams_are_reproducible_and_independent():
+    print("Testing RNG service streams...")
+    service = RNGService(seed=7)
+    first = [service.generator('monte_carlo').random(5) for _ in range(2)]
+    other = service.generator('permutation').random(5)
+    worker_a = service.for_worker(0).generator('monte_carlo').random(5)
+    worker_b = service.for_worker(1).generator('monte_carlo').random(5)
+
+    service.reseed(7)
+    again = [service.generator('monte_carlo').random(5) for _ in range(2)]
+    assert all((a == b).all() for a, b in zip(first, again))
+    # Instances, components and workers never share a stream
+    streams = [first[0], first[1], other, worker_a, worker_b]
+    assert len({tuple(stream) for stream in streams}) == len(streams)
+    assert (RNGService(seed=8).generator('monte_carlo').random(5) != first[0]).all()
+    print("SUCCESS: Same seed, same streams; no duplicates.")
+
+def test_monte_carlo_reproducible_across_workers():
+    print("Testing parallel Monte Carlo reproducibility...")
+    runs = [MonteCarloSimulation(num_simulations=20000, num_trades=100, seed=3, chunk_size=1500, max_workers=workers).simulate(0.55, 0.02, 0.015)
+            for workers in (1, 4)]
+    assert runs[0] == runs[1]
+    assert 0 <= runs[0]['ruin_probability'] < 0.05
+    expected = 10000 * (0.55 * 1.02 + 0.45 * 0.985) ** 100
+    assert abs(runs[0]['mean_final_equity'] / expected - 1) < 0.02
+
+    with global_rng_reseeded() as service:
+        service.reseed(11)
+        unseeded = [MonteCarloSimulation(num_simulations=2000).simulate(0.55, 0.02, 0.015) for _ in range(2)]
+        service.reseed(11)
+        repeated = MonteCarloSimulation(num_simulations=2000).simulate(0.55, 0.02, 0.015)
+    assert repeated == unseeded[0]
+    assert unseeded[0] != unseeded[1]
+    print(f"SUCCESS: Mean final equity {runs[0]['mean_final_equity']:.0f} (expected {expected:.0f}).")
+
+def test_permutation_test():
+    print("Testing the sign-randomization permutation test...")
+    rng = np.random.default_rng(0)
+    edge = rng.normal(0.2, 1.0, 500)
+    noise = rng.normal(0.0, 1.0, 500)
+
+    results = [PermutationTest(5000, seed=1, chunk_size=700, max_workers=workers).run_test(edge) for workers in (1, 3)]
+    assert results[0] == results[1]
+    assert results[0]['is_significant']
+    assert not PermutationTest(5000, seed=1).run_test(noise)['is_significant']
+    print(f"SUCCESS: p = {results[0]['p_value']:.4f} with an edge.")
+
+def test_simulated_books():
+    print("Testing seeded order book replay...")
+    a = OrderBookReplay(seed=5).generate_dummy_book(100.0, depth=5)
+    b = OrderBookReplay(seed=5).generate_dummy_book(100.0, depth=5)
+    assert a['bids'] == b['bids'] and a['asks'] == b['asks']
+    assert len(a['bids']) == 5 and a['bids'][0][0] < a['asks'][0][0]
+
+    with global_rng_reseeded() as service:
+        service.reseed(2)
+        books = [SimulatedExchange(name).fetch_order_book('BTC/USDT') for name in ('binance', 'kraken')]
+        service.reseed(2)
+        repeated = SimulatedExchange('binance').fetch_order_book('BTC/USDT')
+    assert repeated['bids'] == books[0]['bids']
+    assert books[0]['bids'] != books[1]['bids']
+    print("SUCCESS: Books reproducible per venue.")
+
+def test_global_service_restored():
+    print("Testing that reseeding in tests leaves the global service untouched...")
+    before = (rng_service.seed, rng_service._root.entropy, dict(rng_service._counters))
+    with global_rng_reseeded() as service:
+        service.reseed(5)
+        service.generator('monte_carlo')
+    assert (rng_service.seed, rng_service._root.entropy, rng_service._counters) == before
+    print("SUCCESS: Seed, root and counters restored.")
+
+if __name__ == "__main__":
+    test_streams_are_reproducible_and_independent()
+    test_monte_carlo_reproducible_across_workers()
+    test_permutation_test()
+    test_simulated_books()
+    test_global_service_restored()
@@ -0,0 +1,77 @@
+﻿import tempfile
+import time
+from analysis.run_store import RunStore
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+def test_save_and_load_runs():
+    print("Testing run store round trip...")
+    config = load_config()
+    store = RunStore(root=tempfile.mkdtemp())
+
+    run_ids = []
+    for seed, symbol in [(0, 'BTC/USDT'), (1, 'BTC/USDT'), (2, 'ETH/USDT')]:
+        df = prepare_data(config, seed=seed, n_bars=1500)
+        engine, results = run_engine(config, df, max_drawdown=0.15)
+        metrics = engine.calculate_metrics()
+        run_ids.append(store.save_run(symbol, config, metrics, results, trades=engine.positions, df=df))
+
+    index = store.runs()
+    assert list(index['run_id']) == run_ids
+    assert len(store.runs(symbol='BTC/USDT')) == 2
+    assert store.config(run_ids[0]) == config
+    assert (index['total_trades'] == [len(t) for t in [store.load_trades([r]) for r in run_ids]]).all()
+
+    equity = store.load_equity([run_ids[0], run_ids[2]])
+    assert set(equity['run_id']) == {run_ids[0], run_ids[2]}
+    assert len(store.load_equity(symbol='BTC/USDT')) == 3000
+    assert store.equity_matrix(run_ids).shape == (1500, 3)
+    print("SUCCESS: Runs stored and reloaded.")
+
+def test_compare_many_runs_is_fast():
+    print("Testing comparison over many runs...")
+    config = load_config()
+    store = RunStore(root=tempfile.mkdtemp())
+    df = prepare_data(config, seed=3, n_bars=1500)
+    engine, results = run_engine(config, df, max_drawdown=0.15)
+    metrics = engine.calculate_metrics()
+    run_ids = [store.save_run('BTC/USDT', config, metrics, results, trades=engine.positions, df=df) for _ in range(100)]
+
+    t0 = time.perf_counter()
+    table = store.compare(run_ids)
+    curves = store.load_equity(run_ids)
+    elapsed = time.perf_counter() - t0
+
+    assert len(table) == 100
+    assert len(curves) == 100 * 1500
+    assert store.delete(run_ids[0]) and len(store.runs()) == 99
+    print(f"SUCCESS: Compared 100 runs in {elapsed*1000:.0f} ms.")
+
+def test_index_fragments_and_compaction():
+    print("Testing concurrent saves, deletes and compaction of the index...")
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    config = load_config()
+    store = RunStore(root=tempfile.mkdtemp())
+    df = prepare_data(config, seed=4, n_bars=500)
+    engine, results = run_engine(config, df, max_drawdown=0.15)
+    metrics = engine.calculate_metrics()
+
+    def save(i):
+        return store.save_run('BTC/USDT' if i % 2 else 'ETH/USDT', config, metrics, results, df=df)
+    # Savers never rewrite shared files, so no row is lost
+    with ThreadPoolExecutor(8) as pool:
+        run_ids = list(pool.map(save, range(40)))
+    assert sorted(store.runs()['run_id']) == sorted(run_ids)
+
+    assert store.delete(run_ids[0]) and store.delete(run_ids[1])
+    assert store.compact()
+    assert os.listdir(store.index_dir) == [name for name in os.listdir(store.index_dir) if name.startswith('batch-')]
+    assert len(os.listdir(store.index_dir)) == 1
+    assert sorted(store.runs()['run_id']) == sorted(run_ids[2:])
+    assert store.delete(run_ids[2]) and len(store.runs()) == 37
+    print("SUCCESS: 40 concurrent saves kept; deletes survive compaction.")
+
+if __name__ == "__main__":
+    test_save_and_load_runs()
+    test_compare_many_runs_is_fast()
+    test_index_fragments_and_compaction()
@@ -0,0 +1,95 @@
+﻿import numpy as np
+from risk.sizing import PositionSizing, trade_returns
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+def test_sweep_matches_trade_by_trade():
+    print("Testing the vectorized fraction sweep...")
+    rng = np.random.default_rng(2)
+    returns = rng.normal(0.01, 0.06, 120)
+    sizing = PositionSizing()
+    fractions = np.array([0.05, 0.5, 2.0, 5.0])
+    sweep = sizing.fraction_sweep(returns, fractions, ruin_level=0.5)
+
+    for i, f in enumerate(fractions):
+        equity, peak, max_dd, lowest = 1.0, 1.0, 0.0, 1.0
+        for r in returns:
+            equity = max(equity * (1 + f * r), 0.0)
+            peak = max(peak, equity)
+            max_dd = max(max_dd, 1 - equity / peak)
+            lowest = min(lowest, equity)
+        assert np.isclose(sweep['terminal_multiple'][i], equity)
+        assert np.isclose(sweep['max_drawdown'][i], max_dd)
+        assert sweep['ruined'][i] == (lowest <= 0.5)
+    print("SUCCESS: Growth, drawdown and ruin match the trade-by-trade loop.")
+
+def test_kelly_and_bootstrap():
+    print("Testing Kelly fraction and bootstrap resampling...")
+    rng = np.random.default_rng(3)
+    returns = rng.normal(0.01, 0.05, 200)
+    sizing = PositionSizing()
+
+    kelly = sizing.kelly_fraction(returns)
+    grid = sizing.fraction_sweep(returns, np.linspace(0.01, 2 * kelly, 2000))
+    assert abs(grid['fraction'][grid['growth'].idxmax()] - kelly) < 2 * kelly / 2000 * 2
+
+    sweep = sizing.fraction_sweep(returns, np.linspace(0.01, 1.0, 50), kelly_multipliers=[0.5, 1.0], n_bootstrap=500, seed=7, chunk_size=8)
+    again = sizing.fraction_sweep(returns, np.linspace(0.01, 1.0, 50), kelly_multipliers=[0.5, 1.0], n_bootstrap=500, seed=7, chunk_size=64)
+    assert sweep.equals(again)
+    assert np.isclose(sweep['fraction'].iloc[-1], kelly)
+    assert (np.diff(sweep['max_drawdown_p95'].iloc[:50]) >= 0).all()
+
+    chosen = sizing.select_fraction(sweep, max_drawdown=0.3, max_ruin_probability=0.01)
+    row = sweep[sweep['fraction'] == chosen].iloc[0]
+    assert 0 < chosen < kelly and row['max_drawdown_p95'] <= 0.3
+    print(f"SUCCESS: Kelly {kelly:.2f}, chosen fraction {chosen:.2f}.")
+
+def test_kelly_capped_without_losses():
+    print("Testing the Kelly fraction when no trade loses...")
+    returns = np.random.default_rng(4).uniform(0.001, 0.03, 80)
+    sizing = PositionSizing()
+    assert sizing.kelly_fraction(returns) == 10.0
+    assert sizing.kelly_fraction(returns, max_fraction=2.0) == 2.0
+    # An edge whose optimum lies above the cap is capped too
+    assert sizing.kelly_fraction(np.r_[returns, -0.01], max_fraction=2.0) == 2.0
+
+    sweep = sizing.fraction_sweep(returns, [0.1], kelly_multipliers=[0.25, 0.5, 1.0], n_bootstrap=200, seed=1)
+    assert np.isfinite(sweep.drop(columns='kelly_multiplier').to_numpy(dtype=float)).all()
+    assert np.allclose(sweep['fraction'].iloc[1:], [2.5, 5.0, 10.0])
+    print("SUCCESS: Finite fractions and sweep rows.")
+
+def test_bootstrap_blocks_bound_memory():
+    print("Testing bootstrap chunking over resamples...")
+    import tracemalloc
+    returns = np.random.default_rng(5).normal(0.002, 0.03, 2000)
+    sizing = PositionSizing()
+    fractions = np.linspace(0.05, 1.0, 20)
+
+    tracemalloc.start()
+    small = sizing.fraction_sweep(returns, fractions, n_bootstrap=1000, seed=3, chunk_size=8, max_elements=2**16)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    large = sizing.fraction_sweep(returns, fractions, n_bootstrap=1000, seed=3, chunk_size=64, max_elements=2**26)
+    # Same resamples whatever the block size
+    assert small.equals(large)
+    # One unchunked (fraction, resample, trade) array would be 20 x 1000 x 2000 floats = 320 MB
+    assert peak < 16 * 2**20
+    print(f"SUCCESS: Identical sweeps, peak {peak / 2**20:.1f} MB with small blocks.")
+
+def test_trade_returns_from_engine():
+    print("Testing trade returns from backtest positions...")
+    config = load_config()
+    engine, _ = run_engine(config, prepare_data(config, seed=5), max_drawdown=0.99)
+    returns = trade_returns(engine.positions)
+    assert len(returns) == len(engine.positions) > 0
+    for position, r in zip(engine.positions, returns):
+        assert np.isclose(r * abs(position['quantity'] * position['entry_price']), position['pnl'])
+    sweep = PositionSizing().fraction_sweep(returns, n_bootstrap=100, seed=0)
+    assert np.isfinite(sweep['growth_mean']).all()
+    print(f"SUCCESS: {len(returns)} trade returns.")
+
+if __name__ == "__main__":
+    test_sweep_matches_trade_by_trade()
+    test_kelly_and_bootstrap()
+    test_kelly_capped_without_losses()
+    test_bootstrap_blocks_bound_memory()
+    test_trade_returns_from_engine()
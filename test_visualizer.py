@@ -0,0 +1,64 @@
+﻿import os
+import tempfile
+import time
+import numpy as np
+from analysis.visualizer import lttb, run_length_spans, render_reports
+from test_backtest_engine import load_config, prepare_data, run_engine
+
+def test_lttb_keeps_extremes():
+    print("Testing LTTB downsampling...")
+    rng = np.random.default_rng(0)
+    y = np.cumsum(rng.standard_normal(20000))
+    y[7777] = y.max() + 50 # Spike
+    x = np.arange(len(y), dtype=float)
+
+    kept = lttb(x, y, 500)
+    assert len(kept) == 500
+    assert kept[0] == 0 and kept[-1] == len(y) - 1
+    assert (np.diff(kept) > 0).all()
+    assert 7777 in kept
+    assert y[kept].min() - y.min() < 0.05 * (y.max() - y.min())
+    assert (lttb(x[:100], y[:100], 500) == np.arange(100)).all()
+    print("SUCCESS: 20000 points -> 500, spike kept, trough preserved.")
+
+def test_run_length_spans():
+    print("Testing run-length encoding...")
+    starts, ends, values = run_length_spans(np.array([0, 0, 1, 1, 1, 0, 1]))
+    assert list(starts) == [0, 2, 5, 6]
+    assert list(ends) == [2, 5, 6, 7]
+    assert list(values) == [0, 1, 0, 1]
+    print("SUCCESS: Runs encoded.")
+
+def test_render_reports_in_parallel():
+    print("Testing parallel headless report rendering...")
+    config = load_config()
+    jobs = []
+    for seed, symbol in enumerate(['BTC/USDT', 'ETH/USDT']):
+        df = prepare_data(config, seed=seed, n_bars=18000)
+        engine, results = run_engine(config, df, max_drawdown=0.99)
+        jobs.append({'symbol': symbol, 'results': results, 'data': df, 'trades': engine.positions})
+
+    import matplotlib
+    backend = matplotlib.get_backend()
+    output_dir = tempfile.mkdtemp()
+    t0 = time.perf_counter()
+    paths = render_reports(jobs, output_dir=output_dir, max_workers=2)
+    elapsed = time.perf_counter() - t0
+
+    assert len(paths) == 4
+    assert all(os.path.getsize(path) > 0 for path in paths)
+    assert os.path.exists(os.path.join(output_dir, 'BTC-USDT_performance.png'))
+
+    # In-process rendering leaves the caller's backend alone (only workers switch to Agg)
+    matplotlib.use('pdf')
+    try:
+        assert len(render_reports(jobs[:1], output_dir=output_dir, max_workers=1)) == 2
+        assert matplotlib.get_backend() == 'pdf'
+    finally:
+        matplotlib.use(backend)
+    print(f"SUCCESS: {len(paths)} charts in {elapsed:.2f}s.")
+
+if __name__ == "__main__":
+    test_lttb_keeps_extremes()
+    test_run_length_spans()
+    test_render_reports_in_parallel()
@@ -0,0 +1,107 @@
+﻿import threading
+import zlib
+import numpy as np
+
+def _key(value):
+    """
+    Stable integer for a spawn key part (str -> crc32, so it is the same in every process).
+    """
+    if isinstance(value, str):
+        return zlib.crc32(value.encode())
+    return int(value)
+
+class RNGService:
+    """
+    Central source of random streams.
+
+    Every stochastic component asks for its own Generator instead of using the
+    global np.random / random state. Streams are derived from one root seed
+    with SeedSequence spawn keys (component name, optional keys such as a
+    venue or chunk index, and an instance counter), so they are statistically
+    independent, the same on every run with the same seed, and never
+    duplicated across worker processes.
+    """
+    def __init__(self, seed=None):
+        self._lock = threading.Lock()
+        self.reseed(seed)
+
+    def reseed(self, seed=None):
+        """
+        Reset the root seed (None draws fresh OS entropy) and the instance counters.
+        """
+        with self._lock:
+            self.seed = seed
+            self._root = np.random.SeedSequence(seed)
+            self._counters = {}
+        return self
+
+    def seed_sequence(self, component, *keys):
+        """
+        The SeedSequence of (component, *keys); the same arguments always give the same sequence.
+        """
+        spawn_key = self._root.spawn_key + (_key(component),) + tuple(_key(key) for key in keys)
+        return np.random.SeedSequence(self._root.entropy, spawn_key=spawn_key)
+
+    def spawn(self, component, *keys):
+        """
+        The SeedSequence for the next instance of `component`.
+
+        Repeated calls with the same arguments return the next independent
+        stream (an instance counter is appended), so two objects of the same
+        class never share a stream; the sequence of streams is reproducible.
+        """
+        with self._lock:
+            counter_key = (component,) + keys
+            instance = self._counters.get(counter_key, 0)
+            self._counters[counter_key] = instance + 1
+        return self.seed_sequence(component, *keys, instance)
+
+    def generator(self, component, *keys):
+        """
+        A fresh Generator for the next instance of `component` (see spawn()).
+        """
+        return np.random.default_rng(self.spawn(component, *keys))
+
+    def chunk_seeds(self, seed_sequence, n_chunks):
+        """
+        Child seed sequences for n_chunks units of parallel work.
+
+        Seeds belong to chunks, not workers, so a chunked computation gives the
+        same result whatever the number of workers.
+        """
+        base = seed_sequence.spawn_key
+        return [np.random.SeedSequence(seed_sequence.entropy, spawn_key=base + (i,)) for i in range(n_chunks)]
+
+    def for_worker(self, index):
+        """
+        A service for worker `index` whose streams are disjoint from this one and
+        from every other worker's (use it in a pool initializer, so forked
+        workers do not replay the parent's instance counters).
+        """
+        worker = RNGService.__new__(RNGService)
+        worker._lock = threading.Lock()
+        worker.seed = self.seed
+        worker._root = self.seed_sequence('worker', index)
+        worker._counters = {}
+        return worker
+
+    def resolve(self, component, seed=None, rng=None):
+        """
+        The Generator a component should use: an explicit Generator, an explicit
+        seed, or the next stream of the shared service.
+        """
+        if rng is not None:
+            return rng
+        if seed is not None:
+            return np.random.default_rng(seed)
+        return self.generator(component)
+
+# Shared service, seeded from config.yaml by configure()
+rng_service = RNGService()
+
+def configure(config):
+    """
+    Apply the 'random' section of config.yaml (seed: null = not reproducible).
+    """
+    settings = config.get('random', {})
+    return rng_service.reseed(settings.get('seed'))